@@ -0,0 +1,19 @@
+"""
+This module contains benchmarks that can be run locally, without access to the ORCA database.
+
+Modules
+-------
+wkb_decode : Benchmark of load_wkb_series against Series.apply(load_wkb), and of decoding hex EWKB against
+    WKB bytes
+od_keys : Benchmark of the memory and groupby time of integer location ids and OD keys against the
+    location string keys they replaced
+frequency : Benchmark of add_od_frequency against the groupby and merge of the OD frequencies on the
+    location strings, in wall time and tracemalloc peak, at 1M, 10M and 50M trips
+reflection : Benchmark of the TransactionsWithLocations constructor latency with and without
+    reflecting whole schemas, against a SQLite stand-in for the orca_ng database
+trip_extraction : Benchmark of the trip table extraction for several user types, sequential versus
+    concurrent, against a SQLite stand-in with synthetic trips
+date_filter : Benchmark of the date-range predicates on the transactions table
+census_vectorized : Benchmark of the DataFrame versions of the household size and income range computations
+    against applying the row versions to each block group
+"""
@@ -0,0 +1,80 @@
+"""
+Benchmark of the DataFrame versions of the household size and income range computations
+(get_average_household_size_df and get_households_in_income_range_df) against applying the row versions
+(get_average_household_size_from_census_row and get_households_in_income_range) to each row with
+DataFrame.apply(axis=1), on synthetic census block groups.
+
+Before timing, the DataFrame versions are checked to give the same values as the row versions.
+
+Run from the root with:
+    python -m benchmarks.census_vectorized
+
+Functions
+---------
+create_census_df :
+    Function to create synthetic block groups with the household size and income distribution columns
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from transit_equity.census.household_size import (HOUSEHOLD_SIZE_COLUMNS, get_average_household_size_df,
+                                     get_average_household_size_from_census_row)
+from transit_equity.census.income import (INCOME_DISTRIBUTION_COLUMNS, get_households_in_income_range,
+                             get_households_in_income_range_df)
+
+# Income range of the benchmark, with partially covered columns on both ends
+MIN_INCOME, MAX_INCOME = 12000, 62000
+
+def create_census_df(n_block_groups: int = 20000, seed: int = 0) -> pd.DataFrame:
+    '''
+    Creates synthetic block groups with the HOUSEHOLD_SIZE_COLUMNS and INCOME_DISTRIBUTION_COLUMNS,
+    whose totals are the sums of their detailed columns. About 1% of the block groups have no households.
+    '''
+    rng = np.random.default_rng(seed)
+    census_df = pd.DataFrame(index=pd.RangeIndex(n_block_groups))
+    has_households = rng.random(n_block_groups) > 0.01
+
+    size_columns = [column.value.field for column in HOUSEHOLD_SIZE_COLUMNS if column.value.count > 0]
+    for field in size_columns:
+        census_df[field] = rng.integers(0, 100, n_block_groups) * has_households
+    census_df[HOUSEHOLD_SIZE_COLUMNS.B11016_001E.value.field] = census_df[size_columns].sum(axis=1)
+
+    income_columns = [column.value.field for column in INCOME_DISTRIBUTION_COLUMNS if column.value.min_income >= 0]
+    for field in income_columns:
+        census_df[field] = rng.integers(0, 100, n_block_groups) * has_households
+    census_df[INCOME_DISTRIBUTION_COLUMNS.B19001_001E.value.field] = census_df[income_columns].sum(axis=1)
+    return census_df
+
+def _time(function, repeat: int = 3) -> tuple[float, pd.Series]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+if __name__ == '__main__':
+    census_df = create_census_df()
+
+    benchmarks = {
+        'average household size': (
+            lambda: census_df.apply(get_average_household_size_from_census_row, axis=1),
+            lambda: get_average_household_size_df(census_df),
+        ),
+        'households in income range': (
+            lambda: census_df.apply(get_households_in_income_range, axis=1, args=(MIN_INCOME, MAX_INCOME)),
+            lambda: get_households_in_income_range_df(census_df, MIN_INCOME, MAX_INCOME),
+        ),
+    }
+    for name, (row_function, df_function) in benchmarks.items():
+        time_row, result_row = _time(row_function, repeat=1)
+        time_df, result_df = _time(df_function)
+        np.testing.assert_allclose(result_df.to_numpy(), result_row.to_numpy(dtype=float))
+        print(f'{name}: apply(axis=1) {time_row:.3f} s, DataFrame version {time_df:.4f} s '
+              f'({time_row / time_df:.0f}x faster), {len(census_df)} block groups')
+
+    interpolated = get_households_in_income_range_df(census_df, MIN_INCOME, MAX_INCOME, interpolate=True)
+    print(f'households in [{MIN_INCOME}, {MAX_INCOME}]: {benchmarks["households in income range"][1]().sum():.0f}, '
+          f'{interpolated.sum():.0f} with interpolation')
@@ -0,0 +1,75 @@
+"""
+Benchmark of the date-range predicates that TransactionsWithLocations puts on the transactions table,
+against a SQLite stand-in (see benchmarks.reflection) seeded with a year of transactions
+and an index on the transaction timestamp column.
+
+The agency query of one month is run with the date filter (transactions_date_column='device_dtm_pacific')
+and without it (transactions_date_column=None). That the compiled SQL has the predicates on the transactions
+table itself, which is what lets PostgreSQL use the index (or prune partitions), is checked by
+tests/test_transactions_with_locations.py.
+
+Run from the root with:
+    python -m benchmarks.date_filter
+
+Functions
+---------
+seed_transactions :
+    Function to insert synthetic transactions and agencies into the stand-in database
+"""
+import datetime
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Engine
+
+from transit_equity.orca_ng.query.transactions_with_locations import TransactionsWithLocations
+
+from .reflection import create_sqlite_stand_in, get_schema_table_inventory
+
+def seed_transactions(engine: Engine, n_transactions: int = 1000000, n_days: int = 365, seed: int = 0) -> None:
+    '''
+    Inserts synthetic transactions spread over n_days from 2023-01-01, three agencies,
+    and an index on orca.transactions.device_dtm_pacific
+    '''
+    rng = np.random.default_rng(seed)
+    transactions = pd.DataFrame({
+        'id': np.arange(n_transactions),
+        'card_id': rng.integers(0, n_transactions // 20, n_transactions),
+        'source_agency_id': rng.integers(0, 3, n_transactions),
+        'device_dtm_pacific': pd.Timestamp('2023-01-01') +
+            pd.to_timedelta(rng.integers(0, n_days * 24 * 60, n_transactions), unit='min'),
+    })
+    agencies = pd.DataFrame({'id': [1, 2, 3], 'orca_agency_id': [0, 1, 2], 'agency_name': ['a', 'b', 'c']})
+    with engine.begin() as connection:
+        transactions.to_sql('transactions', connection, schema='orca', if_exists='append', index=False,
+                            chunksize=100000)
+        agencies.to_sql('agencies', connection, schema='trac', if_exists='append', index=False)
+        connection.exec_driver_sql(
+            'CREATE INDEX orca.transactions_device_dtm_pacific ON transactions (device_dtm_pacific)')
+
+def _time_query(transactions_with_locations: TransactionsWithLocations, repeat: int = 3) -> tuple[float, int]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = pd.read_sql(transactions_with_locations.get_transactions_with_agency(), transactions_with_locations.engine)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(df)
+
+if __name__ == '__main__':
+    start_date, end_date = datetime.datetime(2023, 4, 1), datetime.datetime(2023, 5, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_sqlite_stand_in(directory, get_schema_table_inventory())
+        seed_transactions(engine)
+
+        filtered = TransactionsWithLocations(start_date, end_date, engine)
+        unfiltered = TransactionsWithLocations(start_date, end_date, engine, transactions_date_column=None)
+
+        time_filtered, rows_filtered = _time_query(filtered)
+        time_unfiltered, rows_unfiltered = _time_query(unfiltered)
+        engine.dispose()
+
+    print(f'with date filter:    {time_filtered:.2f} s, {rows_filtered} rows')
+    print(f'without date filter: {time_unfiltered:.2f} s, {rows_unfiltered} rows '
+          f'({time_unfiltered / time_filtered:.1f}x slower)')
@@ -0,0 +1,100 @@
+"""
+Benchmark of attaching the OD frequency of each trip with add_od_frequency (transit_equity.networks.frequency)
+against the groupby and merge it replaced, on synthetic trip tables of 1M, 10M and 50M trips over 3000 stops.
+
+The baseline is the original OD frequency on the location strings (merge_string_od_frequency from
+benchmarks.od_keys), with the python string storage that astype('string') gives on pandas 2, so that
+tracemalloc sees all of its allocations (it does not trace pyarrow buffers). The groupby and merge on the
+int64 OD key (merge_od_key_frequency) is timed as well. The string keys of 50M trips do not fit in the
+memory of a 5 GB machine, so the baseline only runs up to BASELINE_MAX_TRIPS trips.
+
+For each size, the wall time is the best of a few runs, and the peak is the largest amount of memory allocated
+on top of the trip table during one run, as traced by tracemalloc. Before timing, every way is checked to give
+the same frequencies.
+
+Run from the root with:
+    python -m benchmarks.frequency
+
+Functions
+---------
+create_od_key_trips_df :
+    Function to create a synthetic trip table with int32 location ids and int64 OD keys
+"""
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from transit_equity.networks.frequency import add_od_frequency
+from transit_equity.networks.od_keys import pack_od_keys
+
+from .od_keys import create_location_trips_df, encode_od_keys, merge_od_key_frequency, merge_string_od_frequency
+
+# Numbers of trips of the benchmark, and the largest one for which the string keys baseline is run
+TRIP_COUNTS = (1000000, 10000000, 50000000)
+BASELINE_MAX_TRIPS = 10000000
+
+# Number of stops of the benchmark
+N_STOPS = 3000
+
+def create_od_key_trips_df(n_trips: int, n_stops: int = N_STOPS, seed: int = 0) -> pd.DataFrame:
+    '''
+    Creates a synthetic trip table with the card_id, trip_time_minutes, board_id, alight_id and od_key columns,
+    as encode_od_keys gives them, with the locations drawn from n_stops stops
+    '''
+    rng = np.random.default_rng(seed)
+    trips_df = pd.DataFrame({
+        'card_id': rng.integers(0, n_trips // 20, n_trips),
+        'trip_time_minutes': rng.uniform(1, 120, n_trips),
+        'board_id': rng.integers(0, n_stops, n_trips, dtype=np.int32),
+        'alight_id': rng.integers(0, n_stops, n_trips, dtype=np.int32),
+    })
+    trips_df['od_key'] = pack_od_keys(trips_df['board_id'], trips_df['alight_id'])
+    return trips_df
+
+def _time(function, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def _get_peak_memory(function) -> int:
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def _print_result(name: str, function, repeat: int) -> None:
+    peak = _get_peak_memory(function)
+    print(f'    {name}: {_time(function, repeat):.2f} s / {peak / 2 ** 20:.0f} MiB')
+
+if __name__ == '__main__':
+    for n_trips in TRIP_COUNTS:
+        print(f'{n_trips} trips:')
+        repeat = 3 if n_trips <= 10000000 else 1
+        if n_trips <= BASELINE_MAX_TRIPS:
+            trips_df = create_location_trips_df(n_trips, N_STOPS)
+            expected = merge_string_od_frequency(trips_df)['trip_frequency'].to_numpy()
+            _print_result('groupby + merge on the location strings', lambda: merge_string_od_frequency(trips_df),
+                          repeat)
+            encoded_df = encode_od_keys(trips_df)
+            del trips_df
+        else:
+            encoded_df = create_od_key_trips_df(n_trips)
+            expected = merge_od_key_frequency(encoded_df)['trip_frequency'].to_numpy()
+
+        np.testing.assert_array_equal(merge_od_key_frequency(encoded_df)['trip_frequency'], expected)
+        np.testing.assert_array_equal(add_od_frequency(encoded_df, 'trip_frequency')['trip_frequency'], expected)
+        encoded_df.drop(columns='trip_frequency', inplace=True)
+        del expected
+
+        # the merges return a new table, and add_od_frequency adds a column in place
+        _print_result('groupby + merge on the OD key', lambda: merge_od_key_frequency(encoded_df), repeat)
+        _print_result('add_od_frequency', lambda: add_od_frequency(encoded_df, 'trip_frequency')
+                      .drop(columns='trip_frequency', inplace=True), repeat)
+        del encoded_df
@@ -0,0 +1,126 @@
+"""
+Benchmark of grouping and merging trips on integer location ids and OD keys (LocationEncoder and pack_od_keys
+from transit_equity.networks.od_keys) against the location string keys they replaced, on synthetic trips
+with hex EWKB stop locations.
+
+The baseline is the OD frequency of clean_and_filter_network_data and trip_frequency_filter before the OD
+keys: a groupby on the board_string and alight_string columns (the locations as pandas strings), whose
+counts are merged back onto the trips on the concatenation of both strings. It is compared against the
+same groupby and merge on the int64 OD key. The strings are measured with the python and the pyarrow
+storage, as astype('string') gives one or the other depending on the pandas version.
+
+The memory of the key columns is measured with DataFrame.memory_usage(deep=True). The strings of a stop
+are shared by all its trips, so their hashes are cached, which if anything favours the string keys.
+Before timing, the frequencies on both keys are checked to be the same.
+
+Run from the root with:
+    python -m benchmarks.od_keys
+
+Functions
+---------
+create_location_trips_df :
+    Function to create synthetic trips with hex EWKB boarding and alighting locations
+
+encode_od_keys :
+    Function to encode the locations of the trips to int32 location ids and int64 OD keys
+
+merge_string_od_frequency :
+    Function to add the OD frequency of each trip on the location strings, as before the OD keys
+
+merge_od_key_frequency :
+    Function to add the OD frequency of each trip with a groupby and a merge on the OD key
+"""
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from transit_equity.networks.od_keys import LocationEncoder, pack_od_keys
+
+# Numbers of trips and stops of the benchmark
+N_TRIPS, N_STOPS = 2000000, 3000
+
+def create_location_trips_df(n_trips: int = N_TRIPS, n_stops: int = N_STOPS, seed: int = 0,
+                             string_storage: str = 'python') -> pd.DataFrame:
+    '''
+    Creates synthetic trips with card_id, trip_time_minutes and the board_string and alight_string
+    hex EWKB locations (EPSG:32610) of n_stops stops, as pandas strings with the given storage
+    '''
+    rng = np.random.default_rng(seed)
+    stops = shapely.set_srid(shapely.points(rng.uniform(540000, 560000, n_stops),
+                                            rng.uniform(5200000, 5300000, n_stops)), 32610)
+    stop_locations = pd.array(shapely.to_wkb(stops, hex=True, include_srid=True),
+                              dtype=pd.StringDtype(string_storage))
+    return pd.DataFrame({
+        'card_id': rng.integers(0, n_trips // 20, n_trips),
+        'trip_time_minutes': rng.uniform(1, 120, n_trips),
+        'board_string': stop_locations.take(rng.integers(0, n_stops, n_trips)),
+        'alight_string': stop_locations.take(rng.integers(0, n_stops, n_trips)),
+    })
+
+def encode_od_keys(trips_df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Returns the trips with board_id and alight_id (int32, from one LocationEncoder) and od_key (int64)
+    in place of the location strings
+    '''
+    encoder = LocationEncoder()
+    board_ids = encoder.encode(trips_df['board_string'])
+    alight_ids = encoder.encode(trips_df['alight_string'])
+    encoded_df = trips_df.drop(columns=['board_string', 'alight_string'])
+    encoded_df['board_id'] = board_ids
+    encoded_df['alight_id'] = alight_ids
+    encoded_df['od_key'] = pack_od_keys(board_ids, alight_ids)
+    return encoded_df
+
+def merge_string_od_frequency(trips_df: pd.DataFrame, frequency_column: str = 'trip_frequency') -> pd.DataFrame:
+    '''
+    Returns the trips with the number of trips sharing their board_string and alight_string, from a groupby
+    on both strings merged back onto the trips on their concatenation, as clean_and_filter_network_data
+    and trip_frequency_filter did before the OD keys
+    '''
+    # the original added the concatenated key to its own table, so add it to a shallow copy
+    trips_df = trips_df.copy(deep=False)
+    edge_freq = trips_df.groupby(['board_string', 'alight_string']).size().reset_index(name=frequency_column)
+    edge_freq['start_stop_string'] = edge_freq['board_string'] + edge_freq['alight_string']
+    edge_freq = edge_freq[[frequency_column, 'start_stop_string']]
+    trips_df['start_stop_string'] = trips_df['board_string'] + trips_df['alight_string']
+    return pd.merge(trips_df, edge_freq, on='start_stop_string', how='left')
+
+def merge_od_key_frequency(trips_df: pd.DataFrame, frequency_column: str = 'trip_frequency') -> pd.DataFrame:
+    '''
+    Returns the trips with the number of trips sharing their od_key, from a groupby on the OD key
+    merged back onto the trips
+    '''
+    edge_freq = trips_df.groupby('od_key').size().reset_index(name=frequency_column)
+    return pd.merge(trips_df, edge_freq, on='od_key', how='left')
+
+def _time(function, repeat: int = 3) -> tuple[float, pd.DataFrame]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def _get_memory_mib(df: pd.DataFrame, columns: list[str]) -> float:
+    return df[columns].memory_usage(deep=True, index=False).sum() / 2 ** 20
+
+if __name__ == '__main__':
+    trips_df = create_location_trips_df()
+    time_encode, encoded_df = _time(lambda: encode_od_keys(trips_df))
+    expected = merge_od_key_frequency(encoded_df)['trip_frequency'].to_numpy()
+    print(f'{len(trips_df)} trips, {N_STOPS} stops')
+
+    for string_storage in ['python', 'pyarrow']:
+        string_trips_df = create_location_trips_df(string_storage=string_storage)
+        time_merge, merged_df = _time(lambda: merge_string_od_frequency(string_trips_df))
+        np.testing.assert_array_equal(merged_df['trip_frequency'].to_numpy(), expected)
+        print(f'{string_storage} strings: key columns '
+              f'{_get_memory_mib(string_trips_df, ["board_string", "alight_string"]):.0f} MiB, '
+              f'groupby + merge {time_merge:.2f} s')
+        del string_trips_df, merged_df
+
+    time_merge, _ = _time(lambda: merge_od_key_frequency(encoded_df))
+    print(f'location ids + OD key: key columns {_get_memory_mib(encoded_df, ["board_id", "alight_id", "od_key"]):.0f} '
+          f'MiB, groupby + merge {time_merge:.2f} s, plus {time_encode:.2f} s to encode the locations')
@@ -0,0 +1,144 @@
+"""
+Benchmark of the TransactionsWithLocations constructor latency, against a SQLite stand-in for the
+orca_ng database with the full table inventory of orca_ng/constants/schema_tables.py.
+
+Each schema is a SQLite database attached under the schema name. Names starting with 'v_' are
+created as views, every other name as a table. The constructor is timed reflecting whole schemas
+(reflect_all=True) and reflecting only the tables its queries use (reflect_all=False), both with a
+cold reflection registry, and once more with the tables already in the process-wide registry.
+
+Run from the root with:
+    python -m benchmarks.reflection
+
+Functions
+---------
+get_schema_table_inventory :
+    Function to get the table and view names of each schema from the *_SCHEMA_TABLES constants
+
+create_sqlite_stand_in :
+    Function to create a SQLite engine with every schema and table of the inventory
+
+time_constructor :
+    Function to time the TransactionsWithLocations constructor
+"""
+import datetime
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+from sqlalchemy import create_engine, event, Engine
+
+from transit_equity.orca_ng.constants.schema_tables import DSSG_SCHEMA_TABLES, ORCA_SCHEMA_TABLES, \
+    TRAC_SCHEMA_TABLES, GTFS_SCHEMA_TABLES
+from transit_equity.orca_ng.query.transactions_with_locations import TransactionsWithLocations
+from transit_equity.utils.db_helpers import REFLECTION_REGISTRY
+
+# Columns of every stand-in table, so that reflection has a realistic amount of work per table
+STAND_IN_COLUMNS = ('id INTEGER PRIMARY KEY', 'feed_id INTEGER', 'agency_id TEXT', 'stop_id TEXT', 'stop_code TEXT',
+                    'txn_id INTEGER', 'card_id INTEGER', 'source_agency_id INTEGER',
+                    'orca_agency_id INTEGER', 'gtfs_agency_id TEXT', 'agency_name TEXT',
+                    'device_location BLOB', 'stop_location BLOB', 'business_date DATE',
+                    'device_dtm_pacific TIMESTAMP', 'earliest_calendar_date DATE',
+                    'latest_calendar_date DATE')
+
+def get_schema_table_inventory(schema_tables_enums: tuple | None = None) -> dict[str, list[str]]:
+    '''
+    Returns the table and view names of each schema from the *_SCHEMA_TABLES constants
+
+    Parameters
+    ----------
+    schema_tables_enums : tuple | None
+        The *_SCHEMA_TABLES enums to read the names from.
+        Defaults to the orca_ng ones (use the orca ones for a stand-in of the orca database).
+
+    Returns
+    -------
+    dict[str, list[str]]
+        Bare table names, by schema name
+    '''
+    if schema_tables_enums is None:
+        schema_tables_enums = (DSSG_SCHEMA_TABLES, ORCA_SCHEMA_TABLES, TRAC_SCHEMA_TABLES, GTFS_SCHEMA_TABLES)
+    inventory = defaultdict(set)
+    for schema_tables in schema_tables_enums:
+        for member in schema_tables:
+            # a few of the constants are one-element tuples because of a trailing comma
+            name = member.value[0] if isinstance(member.value, tuple) else member.value
+            schema, table = name.replace(' ', '').split('.')
+            inventory[schema].add(table)
+    return {schema: sorted(tables) for schema, tables in inventory.items()}
+
+def create_sqlite_stand_in(directory: str, inventory: dict[str, list[str]]) -> Engine:
+    '''
+    Returns a SQLite engine with every schema and table of the inventory
+
+    Parameters
+    ----------
+    directory : str
+        Directory in which to create one SQLite database per schema
+    inventory : dict[str, list[str]]
+        Bare table names, by schema name, as returned by get_schema_table_inventory
+
+    Returns
+    -------
+    Engine
+        An engine whose connections attach every schema database under the schema name
+    '''
+    paths = {schema: os.path.join(directory, f'{schema}.sqlite') for schema in inventory}
+    engine = create_engine(f'sqlite:///{os.path.join(directory, "main.sqlite")}')
+
+    @event.listens_for(engine, 'connect')
+    def attach_schemas(dbapi_connection, _):
+        for schema, path in paths.items():
+            dbapi_connection.execute(f"ATTACH DATABASE '{path}' AS {schema}")
+
+    columns = ', '.join(STAND_IN_COLUMNS)
+    with engine.begin() as connection:
+        for schema, tables in inventory.items():
+            for table in tables:
+                if not table.startswith('v_'):
+                    connection.exec_driver_sql(f'CREATE TABLE {schema}.{table} ({columns})')
+            base_table = next(table for table in tables if not table.startswith('v_'))
+            for table in tables:
+                if table.startswith('v_'):
+                    connection.exec_driver_sql(
+                        f'CREATE VIEW {schema}.{table} AS SELECT * FROM {base_table}')
+    return engine
+
+def time_constructor(engine: Engine, reflect_all: bool, repeat: int = 5, cold: bool = True) -> float:
+    '''
+    Returns the best wall time of the TransactionsWithLocations constructor, in seconds
+
+    Parameters
+    ----------
+    engine : Engine
+        Engine of the database to reflect
+    reflect_all : bool
+        Passed to the constructor
+    repeat : int, optional
+        Number of timed constructions
+    cold : bool, optional
+        Whether to clear the process-wide reflection registry before each construction
+    '''
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            REFLECTION_REGISTRY.clear()
+        start = time.perf_counter()
+        TransactionsWithLocations(datetime.datetime(2023, 4, 1), datetime.datetime(2023, 4, 30),
+                                  engine, reflect_all=reflect_all, registry=REFLECTION_REGISTRY)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == '__main__':
+    inventory = get_schema_table_inventory()
+    print({schema: len(tables) for schema, tables in inventory.items()})
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_sqlite_stand_in(directory, inventory)
+        time_all = time_constructor(engine, reflect_all=True)
+        time_only = time_constructor(engine, reflect_all=False)
+        time_warm = time_constructor(engine, reflect_all=False, cold=False)
+        engine.dispose()
+    print(f'reflect_all=True:  {time_all * 1000:.1f} ms')
+    print(f'reflect_all=False: {time_only * 1000:.1f} ms ({time_all / time_only:.1f}x faster)')
+    print(f'warm registry:     {time_warm * 1000:.3f} ms')
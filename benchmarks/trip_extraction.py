@@ -0,0 +1,146 @@
+"""
+Benchmark of the trip table extraction for several user types, comparing a sequential loop over
+get_trip_tables_by_cardtype with get_trip_tables_by_cardtypes on threads and on processes.
+
+The database is a SQLite stand-in with synthetic trips, boardings, alights, vboardings and gtfs
+stops tables, attached as the 'test' and 'orca' schemas. The stop locations are stored as hex
+EWKB strings, like psycopg2 returns PostGIS geometries. A local SQLite database has almost no
+query latency, so this mostly measures the parallel cleaning; against the real database the
+concurrent queries also overlap their wait times.
+
+Run from the root with:
+    python -m benchmarks.trip_extraction
+
+Functions
+---------
+create_sqlite_stand_in :
+    Function to create the SQLite stand-in databases with synthetic trips of every user type
+
+attach_schemas :
+    Function to attach the schema databases to every new SQLite connection of the process
+"""
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from transit_equity.networks.network_prep import get_trip_tables_by_cardtype, get_trip_tables_by_cardtypes
+from transit_equity.utils.db_helpers import dispose_pooled_engines
+
+URL_KEY = 'TRANSIT_EQUITY_BENCHMARK_URL'
+USER_TYPES = (1, 2, 3, 4, 5)
+TABLE_NAMES = {'trips_table': 'test.trips', 'alights_table': 'test.alights',
+               'boardings_table': 'test.boardings', 'vboardings_table': 'orca.v_boardings',
+               'gtfs_table': 'test.gtfs_stops'}
+
+def create_sqlite_stand_in(directory: str, trips_per_user_type: int = 100000, n_stops: int = 2000,
+                           seed: int = 0) -> dict[str, str]:
+    '''
+    Creates the SQLite stand-in databases with synthetic trips of every user type
+
+    Parameters
+    ----------
+    directory : str
+        Directory in which to create one SQLite database per schema
+    trips_per_user_type : int, optional
+        Number of trips of each user type
+    n_stops : int, optional
+        Number of distinct stops
+    seed : int, optional
+        Seed of the random generator
+
+    Returns
+    -------
+    dict[str, str]
+        Path of the database of each schema, to pass to attach_schemas
+    '''
+    rng = np.random.default_rng(seed)
+    n_trips = trips_per_user_type * len(USER_TYPES)
+    stop_ids = np.array([f'stop_{i}' for i in range(n_stops)], dtype=object)
+    stop_points = shapely.set_srid(shapely.points(rng.uniform(540000, 560000, n_stops),
+                                                  rng.uniform(5.2e6, 5.3e6, n_stops)), 32610)
+    stop_locations = shapely.to_wkb(stop_points, hex=True, include_srid=True)
+
+    board_stops = rng.integers(0, n_stops, n_trips)
+    alight_stops = rng.integers(0, n_stops, n_trips)
+    board_times = pd.Timestamp('2023-04-01') + \
+        pd.to_timedelta(rng.integers(0, 30 * 24 * 60, n_trips), unit='min')
+    alight_times = board_times + pd.to_timedelta(rng.integers(1, 240, n_trips), unit='min')
+    board_txn_ids = np.arange(n_trips)
+    alight_txn_ids = board_txn_ids + n_trips
+
+    tables = {
+        'test': {
+            'trips': pd.DataFrame({'orig_txn_id': board_txn_ids, 'dest_txn_id': alight_txn_ids}),
+            'boardings': pd.DataFrame({'txn_id': board_txn_ids,
+                                       'stop_location': stop_locations[board_stops]}),
+            'alights': pd.DataFrame({'txn_id': alight_txn_ids, 'alight_dtm_pacific': alight_times,
+                                     'stop_id': stop_ids[alight_stops]}),
+            'gtfs_stops': pd.DataFrame({'stop_id': stop_ids, 'stop_location': stop_locations}),
+        },
+        'orca': {
+            'v_boardings': pd.DataFrame({
+                'txn_id': board_txn_ids,
+                'card_id': rng.integers(0, n_trips // 10, n_trips),
+                'device_dtm_pacific': board_times,
+                'passenger_type_id': np.repeat(USER_TYPES, trips_per_user_type)}),
+        },
+    }
+    paths = {'main': os.path.join(directory, 'main.sqlite')}
+    sqlite3.connect(paths['main']).close()
+    for schema, schema_tables in tables.items():
+        paths[schema] = os.path.join(directory, f'{schema}.sqlite')
+        with sqlite3.connect(paths[schema]) as connection:
+            for name, df in schema_tables.items():
+                df.to_sql(name, connection, index=False,
+                          dtype={column: 'TIMESTAMP' for column in df.columns
+                                 if column.endswith('dtm_pacific')})
+            connection.execute('CREATE INDEX IF NOT EXISTS txn_index ON '
+                               f'{"v_boardings" if schema == "orca" else "boardings"} (txn_id)')
+    return paths
+
+def attach_schemas(paths: dict[str, str]) -> None:
+    '''
+    Attaches the schema databases to every new SQLite connection of the process.
+    Used as the initializer of the worker processes.
+    '''
+    def attach(dbapi_connection, _):
+        for schema, path in paths.items():
+            if schema != 'main':
+                dbapi_connection.execute(f"ATTACH DATABASE '{path}' AS {schema}")
+
+    event.listen(Pool, 'connect', attach)
+
+def _run(function, **kwargs) -> float:
+    start = time.perf_counter()
+    function(URL_KEY, 'test', 'orca', user_types=USER_TYPES, **TABLE_NAMES, **kwargs)
+    return time.perf_counter() - start
+
+def _run_sequential(url_key, test_schema, orca_schema, user_types, **kwargs):
+    return {user_type: get_trip_tables_by_cardtype(url_key, test_schema, orca_schema,
+                                                   user_type=user_type, **kwargs)
+            for user_type in user_types}
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        paths = create_sqlite_stand_in(directory)
+        os.environ[URL_KEY] = f'sqlite:///{paths["main"]}'
+        attach_schemas(paths)
+
+        time_sequential = _run(_run_sequential)
+        time_threads = _run(get_trip_tables_by_cardtypes, use_processes=False)
+        with ProcessPoolExecutor(max_workers=len(USER_TYPES), initializer=attach_schemas,
+                                 initargs=(paths,)) as executor:
+            time_processes = _run(get_trip_tables_by_cardtypes, executor=executor)
+        dispose_pooled_engines()
+
+    print(f'sequential loop: {time_sequential:.2f} s')
+    print(f'threads:         {time_threads:.2f} s ({time_sequential / time_threads:.1f}x)')
+    print(f'processes:       {time_processes:.2f} s ({time_sequential / time_processes:.1f}x)')
@@ -0,0 +1,66 @@
+"""
+Benchmark of decoding a column of WKB locations with load_wkb_series (transit_equity.geospatial.format_conversions)
+against applying load_wkb to each row with Series.apply, on synthetic EPSG:32610 points.
+
+The hex-vs-bytes choice of load_wkb_series is measured too: hex EWKB strings (LOCATION_FORMAT_EWKB) are
+converted to bytes with bytes.fromhex row by row before shapely.from_wkb, which is compared against handing
+the hex strings to shapely.from_wkb as they are (parsed as hex by GEOS), and against decoding WKB bytes
+(LOCATION_FORMAT_WKB), which need no conversion. Before timing, every way is checked to give the same points.
+
+Run from the root with:
+    python -m benchmarks.wkb_decode
+
+Functions
+---------
+create_wkb_series :
+    Function to create synthetic point locations as hex EWKB strings and as WKB bytes
+"""
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from transit_equity.geospatial.format_conversions import load_wkb, load_wkb_series
+
+# Number of locations of the benchmark
+N_LOCATIONS = 1000000
+
+def create_wkb_series(n_locations: int = N_LOCATIONS, seed: int = 0) -> tuple[pd.Series, pd.Series]:
+    '''
+    Creates random EPSG:32610 points, as hex EWKB strings with their SRID (as psycopg2 returns geometry columns)
+    and as WKB bytes (as psycopg2 returns ST_AsBinary, once converted from memoryview)
+    '''
+    rng = np.random.default_rng(seed)
+    points = shapely.set_srid(shapely.points(rng.uniform(540000, 560000, n_locations),
+                                             rng.uniform(5200000, 5300000, n_locations)), 32610)
+    hex_series = pd.Series(shapely.to_wkb(points, hex=True, include_srid=True), dtype=object)
+    bytes_series = pd.Series(shapely.to_wkb(points), dtype=object)
+    return hex_series, bytes_series
+
+def _time(function, repeat: int = 3) -> tuple[float, np.ndarray]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), np.asarray(result, dtype=object)
+
+if __name__ == '__main__':
+    hex_series, bytes_series = create_wkb_series()
+
+    time_apply, expected = _time(lambda: hex_series.apply(load_wkb), repeat=1)
+    benchmarks = {
+        'load_wkb_series, hex (bytes.fromhex, then from_wkb)': lambda: load_wkb_series(hex_series),
+        'shapely.from_wkb, hex parsed by GEOS': lambda: shapely.from_wkb(hex_series.to_numpy()),
+        'load_wkb_series, bytes': lambda: load_wkb_series(bytes_series),
+    }
+    print(f'{len(hex_series)} locations')
+    print(f'Series.apply(load_wkb), hex: {time_apply:.2f} s')
+    for name, function in benchmarks.items():
+        time_function, geometries = _time(function)
+        assert shapely.equals_exact(geometries, expected, tolerance=0).all()
+        print(f'{name}: {time_function:.2f} s ({time_apply / time_function:.1f}x faster)')
+
+    time_fromhex, _ = _time(lambda: list(map(bytes.fromhex, hex_series)))
+    print(f'of which bytes.fromhex on each row: {time_fromhex:.2f} s')
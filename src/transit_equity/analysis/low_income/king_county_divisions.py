@@ -5,6 +5,8 @@ import pandas as pd
 import geopandas as gpd
 from shapely import geometry
 
+from ...utils.artifact_store import ArtifactStore
+
 # Cities and Unincorporated King County
 KING_COUNTY_GIS_PATH = "https://gis-kingcounty.opendata.arcgis.com/datasets/3fdb7c41de8548c5ab5f96cb1ef303e2_446.geojson"
 
@@ -22,7 +24,8 @@ def get_southmost_point(polygon: geometry.Polygon):
     southernmost_point = min(exterior_coords, key=lambda coord: coord[1])
     return southernmost_point
 
-def get_king_county_divisions(division_column: str = 'division') -> gpd.GeoDataFrame:
+def get_king_county_divisions(division_column: str = 'division',
+                              artifact_store: ArtifactStore | None = None) -> gpd.GeoDataFrame:
     """
     Get the divisions of King County based on geography.
     The divisions are based on cities and unincorporated King County.
@@ -35,6 +38,9 @@ def get_king_county_divisions(division_column: str = 'division') -> gpd.GeoDataF
     ----------
     division_column : str
         The name of the column to store the division values
+    artifact_store : ArtifactStore, optional
+        Store to keep the King County layer in, reprojected to EPSG:32610, so that it is downloaded once and
+        later calls read it from disk. Defaults to None (the layer is read from KING_COUNTY_GIS_PATH).
 
     Returns
     -------
@@ -42,8 +48,14 @@ def get_king_county_divisions(division_column: str = 'division') -> gpd.GeoDataF
         A GeoDataFrame containing the divisions of King County.
         These division values are provided in a separate column provided by the division_column parameter. 
     """
-    gdf_king_county = gpd.read_file(KING_COUNTY_GIS_PATH)
-    gdf_king_county = gdf_king_county.to_crs("EPSG:32610")
+    if artifact_store is not None:
+        gdf_king_county = artifact_store.load_layer(
+            'king_county_areas', KING_COUNTY_GIS_PATH, lambda gdf: gdf.to_crs("EPSG:32610"),
+            params={'crs': 32610}
+        )
+    else:
+        gdf_king_county = gpd.read_file(KING_COUNTY_GIS_PATH)
+        gdf_king_county = gdf_king_county.to_crs("EPSG:32610")
 
     gdf_kc_divisions = []
     division_id = 0
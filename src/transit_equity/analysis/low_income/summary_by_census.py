@@ -3,6 +3,9 @@ This module contains functions to summarize transactions by census block group.
 
 Functions
 ---------
+get_transactions_block_group_geo_df:
+    A function to spatially join transactions to the census block groups they are in.
+
 get_transaction_counts_per_block_group:
     A function to get the number of transactions per census block group.
 
@@ -18,6 +21,12 @@ get_all_counts_per_block_group:
 get_counts_per_block_in_region:
     A function to filter out count-related dataframes by the regions they belong to.
 
+Classes
+-------
+BlockGroupCountAggregator:
+    A class to get the transaction and unique user counts per census block group from chunks of transactions,
+    e.g. those streamed by `TransactionsWithLocations.iter_frames`, without holding all transactions in memory.
+
 TODO: Refactor the naming convention of the function parameter/variable names to have object type as suffix.
     E.g. df_transactions_with_locations -> transactions_with_locations_df
 
@@ -26,14 +35,17 @@ TODO: It seems that the count-based functions are doing one extra functionality
     Once this is separated out, instead of df_transactions_with_locations, the function can take in a GeoDataFrame
 """
 
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from shapely import wkb
 
 from ...census.utils import TIGER_MAIN_COLUMNS
+from ...geospatial.format_conversions import LOCATION_FORMAT_EWKB, load_location_series
+from ...geospatial.polygon_index import PolygonIndex
 
 def get_transactions_geo_df(df_transactions_with_locations: pd.DataFrame, transaction_location_column: str = 'transaction_location',
-                            is_transaction_location_shaped: bool = False, transaction_crs: int = 4326,) -> gpd.GeoDataFrame:
+                            is_transaction_location_shaped: bool = False, transaction_crs: int = 4326,
+                            location_format: str = LOCATION_FORMAT_EWKB) -> gpd.GeoDataFrame:
     """
     A function to convert a DataFrame containing transactions with locations to a GeoDataFrame.
 
@@ -54,15 +66,21 @@ def get_transactions_geo_df(df_transactions_with_locations: pd.DataFrame, transa
         The CRS of the transaction locations.
         Default is 4326 (EPSG:4326)
 
+    location_format : str
+        The format of the transaction location, as passed to `TransactionsWithLocations`.
+        One of `transit_equity.geospatial.format_conversions.LOCATION_FORMATS`.
+        Default is LOCATION_FORMAT_EWKB (WKB hex string)
+
     Returns
     -------
     gpd.GeoDataFrame
         A GeoDataFrame containing the transactions with their locations
     """
-    # The transaction_location_column is a WKB hex string that needs to be converted to a Shapely geometry object
+    # The transaction_location_column is a WKB hex string (or WKB bytes, or x/y columns) 
+    # that needs to be converted to a Shapely geometry object
     if not is_transaction_location_shaped:
         df_transactions_with_locations['transaction_location_shape'] = \
-            df_transactions_with_locations.apply(func=lambda row: wkb.loads(bytes.fromhex(row[transaction_location_column])), axis=1) 
+            load_location_series(df_transactions_with_locations, transaction_location_column, location_format)
     else:
         df_transactions_with_locations['transaction_location_shape'] = \
             df_transactions_with_locations[transaction_location_column]
@@ -71,13 +89,56 @@ def get_transactions_geo_df(df_transactions_with_locations: pd.DataFrame, transa
                                         crs=f"EPSG:{transaction_crs}")
     return gdf_transactions
 
+def get_transactions_block_group_geo_df(df_transactions_with_locations: pd.DataFrame, gdf_block_group_data: gpd.GeoDataFrame,
+                                        transaction_location_column: str = 'transaction_location',
+                                        is_transaction_location_shaped: bool = False,
+                                        transaction_crs: int = 4326,
+                                        census_gdf_crs: int = 32610,
+                                        location_format: str = LOCATION_FORMAT_EWKB,
+                                        block_group_index: PolygonIndex | None = None) -> gpd.GeoDataFrame:
+    """
+    A function to spatially join transactions to the census block groups they are in.
+
+    This is the expensive part of the count-based functions (decoding the locations, reprojecting them and
+    the point-in-polygon join), so it can be done once and the result grouped by 'GEOID' as many times as needed.
+
+    Parameters
+    ----------
+    df_transactions_with_locations, gdf_block_group_data, transaction_location_column, is_transaction_location_shaped,
+    transaction_crs, census_gdf_crs, location_format :
+        See `get_transaction_counts_per_block_group`.
+
+    block_group_index : PolygonIndex
+        A spatial index of gdf_block_group_data, to reuse across calls.
+        Each distinct transaction location is only assigned once, and with a lookup cache the stop -> GEOID
+        assignments of earlier runs are reused once saved with its save_lookup method
+        (see `transit_equity.geospatial.polygon_index.PolygonIndex`).
+        Optional. Default is None, which builds a new one.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        The transactions, in census_gdf_crs, with the columns of the block group they are in.
+        Transactions outside of all block groups have a null 'GEOID'.
+    """
+    gdf_transactions = get_transactions_geo_df(df_transactions_with_locations, transaction_location_column,
+                                               is_transaction_location_shaped, transaction_crs, location_format)
+    gdf_transactions = gdf_transactions.to_crs(epsg=census_gdf_crs)
+
+    if block_group_index is None:
+        block_group_index = PolygonIndex(gdf_block_group_data)
+    gdf_transactions_bg = block_group_index.join(gdf_transactions, how='left')
+    return gdf_transactions_bg
+
 # A generic function that groups transactions (of any type, but with the same schema) by census block group
 def get_transaction_counts_per_block_group(df_transactions_with_locations: str, gdf_block_group_data: gpd.GeoDataFrame,
                                            transaction_location_column = 'transaction_location', 
                                            is_transaction_location_shaped: bool = False,
                                            transaction_crs: int = 4326,
                                            census_gdf_crs: int = 32610,
-                                           count_column: str = 'txn_count') -> gpd.GeoDataFrame:
+                                           count_column: str = 'txn_count',
+                                           location_format: str = LOCATION_FORMAT_EWKB,
+                                           block_group_index: PolygonIndex | None = None) -> gpd.GeoDataFrame:
     """
     A function to get the number of transactions per census block group.
 
@@ -114,17 +175,22 @@ def get_transaction_counts_per_block_group(df_transactions_with_locations: str,
     count_column : str
         The name of the column in the output GeoDataFrame that will contain the transaction count
     
+    location_format : str
+        The format of the transaction location. See `get_transactions_geo_df`.
+
+    block_group_index : PolygonIndex
+        A spatial index of gdf_block_group_data, to reuse across calls.
+        Optional. Default is None, which builds a new one.
+    
     Returns
     -------
     gpd.GeoDataFrame
         A GeoDataFrame containing the number of transactions per census block group
     """
-    gdf_transactions = get_transactions_geo_df(df_transactions_with_locations, transaction_location_column, 
-                                               is_transaction_location_shaped, transaction_crs)
-    gdf_transactions = gdf_transactions.to_crs(epsg=census_gdf_crs)
-
-    gdf_transactions_bg = gpd.sjoin(gdf_transactions, gdf_block_group_data, how="left", predicate="within")
-    gdf_transactions_bg_counts = gdf_transactions_bg[['txn_id', 'GEOID']].groupby(by='GEOID', axis=0).count().reset_index()\
+    gdf_transactions_bg = get_transactions_block_group_geo_df(
+        df_transactions_with_locations, gdf_block_group_data, transaction_location_column,
+        is_transaction_location_shaped, transaction_crs, census_gdf_crs, location_format, block_group_index)
+    gdf_transactions_bg_counts = gdf_transactions_bg[['txn_id', 'GEOID']].groupby(by='GEOID').count().reset_index()\
         .rename(columns={'txn_id': count_column})
     
     gdf_block_group_transaction_counts = pd.merge(gdf_block_group_data, gdf_transactions_bg_counts, how='inner', on='GEOID')
@@ -136,7 +202,9 @@ def get_user_counts_per_block_group(df_transactions_with_locations: str, gdf_blo
                                            is_transaction_location_shaped: bool = False,
                                            transaction_crs: int = 4326,
                                            census_gdf_crs: int = 32610,
-                                           count_column: str = 'user_count') -> gpd.GeoDataFrame:
+                                           count_column: str = 'user_count',
+                                           location_format: str = LOCATION_FORMAT_EWKB,
+                                           block_group_index: PolygonIndex | None = None) -> gpd.GeoDataFrame:
     """
     A function to get the number of unique users per census block group.
 
@@ -173,20 +241,25 @@ def get_user_counts_per_block_group(df_transactions_with_locations: str, gdf_blo
     count_column : str
         The name of the column in the output GeoDataFrame that will contain the user count
     
+    location_format : str
+        The format of the transaction location. See `get_transactions_geo_df`.
+
+    block_group_index : PolygonIndex
+        A spatial index of gdf_block_group_data, to reuse across calls.
+        Optional. Default is None, which builds a new one.
+    
     Returns
     -------
     gpd.GeoDataFrame
         A GeoDataFrame containing the number of unique users per census block group
     """
-    gdf_transactions = get_transactions_geo_df(df_transactions_with_locations, transaction_location_column, 
-                                               is_transaction_location_shaped, transaction_crs)
-    gdf_transactions = gdf_transactions.to_crs(epsg=census_gdf_crs)
-
-    gdf_transactions_bg: gpd.GeoDataFrame = gpd.sjoin(gdf_transactions, gdf_block_group_data, how="left", predicate="within")
+    gdf_transactions_bg = get_transactions_block_group_geo_df(
+        df_transactions_with_locations, gdf_block_group_data, transaction_location_column,
+        is_transaction_location_shaped, transaction_crs, census_gdf_crs, location_format, block_group_index)
 
-    gdf_users_bg: pd.DataFrame = gdf_transactions_bg[['txn_id', 'card_id', 'GEOID']].groupby(by=['card_id', 'GEOID'], axis=0).count().reset_index()
+    gdf_users_bg: pd.DataFrame = gdf_transactions_bg[['txn_id', 'card_id', 'GEOID']].groupby(by=['card_id', 'GEOID']).count().reset_index()
 
-    gdf_users_bg_counts: pd.DataFrame = gdf_users_bg[['card_id', 'GEOID']].groupby(by='GEOID', axis=0).count().reset_index()\
+    gdf_users_bg_counts: pd.DataFrame = gdf_users_bg[['card_id', 'GEOID']].groupby(by='GEOID').count().reset_index()\
         .rename(columns={'card_id': count_column})
 
     gdf_block_group_user_counts = pd.merge(gdf_block_group_data, gdf_users_bg_counts, how='inner', on='GEOID')
@@ -202,7 +275,11 @@ def get_all_counts_per_block_group(df_transactions_with_locations: pd.DataFrame,
                                    merge_columns: list = None,
                                    low_income_population_df: pd.DataFrame = None,
                                    low_income_population_column: str = 'low_income_population',
-                                   population_column: str = 'population') -> gpd.GeoDataFrame:
+                                   population_column: str = 'population',
+                                   location_format: str = LOCATION_FORMAT_EWKB,
+                                   transaction_crs: int = 4326,
+                                   aggregations: dict | None = None,
+                                   block_group_index: PolygonIndex | None = None) -> gpd.GeoDataFrame:
     """
     A function to get various counts per census block group.
     These counts include: 
@@ -210,10 +287,14 @@ def get_all_counts_per_block_group(df_transactions_with_locations: pd.DataFrame,
     - Number of unique users per census
     - Number of low-income individuals per census block group (if low_income_population_df is provided)
     - Number of individuals per census block group (if low_income_population_df is provided)
-    Additional counts can be added as needed.
+    Additional counts can be added as needed, see aggregations.
+
+    The transactions are decoded, reprojected and spatially joined to the block groups only once, all the counts
+    are computed in a single groupby on 'GEOID', and the counts are merged to the block groups on 'GEOID'.
+    As with `get_transaction_counts_per_block_group` and `get_user_counts_per_block_group`, only the block groups
+    with at least one user are kept (unless low_income_population_df is provided).
 
     Warning: Works at the census block group level. 
-    (TIGER_MAIN_COLUMNS are used to merge the counts-based GeoDataFrames)
 
     Parameters
     ----------
@@ -245,7 +326,7 @@ def get_all_counts_per_block_group(df_transactions_with_locations: pd.DataFrame,
         The name of the column in the output GeoDataFrame that will contain the user count
     
     merge_columns : list
-        The columns to merge the counts-based GeoDataFrames on. 
+        The columns of gdf_block_group_data to keep in the output GeoDataFrame ('GEOID' is always kept).
         If None, the columns in `transit_equity.census.utils.TIGER_MAIN_COLUMNS` and 'geometry' will be used.
     
     low_income_population_df : pd.DataFrame
@@ -261,41 +342,63 @@ def get_all_counts_per_block_group(df_transactions_with_locations: pd.DataFrame,
 
     population_column : str
         The name of the column in the low_income_population_df that contains the total population count
+
+    location_format : str
+        The format of the transaction location. See `get_transactions_geo_df`.
+
+    transaction_crs : int
+        The CRS of the transaction locations.
+        Default is 4326 (EPSG:4326)
+
+    aggregations : dict
+        Additional aggregates per census block group, as named aggregations of the joined transactions
+        (output column name -> (transaction column, aggregation function)), computed in the same groupby.
+        E.g. {'fare_total': ('fare', 'sum')}.
+
+        Optional.
+        Default is None.
+
+    block_group_index : PolygonIndex
+        A spatial index of gdf_block_group_data, to reuse across calls.
+        Optional. Default is None, which builds a new one.
         
     Returns
     -------
     gpd.GeoDataFrame
         A GeoDataFrame containing the number of transactions and unique users per census block group
     """
-    gdf_block_group_transaction_counts = get_transaction_counts_per_block_group(
-        df_transactions_with_locations, gdf_block_group_data, 
-        transaction_location_column=transaction_location_column, is_transaction_location_shaped=is_transaction_location_shaped,
-        census_gdf_crs=census_gdf_crs, count_column=transaction_count_column)
-    
-    gdf_block_group_user_counts = get_user_counts_per_block_group(
-        df_transactions_with_locations, gdf_block_group_data,
-        transaction_location_column=transaction_location_column, is_transaction_location_shaped=is_transaction_location_shaped,
-        census_gdf_crs=census_gdf_crs, count_column=user_count_column)
-    
+    gdf_transactions_bg = get_transactions_block_group_geo_df(
+        df_transactions_with_locations, gdf_block_group_data, transaction_location_column,
+        is_transaction_location_shaped, transaction_crs, census_gdf_crs, location_format, block_group_index)
+
+    # count() and nunique() skip nulls like the groupby-count of the individual count functions
+    df_block_group_counts = gdf_transactions_bg.groupby(by='GEOID').agg(**{
+        transaction_count_column: ('txn_id', 'count'),
+        user_count_column: ('card_id', 'nunique'),
+        **(aggregations or {}),
+    }).reset_index()
+    df_block_group_counts = df_block_group_counts[df_block_group_counts[user_count_column] > 0]
+
     if merge_columns is None:
         merge_columns = [*TIGER_MAIN_COLUMNS, 'geometry']
-    
-    gdf_block_group_counts = pd.merge(gdf_block_group_transaction_counts, gdf_block_group_user_counts, how='inner',
-                                      on=merge_columns)
-    
-    if low_income_population_df is not None:
-        gdf_low_income_population = gdf_block_group_data.merge(low_income_population_df, on='GEOID', how='right')
+    if 'GEOID' not in merge_columns:
+        merge_columns = ['GEOID', *merge_columns]
+
+    if low_income_population_df is None:
+        how = 'inner'
+    else:
         # Keep only the necessary columns. May need to change this according to new requirements.
-        gdf_low_income_population = gdf_low_income_population[
-            [*merge_columns, low_income_population_column, population_column]]
-    
-        gdf_block_group_counts = pd.merge(gdf_block_group_counts, gdf_low_income_population, how='outer', on=merge_columns)
+        df_low_income_population = low_income_population_df[['GEOID', low_income_population_column, population_column]]
+        df_block_group_counts = pd.merge(df_block_group_counts, df_low_income_population, how='outer', on='GEOID')
+        how = 'right'
 
+    gdf_block_group_counts = pd.merge(gdf_block_group_data[merge_columns], df_block_group_counts, how=how, on='GEOID')
     return gdf_block_group_counts
 
 
 # A generic function used to filter out count-related dataframes by the regions they belong to
-def get_counts_per_block_in_region(gdf_block_group_counts: gpd.GeoDataFrame, gdf_region: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+def get_counts_per_block_in_region(gdf_block_group_counts: gpd.GeoDataFrame, gdf_region: gpd.GeoDataFrame,
+                                   region_index: PolygonIndex | None = None) -> gpd.GeoDataFrame:
     """
     A function to filter out the block group counts by the regions they belong to.
     Not a very necessary function since it is only 1 line of code, but it is here for consistency and readability.
@@ -307,11 +410,206 @@ def get_counts_per_block_in_region(gdf_block_group_counts: gpd.GeoDataFrame, gdf
     
     gdf_region : gpd.GeoDataFrame
         A GeoDataFrame containing the regions
+
+    region_index : PolygonIndex
+        A spatial index of gdf_region, to reuse across calls.
+        Optional. Default is None, which builds a new one.
     
     Returns
     -------
     gpd.GeoDataFrame
         A GeoDataFrame containing the block group counts filtered by the regions they belong to
     """
-    gdf_block_group_counts_region = gpd.sjoin(gdf_block_group_counts, gdf_region, how="inner", predicate="within")
-    return gdf_block_group_counts_region
\ No newline at end of file
+    if region_index is None:
+        region_index = PolygonIndex(gdf_region)
+    gdf_block_group_counts_region = region_index.join(gdf_block_group_counts, how='inner')
+    return gdf_block_group_counts_region
+
+class BlockGroupCountAggregator:
+    """
+    A class to get the number of transactions and of unique users per census block group from chunks of transactions.
+
+    Each chunk is converted to a GeoDataFrame and spatially joined to the block groups exactly like in
+    `get_transaction_counts_per_block_group` and `get_user_counts_per_block_group`. Only the running transaction
+    count per GEOID and the distinct cards per GEOID are kept between chunks, so the transactions never need to fit
+    in memory at once. With distinct_users='exact', the results are identical to those of the in-memory functions.
+
+    Attributes
+    ----------
+    gdf_block_group_data : gpd.GeoDataFrame
+        A GeoDataFrame containing the census block group data, in census_gdf_crs.
+        See `get_transaction_counts_per_block_group`.
+
+    transaction_location_column, is_transaction_location_shaped, transaction_crs, census_gdf_crs, location_format :
+        How to read the transaction locations of each chunk. See `get_transaction_counts_per_block_group`.
+
+    distinct_users : str
+        How to count the unique users per block group.
+        'exact' (default) keeps the set of card ids of each block group.
+        'hll' keeps a HyperLogLog sketch of each block group instead, which takes a fixed
+        2 ** hll_precision bytes per block group however many cards there are, with a relative error
+        of about 1.04 / sqrt(2 ** hll_precision) (1.6% for the default precision of 12).
+
+    hll_precision : int
+        Number of bits of the HyperLogLog register index, between 4 and 16. Defaults to 12.
+
+    block_group_index : PolygonIndex
+        The spatial index of gdf_block_group_data used for every chunk.
+        Built from gdf_block_group_data if not provided.
+
+    Methods
+    -------
+    add_chunk :
+        Add the transactions of a chunk to the running counts.
+
+    get_transaction_counts :
+        Get the number of transactions per census block group, as `get_transaction_counts_per_block_group`.
+
+    get_user_counts :
+        Get the number of unique users per census block group, as `get_user_counts_per_block_group`.
+
+    Examples
+    --------
+    Example 1:
+    >>> aggregator = BlockGroupCountAggregator(gdf_block_group_data,
+    ...     transaction_location_column=TransactionsWithLocations.TRANSACTION_LOCATION_SHAPE_KEY,
+    ...     is_transaction_location_shaped=True)
+    >>> for gdf_chunk in transactions_with_locations.iter_frames(chunk_size=500000, decode_locations=True):
+    ...     aggregator.add_chunk(gdf_chunk)
+    >>> gdf_block_group_transaction_counts = aggregator.get_transaction_counts()
+    >>> gdf_block_group_user_counts = aggregator.get_user_counts()
+    """
+    DISTINCT_USERS_EXACT = 'exact'
+    DISTINCT_USERS_HLL = 'hll'
+
+    def __init__(self, gdf_block_group_data: gpd.GeoDataFrame,
+                 transaction_location_column: str = 'transaction_location',
+                 is_transaction_location_shaped: bool = False,
+                 transaction_crs: int = 4326,
+                 census_gdf_crs: int = 32610,
+                 location_format: str = LOCATION_FORMAT_EWKB,
+                 distinct_users: str = DISTINCT_USERS_EXACT,
+                 hll_precision: int = 12,
+                 block_group_index: PolygonIndex | None = None):
+        if distinct_users not in (self.DISTINCT_USERS_EXACT, self.DISTINCT_USERS_HLL):
+            raise ValueError(f"distinct_users must be 'exact' or 'hll', got {distinct_users!r}")
+        if not 4 <= hll_precision <= 16:
+            raise ValueError('hll_precision must be between 4 and 16')
+
+        self.gdf_block_group_data = gdf_block_group_data
+        self.transaction_location_column = transaction_location_column
+        self.is_transaction_location_shaped = is_transaction_location_shaped
+        self.transaction_crs = transaction_crs
+        self.census_gdf_crs = census_gdf_crs
+        self.location_format = location_format
+        self.distinct_users = distinct_users
+        self.hll_precision = hll_precision
+        self.block_group_index = block_group_index if block_group_index is not None else PolygonIndex(gdf_block_group_data)
+
+        self.txn_counts = pd.Series(dtype='int64', index=pd.Index([], dtype=gdf_block_group_data['GEOID'].dtype))
+        # GEOID -> set of card ids (exact), or GEOID -> HyperLogLog registers (hll)
+        self.user_cards = {}
+
+    def add_chunk(self, df_transactions_with_locations: pd.DataFrame) -> None:
+        """
+        Add the transactions of a chunk to the running counts.
+
+        Parameters
+        ----------
+        df_transactions_with_locations : pd.DataFrame
+            A chunk of transactions with their locations, with 'txn_id' and 'card_id' columns.
+            See `get_transaction_counts_per_block_group`.
+        """
+        gdf_transactions_bg = get_transactions_block_group_geo_df(
+            df_transactions_with_locations, self.gdf_block_group_data, self.transaction_location_column,
+            self.is_transaction_location_shaped, self.transaction_crs, self.census_gdf_crs, self.location_format,
+            self.block_group_index)
+
+        chunk_txn_counts = gdf_transactions_bg[['txn_id', 'GEOID']].groupby(by='GEOID')['txn_id'].count()
+        self.txn_counts = self.txn_counts.add(chunk_txn_counts, fill_value=0).astype('int64')
+
+        df_users_bg = gdf_transactions_bg[['card_id', 'GEOID']].dropna().drop_duplicates()
+        if self.distinct_users == self.DISTINCT_USERS_EXACT:
+            for geoid, card_ids in df_users_bg.groupby(by='GEOID')['card_id']:
+                self.user_cards.setdefault(geoid, set()).update(card_ids.tolist())
+        else:
+            self._add_to_sketches(df_users_bg)
+
+    def get_transaction_counts(self, count_column: str = 'txn_count') -> gpd.GeoDataFrame:
+        """
+        Get the number of transactions per census block group of all chunks so far.
+
+        Parameters
+        ----------
+        count_column : str
+            The name of the column in the output GeoDataFrame that will contain the transaction count
+
+        Returns
+        -------
+        gpd.GeoDataFrame
+            The same GeoDataFrame as `get_transaction_counts_per_block_group` on all the transactions
+        """
+        df_counts = self.txn_counts.rename_axis('GEOID').rename(count_column).reset_index()
+        return pd.merge(self.gdf_block_group_data, df_counts, how='inner', on='GEOID')
+
+    def get_user_counts(self, count_column: str = 'user_count') -> gpd.GeoDataFrame:
+        """
+        Get the number of unique users per census block group of all chunks so far.
+
+        Parameters
+        ----------
+        count_column : str
+            The name of the column in the output GeoDataFrame that will contain the user count
+
+        Returns
+        -------
+        gpd.GeoDataFrame
+            The same GeoDataFrame as `get_user_counts_per_block_group` on all the transactions
+            (with distinct_users='exact'), or an estimate of it (with distinct_users='hll')
+        """
+        geoids = list(self.user_cards)
+        if self.distinct_users == self.DISTINCT_USERS_EXACT:
+            counts = [len(self.user_cards[geoid]) for geoid in geoids]
+        else:
+            counts = [_estimate_hll_cardinality(self.user_cards[geoid]) for geoid in geoids]
+        df_counts = pd.DataFrame({'GEOID': pd.Series(geoids, dtype=self.txn_counts.index.dtype),
+                                  count_column: np.asarray(counts, dtype='int64')})
+        return pd.merge(self.gdf_block_group_data, df_counts, how='inner', on='GEOID')
+
+    def _add_to_sketches(self, df_users_bg: pd.DataFrame) -> None:
+        # 64-bit hashes of the card ids: the top bits pick the register, the rank of the rest is stored in it.
+        # The ids are cast to int64 first, since the same id hashes differently as int64 and float64 (read_sql
+        # returns float64 card ids in the chunks with a null one)
+        card_ids = df_users_bg['card_id'].astype('int64')
+        hashes = pd.util.hash_pandas_object(card_ids, index=False).to_numpy(dtype=np.uint64)
+        n_rest_bits = 64 - self.hll_precision
+        registers = (hashes >> np.uint64(n_rest_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << n_rest_bits) - 1)
+        ranks = (n_rest_bits - _get_bit_length(rest) + 1).astype(np.uint8)
+
+        for geoid, positions in df_users_bg.groupby(by='GEOID').indices.items():
+            sketch = self.user_cards.get(geoid)
+            if sketch is None:
+                sketch = self.user_cards[geoid] = np.zeros(1 << self.hll_precision, dtype=np.uint8)
+            np.maximum.at(sketch, registers[positions], ranks[positions])
+
+def _get_bit_length(values: np.ndarray) -> np.ndarray:
+    # exact bit length of uint64 values, found by binary search on the highest set bit
+    values = values.copy()
+    bit_length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        is_high = values >= np.uint64(1 << shift)
+        bit_length[is_high] += shift
+        values[is_high] >>= np.uint64(shift)
+    bit_length += values > 0
+    return bit_length
+
+def _estimate_hll_cardinality(sketch: np.ndarray) -> int:
+    n_registers = len(sketch)
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(n_registers, 0.7213 / (1 + 1.079 / n_registers))
+    estimate = alpha * n_registers ** 2 / np.sum(np.ldexp(1.0, -sketch.astype(np.int64)))
+    n_zero_registers = np.count_nonzero(sketch == 0)
+    if estimate <= 2.5 * n_registers and n_zero_registers > 0:
+        # small range correction (linear counting)
+        estimate = n_registers * np.log(n_registers / n_zero_registers)
+    return int(round(estimate))
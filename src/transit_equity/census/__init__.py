@@ -10,4 +10,6 @@ income: Module containing constants and functions to get income distribution dat
 household_size: Module containing constants and functions to get household size data
 
 income_poverty_level_ratio: Module containing constants and functions to get income to poverty level ratio data
+
+census_cache: Module containing a caching layer around the Census client for block group data
 """
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+This module contains a caching layer around the Census client, to get census block group data from the US Census
+Bureau API once and read it from disk afterwards.
+
+The responses are stored in a ParquetCache, with one entry per (dataset, year, geography). Each entry holds every
+field requested so far for its geography, so the income, income to poverty level ratio, household size and
+population fields are fetched in a single request per set of counties (the census package splits requests of more
+than 49 fields and joins them back). A cache directory can be kept as a recorded fixture: a CachedCensus without a
+Census client only reads from it, and never calls the API.
+
+Constants
+---------
+ACS_BLOCK_GROUP_FIELDS :
+    The ACS fields used by the low income analysis, requested together for each geography
+
+Classes
+-------
+CachedCensus :
+    A class wrapping a Census object to cache its block group requests on disk
+
+CachedCensusDataset :
+    A class standing in for a dataset of a Census object, with its requests cached by a CachedCensus
+"""
+import pandas as pd
+from census import Census
+import us
+
+from ..utils.parquet_cache import ParquetCache, get_cache_key
+from .household_size import HOUSEHOLD_SIZE_COLUMNS
+from .income import INCOME_DISTRIBUTION_COLUMNS
+from .income_poverty_level_ratio import INCOME_POVERTY_LEVEL_RATIO_COLUMNS
+from .population import POPULATION_COLUMNS
+from .puget_sound import FIPS_PUGET_SOUND
+
+# Version of the cached responses, to bump if their layout changes
+CENSUS_CACHE_VERSION = 1
+
+# The geography columns of the census block group responses
+CENSUS_BLOCK_GROUP_GEOGRAPHY_COLUMNS = ['state', 'county', 'tract', 'block group']
+
+# The ACS fields used by the low income analysis, requested together for each geography
+ACS_BLOCK_GROUP_FIELDS = [
+    'NAME',
+    *[column.value.field for column in INCOME_DISTRIBUTION_COLUMNS],
+    *[column.value.field for column in INCOME_POVERTY_LEVEL_RATIO_COLUMNS],
+    *[column.value.field for column in HOUSEHOLD_SIZE_COLUMNS],
+    *[column.value.field for column in POPULATION_COLUMNS],
+]
+
+class CachedCensus:
+    """
+    A class wrapping a Census object to cache its block group requests on disk.
+
+    A CachedCensus can be passed instead of a Census object to the functions that call
+    `census.acs5.state_county_blockgroup` (e.g. `get_income_poverty_level_ratio_df`).
+
+    Attributes:
+    ----------
+    census: Census
+        The Census object that is connected to the API.
+        None to only read the cached responses (e.g. offline, or from a recorded fixture).
+    cache: ParquetCache
+        The cache of the responses. A directory path can be given instead.
+    prefetch_fields: dict
+        The fields to request with any request of a dataset, by dataset.
+        Defaults to {'acs5': ACS_BLOCK_GROUP_FIELDS}.
+
+    Examples:
+    ---------
+    Example 1:
+    >>> census = CachedCensus(get_census('.env'), '~/.cache/transit_equity/census')
+    >>> income_poverty_level_ratio_df = get_income_poverty_level_ratio_df(census)
+
+    Example 2:
+    >>> # offline, from a recorded cache directory
+    >>> census = CachedCensus(None, 'fixtures/census')
+    >>> income_poverty_level_ratio_df = get_income_poverty_level_ratio_df(census)
+    """
+    def __init__(self, census: Census | None, cache: ParquetCache | str, prefetch_fields: dict | None = None):
+        self.census = census
+        self.cache = ParquetCache(cache) if isinstance(cache, str) else cache
+        self.prefetch_fields = {'acs5': ACS_BLOCK_GROUP_FIELDS} if prefetch_fields is None else prefetch_fields
+        self.acs5 = CachedCensusDataset(self, 'acs5')
+
+    def get_state_county_blockgroup(self, fields: list, state_fips: str = us.states.WA.fips,
+                                    county_fips: str|list = None, blockgroup: str = '*', year: int = 2022,
+                                    dataset: str = 'acs5', tract: str = None) -> pd.DataFrame:
+        """
+        A function to get census fields for block groups, from the cache if they were requested before.
+
+        Parameters:
+        -----------
+        fields: list
+            The list of fields to get from the census data
+        state_fips: str
+            The FIPS code of the state
+        county_fips: str|list
+            The FIPS codes of the counties, as a list or a comma separated string.
+            Defaults to FIPS_PUGET_SOUND.
+        blockgroup: str
+            The block group, '*' for all of them
+        year: int
+            The year of the census data
+        dataset: str
+            The census dataset, e.g. 'acs5'
+        tract: str
+            The tract of the block groups, None for all of them
+
+        Returns:
+        --------
+        pd.DataFrame
+            A pandas DataFrame with the requested fields and the geography columns (state, county, tract, block group)
+        """
+        if county_fips is None:
+            county_fips = FIPS_PUGET_SOUND
+        if isinstance(county_fips, str):
+            county_fips = county_fips.split(',')
+        county_fips = sorted(set(county_fips))
+        fields = list(dict.fromkeys(fields))
+
+        key = get_cache_key(version=CENSUS_CACHE_VERSION, dataset=dataset, year=year, state=state_fips,
+                            county=county_fips, tract=tract, blockgroup=blockgroup)
+        census_df = self.cache.load(key)
+        if census_df is None or not set(fields).issubset(census_df.columns):
+            if self.census is None:
+                raise ValueError(f'The {dataset} {year} fields {fields} of the block groups of state {state_fips} '
+                                 f'and counties {county_fips} are not cached, and there is no Census client')
+            cached_fields = [] if census_df is None else \
+                [column for column in census_df.columns if column not in CENSUS_BLOCK_GROUP_GEOGRAPHY_COLUMNS]
+            request_fields = list(dict.fromkeys([*cached_fields, *self.prefetch_fields.get(dataset, []), *fields]))
+
+            census_response = getattr(self.census, dataset).state_county_blockgroup(
+                fields=request_fields, state_fips=state_fips, county_fips=','.join(county_fips),
+                blockgroup=blockgroup, tract=tract, year=year)
+            census_df = pd.DataFrame(census_response)
+            self.cache.save(key, census_df)
+
+        geography_columns = [column for column in CENSUS_BLOCK_GROUP_GEOGRAPHY_COLUMNS
+                             if column in census_df.columns and column not in fields]
+        return census_df[[*fields, *geography_columns]]
+
+class CachedCensusDataset:
+    """
+    A class standing in for a dataset of a Census object (e.g. `census.acs5`), with its requests cached by a CachedCensus.
+
+    Attributes:
+    ----------
+    cached_census: CachedCensus
+        The CachedCensus that caches the requests
+    dataset: str
+        The census dataset, e.g. 'acs5'
+    """
+    def __init__(self, cached_census: CachedCensus, dataset: str):
+        self.cached_census = cached_census
+        self.dataset = dataset
+
+    def state_county_blockgroup(self, fields: list, state_fips: str, county_fips: str, blockgroup: str,
+                                tract: str = None, year: int = 2022) -> list:
+        """
+        Same as `Census.acs5.state_county_blockgroup`, returning a list of records
+        """
+        census_df = self.cached_census.get_state_county_blockgroup(
+            fields, state_fips, county_fips, blockgroup, year, self.dataset, tract)
+        return census_df.to_dict('records')
@@ -13,7 +13,11 @@ Functions
 ---------
 get_average_household_size_from_census_row :
     A function to get the average household size for a census row
+
+get_average_household_size_df :
+    A function to get the average household size for every row of a census DataFrame
 """
+import numpy as np
 import pandas as pd
 from enum import Enum
 
@@ -94,8 +98,7 @@ class HOUSEHOLD_SIZE_COLUMNS(Enum):
 
 
 
-# TODO: This function can be extended to do a calculation on an entire pandas DataFrame
-# The extended function will also have better performance.
+# For an entire pandas DataFrame, use get_average_household_size_df, which is much faster than applying this function
 def get_average_household_size_from_census_row(census_row: pd.Series) -> float:
     """
     A function to get the average household size for a census row.
@@ -147,4 +150,56 @@ def get_average_household_size_from_census_row(census_row: pd.Series) -> float:
         if column.value.field not in census_row:
             continue
         total_people += census_row[column.value.field] * column.value.count
-    return total_people / total_households
\ No newline at end of file
+    return total_people / total_households
+
+def get_average_household_size_df(census_df: pd.DataFrame) -> pd.Series:
+    """
+    A function to get the average household size for every row of a census DataFrame.
+    It gives the same values as applying get_average_household_size_from_census_row to each row,
+        with the number of people computed as one matrix product of the household counts and the household sizes.
+
+    Parameters:
+    ----------
+    census_df: pd.DataFrame
+        A pandas DataFrame containing the census data
+        Each row contains the number of households of different sizes (e.g. 2-person, 3-person, etc.), in a census area.
+        It is recommended to have all the columns in transit_equity.census.household_size.HOUSEHOLD_SIZE_COLUMNS
+    
+    Returns:
+    -------
+    pd.Series
+        The average household size of each row, 0 for the rows without households
+
+    Examples:
+    --------
+    Example 1:
+
+    Same census row as in get_average_household_size_from_census_row, and a row without households.
+
+    >>> import pandas as pd
+    >>> from transit_equity.census.household_size import get_average_household_size_df
+    >>> census_df = pd.DataFrame({
+    ...     'B11016_001E': [100, 0],
+    ...     'B11016_002E': [100, 0],
+    ...     'B11016_003E': [50, 0],
+    ...     'B11016_004E': [30, 0],
+    ...     'B11016_005E': [20, 0],
+    ...     # Rest of the columns are 0
+    ... })
+    >>> get_average_household_size_df(census_df)
+    0    2.7
+    1    0.0
+    dtype: float64
+    """
+    if HOUSEHOLD_SIZE_COLUMNS.B11016_001E.value.field not in census_df:
+        return pd.Series(0.0, index=census_df.index)
+    total_households = census_df[HOUSEHOLD_SIZE_COLUMNS.B11016_001E.value.field].to_numpy(dtype=float)
+
+    columns = [column for column in HOUSEHOLD_SIZE_COLUMNS if column.value.field in census_df]
+    household_counts = census_df[[column.value.field for column in columns]].to_numpy(dtype=float)
+    household_sizes = np.array([column.value.count for column in columns], dtype=float)
+    total_people = household_counts @ household_sizes
+
+    average_household_size = np.divide(total_people, total_households,
+                                       out=np.zeros(len(census_df)), where=total_households != 0)
+    return pd.Series(average_household_size, index=census_df.index)
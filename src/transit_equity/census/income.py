@@ -13,7 +13,14 @@ Functions
 ---------
 get_households_in_income_range :
     A function to get the number of households in a given income range from a census row
+
+get_income_range_weights :
+    A function to get the weight of each income distribution column in a given income range
+
+get_households_in_income_range_df :
+    A function to get the number of households in a given income range for every row of a census DataFrame
 """
+import numpy as np
 import pandas as pd
 from enum import Enum
 
@@ -104,10 +111,7 @@ class INCOME_DISTRIBUTION_COLUMNS(Enum):
         label='200000_or_more', min_income=200000, max_income=1e9)
 
 
-# TODO: This function can be extended to do a calculation on an entire pandas DataFrame
-# The extended function will also have better performance.
-# TODO: Create another function that returns the columns that fall within the income range
-# Such a function is more extensible as we can do more nuanced analysis, with less assumptions about the data
+# For an entire pandas DataFrame, use get_households_in_income_range_df, which is much faster than applying this function
 def get_households_in_income_range(income_distribution_row: pd.Series, min_income: int, max_income: int) -> int:
     """
     A function to get the number of households in a given income range from a census row.
@@ -174,3 +178,111 @@ def get_households_in_income_range(income_distribution_row: pd.Series, min_incom
             # This logic can be improved based on some heuristics
             households += income_distribution_row[column.value.field]
     return households
+
+def get_income_range_weights(min_income: int, max_income: int, interpolate: bool = False) -> pd.Series:
+    """
+    A function to get the weight of each income distribution column in a given income range,
+        i.e. the share of the households of the column that are counted in the range.
+
+    Parameters:
+    ----------
+    min_income: int
+        Left end of the income range
+    
+    max_income: int
+        Right end of the income range
+
+    interpolate: bool
+        If False, a column that is partially in the range is considered whole (weight 1),
+            as in get_households_in_income_range.
+        If True, it is weighted by the share of its income range within [min_income, max_income],
+            assuming the households are spread uniformly over the income range of the column.
+        Defaults to False.
+    
+    Returns:
+    -------
+    pd.Series
+        The weight of each column of INCOME_DISTRIBUTION_COLUMNS, indexed by field name
+
+    Examples:
+    --------
+    Example 1:
+
+    The income range is [0, 12499]. The 10000 to 14999 column is half in the range.
+
+    >>> from transit_equity.census.income import get_income_range_weights
+    >>> weights = get_income_range_weights(0, 12499, interpolate=True)
+    >>> weights[['B19001_001E', 'B19001_002E', 'B19001_003E', 'B19001_004E']].tolist()
+    [0.0, 1.0, 0.5, 0.0]
+    """
+    weights = {}
+    for column in INCOME_DISTRIBUTION_COLUMNS:
+        column_min_income, column_max_income = column.value.min_income, column.value.max_income
+        # Same conditions as in get_households_in_income_range
+        if column_min_income >= min_income and column_max_income <= max_income:
+            weight = 1.0
+        elif column_min_income >= max_income or column_max_income <= min_income:
+            weight = 0.0
+        elif interpolate:
+            # The incomes are whole dollars, so the column [10000, 14999] spans 5000 values
+            overlap = min(column_max_income, max_income) - max(column_min_income, min_income) + 1
+            weight = overlap / (column_max_income - column_min_income + 1)
+        else:
+            weight = 1.0
+        weights[column.value.field] = weight
+    return pd.Series(weights, dtype=float)
+
+def get_households_in_income_range_df(income_distribution_df: pd.DataFrame, min_income: int, max_income: int,
+                                      interpolate: bool = False) -> pd.Series:
+    """
+    A function to get the number of households in a given income range for every row of a census DataFrame.
+    With interpolate=False, it gives the same values as applying get_households_in_income_range to each row,
+        with the sums computed as one matrix product of the household counts and the weights of get_income_range_weights.
+
+    Parameters:
+    ----------
+    income_distribution_df: pd.DataFrame
+        A pandas DataFrame containing the income distribution data
+        Each row contains the number of households in different income ranges, in a census area.
+        It is recommended to have all the columns in transit_equity.census.income.INCOME_DISTRIBUTION_COLUMNS
+    
+    min_income: int
+        Left end of the income range
+    
+    max_income: int
+        Right end of the income range
+
+    interpolate: bool
+        Whether to count the columns that are partially in the range by the share of their income range within it.
+        See get_income_range_weights. Defaults to False.
+    
+    Returns:
+    -------
+    pd.Series
+        The number of households in the given income range for each row
+
+    Examples:
+    --------
+    Example 1:
+
+    Same census row as in get_households_in_income_range, with the income range [0, 12499].
+    Expected Answer: 20 + 30 = 50, or 20 + 30 * 0.5 = 35 with interpolation
+
+    >>> import pandas as pd
+    >>> from transit_equity.census.income import get_households_in_income_range_df
+    >>> income_distribution_df = pd.DataFrame({
+    ...     'B19001_001E': [100],
+    ...     'B19001_002E': [20],
+    ...     'B19001_003E': [30],
+    ...     'B19001_004E': [50],
+    ...     # Rest of the columns are 0
+    ... })
+    >>> get_households_in_income_range_df(income_distribution_df, 0, 12499).tolist()
+    [50.0]
+    >>> get_households_in_income_range_df(income_distribution_df, 0, 12499, interpolate=True).tolist()
+    [35.0]
+    """
+    weights = get_income_range_weights(min_income, max_income, interpolate)
+    weights = weights[weights.index.isin(income_distribution_df.columns)]
+    households = income_distribution_df[weights.index].to_numpy(dtype=float) @ weights.to_numpy()
+    return pd.Series(households, index=income_distribution_df.index)
@@ -112,7 +112,8 @@ def get_income_poverty_level_ratio_df(census: Census,
     Parameters:
     -----------
     census: Census
-        The Census object that is connected to the API
+        The Census object that is connected to the API.
+        A CachedCensus can be used instead, to read the data from disk if it was requested before.
 
     fields: list
         The list of fields to get from the census data.
@@ -144,10 +145,10 @@ def get_income_poverty_level_ratio_df(census: Census,
     
     census_income_poverty_ratio = census.acs5.state_county_blockgroup(fields = fields,
         #'C17002_001E', 'C17002_002E', 'C17002_003E', 'B01003_001E'),
-        state_fips = us.states.WA.fips,
+        state_fips = state_fips,
         county_fips = ','.join(county_fips), 
-        blockgroup = "*",
-        year = 2022)
+        blockgroup = blockgroup,
+        year = year)
     income_poverty_level_ratio_df = pd.DataFrame(census_income_poverty_ratio)
     return income_poverty_level_ratio_df
 
@@ -19,6 +19,8 @@ get_puget_sound_block_group_data :
 """
 import geopandas as gpd
 
+from ..utils.artifact_store import ArtifactStore
+
 # Example Link for 
 CENSUS_GROUP_WASHINGTON_LINK = \
     "https://www2.census.gov/geo/tiger/TIGER2022/BG/tl_2022_53_bg.zip"
@@ -31,14 +33,46 @@ FIPS_PUGET_SOUND_ALL = ['033', '035','053','061', '029', '031', '045', '057', '0
 
 def get_puget_sound_block_group_data(
         block_group_wa_link: str = CENSUS_GROUP_WASHINGTON_LINK,
-        fips_list: list = FIPS_PUGET_SOUND
+        fips_list: list = FIPS_PUGET_SOUND,
+        crs: int | None = None,
+        artifact_store: ArtifactStore | None = None,
+        block_group_wa_path: str | None = None
     ):
     """
     A function to get the census block data for Puget Sound
+
+    Parameters
+    ----------
+    block_group_wa_link : str
+        Link of the shapefile of the Washington census block groups
+    fips_list : list
+        County FIPS codes of the block groups to keep
+    crs : int, optional
+        EPSG code to reproject the block groups to, e.g. 32610. Defaults to None (the CRS of the shapefile).
+    artifact_store : ArtifactStore, optional
+        Store to keep the shapefile and the filtered block groups in, so that they are downloaded once and
+        later calls read them from disk. Defaults to None (the shapefile is read from block_group_wa_link).
+    block_group_wa_path : str, optional
+        Local copy of the shapefile, used by artifact_store instead of downloading it
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        The census block groups of the counties of fips_list
     """
+    def filter_block_groups(gdf_wa_block_group: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        gdf_puget_sound_block_group = gdf_wa_block_group[gdf_wa_block_group['COUNTYFP'].isin(fips_list)]
+        if crs is not None:
+            gdf_puget_sound_block_group = gdf_puget_sound_block_group.to_crs(epsg=crs)
+        return gdf_puget_sound_block_group
+
+    if artifact_store is not None:
+        return artifact_store.load_layer(
+            'puget_sound_block_groups', block_group_wa_link, filter_block_groups,
+            params={'fips_list': list(fips_list), 'crs': crs}, local_path=block_group_wa_path
+        )
+
     # Access shapefile of Washington census block groups
     gdf_wa_block_group = gpd.read_file(block_group_wa_link)
 
-    gdf_puget_sound_block_group = gdf_wa_block_group[gdf_wa_block_group['COUNTYFP'].isin(fips_list)]
-
-    return gdf_puget_sound_block_group
\ No newline at end of file
+    return filter_block_groups(gdf_wa_block_group)
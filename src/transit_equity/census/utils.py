@@ -6,6 +6,9 @@ Constants
 TIGER_MAIN_COLUMNS :
     The main columns that are present in the TIGER shapefiles
 
+GEO_ID_WIDTHS :
+    The number of digits of each part of a block group GEOID
+
 Functions
 ---------
 get_geo_id:
@@ -18,6 +21,9 @@ from dotenv import load_dotenv
 TIGER_MAIN_COLUMNS = ['STATEFP', 'COUNTYFP', 'TRACTCE', 'BLKGRPCE', 'GEOID']
 CENSUS_MAIN_COLUMNS = ['NAME', 'state', 'county', 'tract', 'block group']
 
+# The number of digits of each part of a block group GEOID, e.g. 53 033 000100 1
+GEO_ID_WIDTHS = {'state': 2, 'county': 3, 'tract': 6, 'block group': 1}
+
 def get_census(path_env: str, census_api_key: str = 'CENSUS_API_KEY') -> Census:
     """
     Get the Census object using the API key
@@ -47,10 +53,14 @@ def get_census(path_env: str, census_api_key: str = 'CENSUS_API_KEY') -> Census:
     return census
 
 def get_geo_id(census_df: pd.DataFrame, state_col: str = 'state', county_col: str = 'county', 
-               tract_col: str = 'tract', block_group_col: str = 'block group') -> pd.DataFrame:
+               tract_col: str = 'tract', block_group_col: str = 'block group',
+               as_int: bool = False, block_group_width: int = GEO_ID_WIDTHS['block group']) -> pd.Series:
     """
     Get the GEOID column for a census DataFrame
 
+    The parts of the GEOID are concatenated as strings, for all rows at once. Integer parts are zero-padded
+    to their width (GEO_ID_WIDTHS), and a part that does not have exactly that many digits raises a ValueError.
+
     Parameters
     ----------
     census_df : pd.DataFrame
@@ -67,12 +77,44 @@ def get_geo_id(census_df: pd.DataFrame, state_col: str = 'state', county_col: st
     
     block_group_col : str
         The name of the column that contains the block group data
+
+    as_int : bool
+        Whether to return the GEOID as int64 instead of str. Integer GEOIDs are smaller and faster to merge on,
+        but they have to be converted back (zero-padded) to be merged with the str GEOIDs of the TIGER shapefiles.
+        Defaults to False.
+
+    block_group_width : int
+        The number of digits of the block group column. Defaults to 1.
+        Use 4 with the block column instead, to get block GEOIDs.
     
     Returns
     -------
     pd.Series
         A pandas Series containing the GEOID values
+
+    Examples
+    --------
+    Example 1:
+    >>> census_df = pd.DataFrame({'state': ['53'], 'county': ['033'], 'tract': ['000100'], 'block group': ['1']})
+    >>> get_geo_id(census_df).tolist()
+    ['530330001001']
+    >>> get_geo_id(census_df, as_int=True).tolist()
+    [530330001001]
     """
-    geo_id_col = census_df.apply(
-        lambda row: row[state_col] + row[county_col] + row[tract_col] + row[block_group_col], axis=1)
-    return geo_id_col
\ No newline at end of file
+    columns_widths = {state_col: GEO_ID_WIDTHS['state'], county_col: GEO_ID_WIDTHS['county'],
+                      tract_col: GEO_ID_WIDTHS['tract'], block_group_col: block_group_width}
+
+    geo_id_col = pd.Series('', index=census_df.index, dtype=object)
+    for column, width in columns_widths.items():
+        part = census_df[column]
+        if pd.api.types.is_integer_dtype(part):
+            part = part.astype(str).str.zfill(width)
+        part = part.astype(str)
+        is_invalid = (part.str.len() != width) | ~part.str.isdigit()
+        if is_invalid.any():
+            raise ValueError(f'The {column} column must have {width} digits, got {part[is_invalid].iloc[0]!r}')
+        geo_id_col = geo_id_col + part
+
+    if as_int:
+        return geo_id_col.astype('int64')
+    return geo_id_col
@@ -5,32 +5,47 @@ and filter trips based on frequency.
 
 Functions:
 ----------
-1. import_hexgrid(postgres_url, table_name):
+1. import_hexgrid(postgres_url, table_name, location_format=LOCATION_FORMAT_EWKB):
     Import and convert a hex grid table from a PostgreSQL database to a GeoDataFrame.
 
 2. get_hex_centroids(geo_df, hex_geo_df):
     Calculate the centroids of hexagons in a GeoDataFrame and reproject them to match the CRS of 
     another GeoDataFrame.
 
-3. assign_stops_to_hex_centroids(geo_df, hex_grid_with_centroids, stop_type):
+3. assign_stops_to_hex_centroids(geo_df, hex_grid_with_centroids, stop_type, hex_grid_index=None):
     Assign boarding or alighting stops to hexagon centroids by performing a spatial join.
 
-4. merge_and_filter_trip_centroids_gdf(boardings_centroids,
+4. assign_stops_to_hex_cells(geo_df, hex_grid, stop_type):
+    Assign boarding or alighting stops to the centroids of the cells of a computed hex grid,
+    without a spatial join.
+
+5. merge_and_filter_trip_centroids_gdf(boardings_centroids,
                                         alights_centroids, 
-                                        trip_frequency_cutoff=0):
+                                        trip_frequency_cutoff=0,
+                                        include_location_strings=True):
     Merge boarding and alighting centroids, calculate trip frequencies between centroids,
     and filter the resulting GeoDataFrame based on a trip frequency cutoff.
 """
 import os
 import pandas as pd
 import geopandas as gpd
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from ..geospatial.format_conversions import load_wkb
-from ..utils.db_helpers import get_automap_base_with_views
+from ..geospatial.format_conversions import LOCATION_FORMAT_EWKB, LOCATION_FORMAT_WKB, \
+    factorize_points, get_location_columns, load_location_series
+from ..geospatial.hexgrid import HexGrid
+from ..geospatial.polygon_index import PolygonIndex
+from ..networks.frequency import add_od_frequency
+from ..networks.od_keys import LocationEncoder, pack_od_keys
+from ..utils.db_helpers import get_automap_base_with_views, get_pooled_engine
+
+# Location formats supported for the hex grid polygons (x/y only applies to points)
+HEXGRID_LOCATION_FORMATS = (LOCATION_FORMAT_EWKB, LOCATION_FORMAT_WKB)
 
 def import_hexgrid(postgres_url,
-                   table_name):
+                   table_name,
+                   location_format=LOCATION_FORMAT_EWKB,
+                   statement_timeout_ms=None,
+                   registry=None):
     """
     Import and convert a hex grid table from a PostgreSQL database to a GeoDataFrame.
 
@@ -43,6 +58,16 @@ def import_hexgrid(postgres_url,
         The URL for connecting to the PostgreSQL database.
     table_name : str
         The name of the hex grid table to be imported.
+    location_format : str
+        The format in which the geometries are pulled from the database. Defaults to
+        LOCATION_FORMAT_EWKB (hex EWKB strings). LOCATION_FORMAT_WKB pulls raw WKB bytes with
+        ST_AsBinary, which halves the transfer size of the geometry column.
+    statement_timeout_ms : int, optional
+        Statement timeout of the database connections, in milliseconds. Defaults to None (the
+        server setting). The pooled engine is shared with every other call with the same URL.
+    registry : transit_equity.utils.db_helpers.ReflectionRegistry, optional
+        Registry to take the reflected hex grid table from, e.g. REFLECTION_REGISTRY. Defaults to
+        None, which reflects the table for this call.
 
     Returns
     -------
@@ -54,26 +79,31 @@ def import_hexgrid(postgres_url,
     The CRS of the GeoDataFrame is set to EPSG:32610. This was the CRS that the hexgrid was created
     in.
     """
+    if location_format not in HEXGRID_LOCATION_FORMATS:
+        raise ValueError(f'location_format must be one of {HEXGRID_LOCATION_FORMATS}, '
+                         f'got {location_format!r}')
 
-    engine = create_engine(os.getenv(postgres_url))
+    engine = get_pooled_engine(os.getenv(postgres_url), statement_timeout_ms=statement_timeout_ms)
 
-    # Setup Session Maker and Session
+    # Setup Session Maker
     session_maker = sessionmaker(bind=engine)
-    session = session_maker()
 
-    # DSSG Schema Base
-    base_dssg = get_automap_base_with_views(engine=engine, schema='dssg')
+    # DSSG Schema Base, with only the hex grid table reflected
+    base_dssg = get_automap_base_with_views(engine=engine, schema='dssg', only=[table_name],
+                                            registry=registry)
 
     # Hex grid table
     hex_grid_400m = base_dssg.metadata.tables[table_name]
 
-    # query the geometry column
-    hex_query = session.query(hex_grid_400m.c.wkb_geometry)
+    # query the geometry column, closing the session and returning the connection once read
+    with session_maker() as session, engine.connect() as connection:
+        hex_query = session.query(
+            *get_location_columns(hex_grid_400m.c.wkb_geometry, 'wkb_geometry', location_format))
 
-    hex_table = pd.read_sql(hex_query.statement, engine)
+        hex_table = pd.read_sql(hex_query.statement, connection)
 
     #convert geom to shapely object
-    hex_table['wkb_geometry'] = hex_table['wkb_geometry'].apply(load_wkb)
+    hex_table['wkb_geometry'] = load_location_series(hex_table, 'wkb_geometry', location_format)
 
     hex_gdf = gpd.GeoDataFrame(hex_table, geometry='wkb_geometry')
 
@@ -119,7 +149,7 @@ def get_hex_centroids(geo_df, hex_geo_df):
     hex_400m['centroid_location'] = hex_centroids
     return hex_400m
 
-def assign_stops_to_hex_centroids(geo_df, hex_grid_with_centroids, stop_type):
+def assign_stops_to_hex_centroids(geo_df, hex_grid_with_centroids, stop_type, hex_grid_index=None):
     """
     Assigns boarding or alighting stops to hexagon centroids by performing a spatial join.
 
@@ -130,6 +160,10 @@ def assign_stops_to_hex_centroids(geo_df, hex_grid_with_centroids, stop_type):
         corresponding centroids.
     stop_type (str): A string indicating the type of stop to process, either 'board' for boarding
         stops or 'alight' for alighting stops.
+    hex_grid_index (PolygonIndex, optional): A spatial index of `hex_grid_with_centroids`, e.g. to
+        reuse the same one for the boarding and alighting stops, or one with a lookup cache per
+        GTFS feed to skip the spatial join for the stops assigned in earlier runs (saved with its
+        save_lookup method). Defaults to None, which builds a new one.
 
     Returns:
     GeoDataFrame: A GeoDataFrame with stop data assigned to the corresponding hexagon centroids,
@@ -164,8 +198,9 @@ def assign_stops_to_hex_centroids(geo_df, hex_grid_with_centroids, stop_type):
     gdf_boarding = gdf_boarding.to_crs('EPSG:3857')
 
     # Perform a spatial join to determine which polygon each point is contained in
-    gdf_boarding_poly_joined = gpd.sjoin(gdf_boarding, hex_grid_with_centroids, how='left',
-                                         predicate='within')
+    if hex_grid_index is None:
+        hex_grid_index = PolygonIndex(hex_grid_with_centroids)
+    gdf_boarding_poly_joined = hex_grid_index.join(gdf_boarding, how='left')
 
     if stop_type == 'board':
         centroid_col_name = 'board_centroid'
@@ -187,9 +222,75 @@ def assign_stops_to_hex_centroids(geo_df, hex_grid_with_centroids, stop_type):
 
     return gdf_boarding_poly_joined
 
+def assign_stops_to_hex_cells(geo_df, hex_grid, stop_type):
+    """
+    Assigns boarding or alighting stops to the centroids of the cells of a computed hex grid.
+
+    This is a drop-in alternative to `assign_stops_to_hex_centroids` that finds the cell of each
+    stop arithmetically (see transit_equity.geospatial.hexgrid) instead of joining the stops to the
+    hex grid polygons, so the hex grid does not need to be pulled from the database.
+
+    Parameters:
+    geo_df (GeoDataFrame): A GeoDataFrame containing stop data with geometries for boarding or
+        alighting locations.
+    hex_grid (HexGrid): The computed hex grid, e.g. HexGrid.from_polygons(import_hexgrid(...)) or
+        HexGrid(size=400).
+    stop_type (str): A string indicating the type of stop to process, either 'board' for boarding
+        stops or 'alight' for alighting stops.
+
+    Returns:
+    GeoDataFrame: The same columns as `assign_stops_to_hex_centroids`, with the stop locations and
+        the cell centers in EPSG:3857. Unlike with the hex grid polygons, every stop has a cell:
+        stops outside of the area covered by the database grid are kept.
+
+    Example:
+    hex_grid = HexGrid.from_polygons(import_hexgrid('POSTGRES_URL', 'hex_grid_400m'))
+    boardings_centroids = assign_stops_to_hex_cells(trips_gdf, hex_grid, 'board')
+    alights_centroids = assign_stops_to_hex_cells(trips_gdf, hex_grid, 'alight')
+    """
+    if stop_type == 'board':
+        location_column = 'board_location_shapely'
+        centroid_col_name = 'board_centroid'
+    elif stop_type == 'alight':
+        location_column = 'alight_location_shapely'
+        centroid_col_name = 'alight_centroid'
+
+    #select relevant cols
+    gdf_stops = geo_df[['card_id', location_column, 'trip_time_minutes', 'trip_frequency']]
+    gdf_stops = gdf_stops[gdf_stops[location_column].notnull()]
+
+    # Ensure shapely locations are set as geometry dtype, with the same default crs as
+    # assign_stops_to_hex_centroids
+    gdf_stops = gdf_stops.set_geometry(location_column)
+    if gdf_stops.crs is None:
+        gdf_stops = gdf_stops.set_crs(epsg=32610)
+
+    # stops are shared by many trips, so find the cell and reproject each distinct stop once
+    locations = gdf_stops.geometry
+    location_codes, unique_x, unique_y = factorize_points(locations)
+    unique_locations = gpd.GeoSeries(gpd.points_from_xy(unique_x, unique_y), crs=locations.crs)
+    cell_q, cell_r = hex_grid.assign(unique_locations)
+    center_x, center_y = hex_grid.get_centers(cell_q, cell_r)
+    cell_centers = gpd.GeoSeries(gpd.points_from_xy(center_x, center_y), crs=f'EPSG:{hex_grid.crs}')
+
+    # reproject to web mercator to match basemap
+    unique_locations = unique_locations.to_crs('EPSG:3857').to_numpy()
+    cell_centers = cell_centers.to_crs('EPSG:3857').to_numpy()
+
+    gdf_stops = gpd.GeoDataFrame({
+        'card_id': gdf_stops['card_id'],
+        location_column: gpd.GeoSeries(unique_locations[location_codes], index=gdf_stops.index),
+        'trip_time_minutes': gdf_stops['trip_time_minutes'],
+        'trip_frequency': gdf_stops['trip_frequency'],
+        centroid_col_name: gpd.GeoSeries(cell_centers[location_codes], index=gdf_stops.index,
+                                         crs='EPSG:3857'),
+    }, geometry=location_column, crs='EPSG:3857')
+    return gdf_stops
+
 def merge_and_filter_trip_centroids_gdf(boardings_centroids,
                                         alights_centroids,
-                                        trip_frequency_cutoff=0):
+                                        trip_frequency_cutoff=0,
+                                        include_location_strings=True):
     """
     Merge boarding and alighting centroids, calculate trip frequencies between centroids,
     and filter the resulting GeoDataFrame based on a trip frequency cutoff. The trip frequency 
@@ -200,19 +301,25 @@ def merge_and_filter_trip_centroids_gdf(boardings_centroids,
     alights_centroids (GeoDataFrame): A GeoDataFrame containing alighting stop data with centroids.
     trip_frequency_cutoff (int, optional): The minimum frequency of trips between centroids to 
     include in the output. Default is 0, which includes all trips.
+    include_location_strings (bool, optional): Whether to add the 'board_string' and
+    'alight_string' columns with string representations of the centroids. Default is True.
 
     Returns:
     GeoDataFrame: A GeoDataFrame containing the merged and filtered trip data with columns:
                   'card_id', 'trip_time_minutes', 'board_centroid', 'alight_centroid',
-                  'trip_centroid_frequency', 'number_boards', 'number_alights',
-                  'board_lon', 'board_lat', 'alight_lon', and 'alight_lat'.
+                  'trip_centroid_frequency', 'board_id', 'alight_id', 'od_key',
+                  'number_boards', 'number_alights', 'board_lon', 'board_lat', 'alight_lon',
+                  and 'alight_lat' (and 'board_string' and 'alight_string' unless disabled).
+                  'board_id' and 'alight_id' are int32 centroid ids and 'od_key' the int64 key
+                  of the centroid pair (see transit_equity.networks.od_keys).
     
     Steps:
     1. Merge the boarding and alighting GeoDataFrames on 'card_id', 'trip_time_minutes', and
         'trip_frequency'.
-    2. Calculate the frequency of trips between each pair of centroids.
-    3. Create string representations of the centroid geometries to facilitate merging.
-    4. Merge the trip frequencies back onto the merged GeoDataFrame.
+    2. Encode the centroids to integer ids and each pair of centroids to an integer key.
+    3. Calculate the frequency of trips between each pair of centroids and add it to the merged
+        GeoDataFrame.
+    4. Select the necessary columns.
     5. Clean the resulting GeoDataFrame by dropping duplicates, rows with missing values, and trips
         where the boarding and alighting centroids are the same.
     6. Add columns counting the number of times each centroid is a boarding or alighting point.
@@ -226,50 +333,41 @@ def merge_and_filter_trip_centroids_gdf(boardings_centroids,
                                                              on=['card_id', 'trip_time_minutes',
                                                                  'trip_frequency'])
 
-    centroid_freq = gdf_board_alight_merge.groupby(['board_centroid', 'alight_centroid'])\
-        .size().reset_index(name='trip_centroid_frequency')
-
-    # now need to join back onto gdf_boarding_poly_joined
-    # to determine frequency between stops first need to convert geometry to string
-    gdf_board_alight_merge['board_string'] = \
-        gdf_board_alight_merge['board_centroid'].astype('string')
-    gdf_board_alight_merge['alight_string'] = \
-        gdf_board_alight_merge['alight_centroid'].astype('string')
-    gdf_board_alight_merge['start_stop_string'] = \
-        gdf_board_alight_merge['board_string'] + gdf_board_alight_merge['alight_string']
-
-    # combining board and alight string to create column to match
-    centroid_freq['board_string'] = centroid_freq['board_centroid'].astype('string')
-    centroid_freq['alight_string'] = centroid_freq['alight_centroid'].astype('string')
-    centroid_freq['start_stop_string'] = \
-        centroid_freq['board_string'] + centroid_freq['alight_string']
-    centroid_freq = centroid_freq[['trip_centroid_frequency','start_stop_string']]
-
-    # Merge edge_freq into tripsize_filter_df based on 'start_stop_string'
-    gdf_network = pd.merge(gdf_board_alight_merge, centroid_freq, on='start_stop_string',
-                            how='left')
+    # encode each centroid to a compact integer id and each pair of centroids to a packed key,
+    # so that the frequencies are grouped and merged on integers instead of geometries
+    location_encoder = LocationEncoder()
+    gdf_board_alight_merge['board_id'] = \
+        location_encoder.encode(gdf_board_alight_merge['board_centroid'])
+    gdf_board_alight_merge['alight_id'] = \
+        location_encoder.encode(gdf_board_alight_merge['alight_centroid'])
+    gdf_board_alight_merge['od_key'] = \
+        pack_od_keys(gdf_board_alight_merge['board_id'], gdf_board_alight_merge['alight_id'])
+
+    # count the trips between each pair of centroids, in place
+    add_od_frequency(gdf_board_alight_merge, 'trip_centroid_frequency')
 
     # select only necessary columns
-    gdf_network_clean = gdf_network[["card_id", "trip_time_minutes", "board_centroid",
-                                      "alight_centroid", "trip_centroid_frequency"]]
+    gdf_network_clean = gdf_board_alight_merge[["card_id", "trip_time_minutes", "board_centroid",
+                                      "alight_centroid", "trip_centroid_frequency", "board_id",
+                                      "alight_id", "od_key"]]
 
     # double check that duplicates and nas are being dropped
-    gdf_network_clean = gdf_network_clean.drop_duplicates().dropna()
+    # (the ids identify the centroids, so there is no need to compare the geometries)
+    gdf_network_clean = gdf_network_clean.drop_duplicates(
+        subset=["card_id", "trip_time_minutes", "od_key"]).dropna()
 
     # now need to remove instances where the board_centroid and alight_centroid are the same
     gdf_network_clean = \
-        gdf_network_clean[gdf_network_clean['board_centroid'] != \
-                          gdf_network_clean['alight_centroid']]
+        gdf_network_clean[gdf_network_clean['board_id'] != gdf_network_clean['alight_id']]
 
     # now want to add a column that counts how many times a particular centroid is a start or stop
-    gdf_network_clean['number_boards'] = \
-        gdf_network_clean.groupby('board_centroid')['board_centroid'].transform('count')
-    gdf_network_clean['number_alights'] = \
-        gdf_network_clean.groupby('alight_centroid')['alight_centroid'].transform('count')
-
-    ## need str columns for centroid locations
-    gdf_network_clean['board_string'] = gdf_network_clean['board_centroid'].astype('string')
-    gdf_network_clean['alight_string'] = gdf_network_clean['alight_centroid'].astype('string')
+    add_od_frequency(gdf_network_clean, 'number_boards', key_column='board_id')
+    add_od_frequency(gdf_network_clean, 'number_alights', key_column='alight_id')
+
+    ## optional str columns for centroid locations
+    if include_location_strings:
+        gdf_network_clean['board_string'] = gdf_network_clean['board_centroid'].astype('string')
+        gdf_network_clean['alight_string'] = gdf_network_clean['alight_centroid'].astype('string')
 
     # Filter to only frequent trips as specified by trip_frequency_cutoff
     gdf_network_clean = gdf_network_clean[gdf_network_clean['trip_centroid_frequency'] > \
@@ -1,11 +1,26 @@
 import binascii
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
 from shapely import wkb
+from sqlalchemy import func
+
+# Formats in which a location column can be pulled from PostGIS.
+# LOCATION_FORMAT_EWKB: the geometry column as is, which psycopg2 returns as a hex EWKB string.
+# LOCATION_FORMAT_WKB: ST_AsBinary of the geometry, returned as raw WKB bytes.
+# LOCATION_FORMAT_XY: ST_X and ST_Y of a point geometry, returned as two float columns
+#   named <label>_x and <label>_y.
+LOCATION_FORMAT_EWKB = 'ewkb'
+LOCATION_FORMAT_WKB = 'wkb'
+LOCATION_FORMAT_XY = 'xy'
+LOCATION_FORMATS = (LOCATION_FORMAT_EWKB, LOCATION_FORMAT_WKB, LOCATION_FORMAT_XY)
 
 def load_wkb(hex_string):
     """Function to decode and load WKB binary location
     into Shapely geometry object to enable plotting
     with geoPandas.
-    
+
     Parameters
     ----------
     hex_string : object
@@ -18,3 +33,187 @@ def load_wkb(hex_string):
 
     """
     return wkb.loads(binascii.unhexlify(hex_string))
+
+def load_wkb_series(wkb_series, crs=None):
+    """Function to decode a whole column of WKB locations
+    into a GeoSeries in one vectorized call.
+
+    This is the bulk counterpart of `load_wkb`. Instead of calling
+    `binascii.unhexlify` and `wkb.loads` once per row, the whole column
+    is handed to `shapely.from_wkb`, which decodes every value in C.
+    Both hex-encoded (E)WKB strings (as returned by psycopg2 for PostGIS
+    geometry columns) and raw WKB bytes are accepted. Missing values are
+    decoded to None.
+
+    Parameters
+    ----------
+    wkb_series : pd.Series or array-like
+        Column of hex WKB strings or WKB bytes.
+    crs : optional
+        CRS to assign to the returned GeoSeries. Defaults to None.
+
+    Returns
+    -------
+    gpd.GeoSeries
+        GeoSeries of Shapely geometries. If `wkb_series` is a pandas Series,
+        its index is preserved.
+
+    Examples
+    --------
+    >>> trips_df['board_location_shapely'] = load_wkb_series(trips_df['board_location'])
+    """
+    index = wkb_series.index if isinstance(wkb_series, pd.Series) else None
+    values = np.asarray(wkb_series, dtype=object)
+    not_null = pd.notna(values)
+    if not not_null.all():
+        values = np.where(not_null, values, None)
+    if not_null.any():
+        # GEOS parses hex noticeably slower than raw bytes, so unhexlify first.
+        # psycopg2 hands back bytea values (e.g. from ST_AsBinary) as memoryview objects,
+        # which shapely does not accept. A column holds only one of these types.
+        first_value = values[not_null.argmax()]
+        if isinstance(first_value, str):
+            to_bytes = bytes.fromhex
+        elif isinstance(first_value, memoryview):
+            to_bytes = bytes
+        else:
+            to_bytes = None
+        if to_bytes is not None:
+            values = values.copy()
+            values[not_null] = np.fromiter(map(to_bytes, values[not_null]), dtype=object,
+                                           count=int(not_null.sum()))
+    geometries = shapely.from_wkb(values)
+    return gpd.GeoSeries(geometries, index=index, crs=crs)
+
+def get_point_keys(points):
+    """Function to get a hashable key of each point, its
+    coordinates packed as the complex number x + 1j * y.
+
+    Parameters
+    ----------
+    points : gpd.GeoSeries or array-like
+        Point geometries. Missing and empty points get a NaN key.
+
+    Returns
+    -------
+    np.ndarray
+        complex128 array with the key of each point.
+    """
+    points = np.asarray(points, dtype=object)
+    # shapely.get_x raises on empty points, so only read the others
+    has_coordinates = ~(shapely.is_missing(points) | shapely.is_empty(points))
+    keys = np.full(len(points), complex(np.nan, np.nan))
+    keys[has_coordinates] = shapely.get_x(points[has_coordinates]) + 1j * shapely.get_y(points[has_coordinates])
+    return keys
+
+def factorize_points(points):
+    """Function to find the distinct points of a column of
+    point geometries, by their coordinates.
+
+    Trips and transactions are located at a few thousand distinct
+    stops, so the costly per-point work (reprojection, spatial
+    queries, ...) can be done once per distinct point and broadcast
+    back with the codes.
+
+    Parameters
+    ----------
+    points : gpd.GeoSeries or array-like
+        Point geometries.
+
+    Returns
+    -------
+    tuple
+        The int64 code of each point (its position among the distinct
+        points, or -1 for missing and empty points), and the x and y
+        coordinates of the distinct points.
+    """
+    codes, unique_keys = pd.factorize(get_point_keys(points))
+    return codes, unique_keys.real, unique_keys.imag
+
+def get_xy_column_names(location_column):
+    """Function to get the names of the x and y columns
+    that hold a location pulled with LOCATION_FORMAT_XY.
+
+    Parameters
+    ----------
+    location_column : str
+        Name of the location column (or label) in the query.
+
+    Returns
+    -------
+    tuple
+        Names of the x and y columns.
+    """
+    return f'{location_column}_x', f'{location_column}_y'
+
+def get_location_columns(location, label, location_format=LOCATION_FORMAT_EWKB):
+    """Function to get the labelled select columns that pull
+    a PostGIS geometry in the given location format.
+
+    Pulling point locations as x/y floats (or raw WKB bytes) instead
+    of hex EWKB strings cuts the transfer size and lets the client
+    skip WKB parsing.
+
+    Parameters
+    ----------
+    location : sqlalchemy.sql.elements.ColumnElement
+        Geometry column or expression.
+    label : str
+        Name of the location column in the result. For
+        LOCATION_FORMAT_XY, the result columns are named by
+        `get_xy_column_names(label)`.
+    location_format : str
+        One of LOCATION_FORMATS. Defaults to LOCATION_FORMAT_EWKB.
+
+    Returns
+    -------
+    list
+        The labelled columns to add to a select statement.
+
+    Examples
+    --------
+    >>> columns = get_location_columns(stops.c.stop_location, 'stop_location', LOCATION_FORMAT_XY)
+    >>> [column.name for column in columns]
+    ['stop_location_x', 'stop_location_y']
+    """
+    if location_format == LOCATION_FORMAT_EWKB:
+        return [location.label(label)]
+    if location_format == LOCATION_FORMAT_WKB:
+        return [func.ST_AsBinary(location).label(label)]
+    if location_format == LOCATION_FORMAT_XY:
+        x_label, y_label = get_xy_column_names(label)
+        return [func.ST_X(location).label(x_label), func.ST_Y(location).label(y_label)]
+    raise ValueError(f'location_format must be one of {LOCATION_FORMATS}, got {location_format!r}')
+
+def load_location_series(df, location_column, location_format=LOCATION_FORMAT_EWKB, crs=None):
+    """Function to build a GeoSeries from a location column
+    pulled from PostGIS in any of the LOCATION_FORMATS.
+
+    Point locations pulled with LOCATION_FORMAT_XY are built with
+    `gpd.points_from_xy` and need no WKB parsing at all. The other
+    formats are decoded with `load_wkb_series`.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame containing the location column(s).
+    location_column : str
+        Name of the location column. For LOCATION_FORMAT_XY, the
+        columns named by `get_xy_column_names(location_column)` are used.
+    location_format : str
+        One of LOCATION_FORMATS. Defaults to LOCATION_FORMAT_EWKB.
+    crs : optional
+        CRS to assign to the returned GeoSeries. Defaults to None.
+
+    Returns
+    -------
+    gpd.GeoSeries
+        GeoSeries of Shapely geometries with the index of `df`.
+    """
+    if location_format == LOCATION_FORMAT_XY:
+        x_column, y_column = get_xy_column_names(location_column)
+        points = gpd.points_from_xy(df[x_column], df[y_column])
+        return gpd.GeoSeries(points, index=df.index, crs=crs)
+    if location_format in (LOCATION_FORMAT_EWKB, LOCATION_FORMAT_WKB):
+        return load_wkb_series(df[location_column], crs=crs)
+    raise ValueError(f'location_format must be one of {LOCATION_FORMATS}, got {location_format!r}')
@@ -0,0 +1,281 @@
+"""
+This module contains a computed hexagonal grid, to assign points to hex cells and centroids with
+vectorized arithmetic instead of pulling the hex grid polygons from the database and joining them.
+
+The cells of a regular hex grid are found by converting the point coordinates to axial hex
+coordinates and rounding them to the nearest hexagon (cube rounding). The grid is defined by the
+size of its hexagons (the distance from the center to a vertex), their orientation ('flat' for
+a vertex pointing east, as in PostGIS ST_HexagonGrid, or 'pointy' for a vertex pointing north),
+the center of one of its cells and its CRS. `HexGrid.from_polygons` infers these from the hex
+grid polygons (e.g. from `transit_equity.geospatial.centroids.import_hexgrid`), and
+`check_hexgrid_parity` checks that the computed cells match a polygon join.
+
+Classes
+-------
+HexGrid :
+    Class to compute the hex cells, cell ids, centers and polygons of points
+
+Functions
+---------
+check_hexgrid_parity :
+    Function to compare the cells of a HexGrid with a spatial join to the hex grid polygons
+"""
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from .format_conversions import factorize_points
+from .polygon_index import NO_POLYGON, PolygonIndex
+
+HEXGRID_CRS = 32610
+HEXGRID_ORIENTATION_FLAT = 'flat'
+HEXGRID_ORIENTATION_POINTY = 'pointy'
+HEXGRID_ORIENTATIONS = (HEXGRID_ORIENTATION_FLAT, HEXGRID_ORIENTATION_POINTY)
+
+SQRT_3 = np.sqrt(3.0)
+
+class HexGrid:
+    """
+    Regular hexagonal grid in a projected CRS, with cells addressed by axial coordinates (q, r).
+
+    Attributes
+    ----------
+    size : float
+        Distance from the center of a hexagon to its vertices, in CRS units (meters for EPSG:32610).
+    origin_x, origin_y : float
+        Center of the cell (0, 0). Defaults to (0, 0), as in PostGIS ST_HexagonGrid.
+    orientation : str
+        'flat' (default) for hexagons with a vertex pointing east, 'pointy' for hexagons with a vertex
+        pointing north.
+    crs : int
+        EPSG code of the CRS of the grid. Defaults to 32610.
+
+    Methods
+    -------
+    get_cells :
+        Get the axial coordinates of the cells of coordinates.
+    get_centers :
+        Get the coordinates of the centers of cells.
+    get_polygons :
+        Get the hexagon polygons of cells.
+    get_cell_ids / get_cells_from_ids :
+        Pack the axial coordinates of cells into int64 ids, and back.
+    assign :
+        Get the cells of points, reprojected to the CRS of the grid if needed.
+    from_polygons :
+        Infer the grid of hex grid polygons.
+
+    Examples
+    --------
+    Example 1:
+    >>> hex_grid = HexGrid.from_polygons(import_hexgrid('POSTGRES_URL', 'hex_grid_400m'))
+    >>> q, r = hex_grid.assign(gdf_trips['board_location_shapely'])
+    >>> gdf_trips['board_hex_id'] = hex_grid.get_cell_ids(q, r)
+    """
+    def __init__(self, size: float, origin_x: float = 0.0, origin_y: float = 0.0,
+                 orientation: str = HEXGRID_ORIENTATION_FLAT, crs: int = HEXGRID_CRS):
+        if size <= 0:
+            raise ValueError('size must be positive')
+        if orientation not in HEXGRID_ORIENTATIONS:
+            raise ValueError(f'orientation must be one of {HEXGRID_ORIENTATIONS}, got {orientation!r}')
+        self.size = size
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.orientation = orientation
+        self.crs = crs
+
+    def get_cells(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the axial coordinates of the cells that contain coordinates.
+
+        Parameters
+        ----------
+        x, y : np.ndarray
+            Coordinates in the CRS of the grid. They must be finite.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The int64 axial coordinates q and r of the cell of each point
+        """
+        x = (np.asarray(x, dtype=np.float64) - self.origin_x) / self.size
+        y = (np.asarray(y, dtype=np.float64) - self.origin_y) / self.size
+        if self.orientation == HEXGRID_ORIENTATION_FLAT:
+            q = 2.0 / 3.0 * x
+            r = -1.0 / 3.0 * x + SQRT_3 / 3.0 * y
+        else:
+            q = SQRT_3 / 3.0 * x - 1.0 / 3.0 * y
+            r = 2.0 / 3.0 * y
+
+        # cube rounding: round the three cube coordinates, then fix the one that moved the most
+        s = -q - r
+        q_rounded, r_rounded, s_rounded = np.round(q), np.round(r), np.round(s)
+        q_diff, r_diff, s_diff = np.abs(q_rounded - q), np.abs(r_rounded - r), np.abs(s_rounded - s)
+        fix_q = (q_diff > r_diff) & (q_diff > s_diff)
+        fix_r = ~fix_q & (r_diff > s_diff)
+        q_rounded = np.where(fix_q, -r_rounded - s_rounded, q_rounded)
+        r_rounded = np.where(fix_r, -q_rounded - s_rounded, r_rounded)
+        return q_rounded.astype(np.int64), r_rounded.astype(np.int64)
+
+    def get_centers(self, q: np.ndarray, r: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the coordinates of the centers of cells.
+
+        Parameters
+        ----------
+        q, r : np.ndarray
+            Axial coordinates of the cells
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The x and y coordinates of the center of each cell, in the CRS of the grid
+        """
+        q = np.asarray(q, dtype=np.float64)
+        r = np.asarray(r, dtype=np.float64)
+        if self.orientation == HEXGRID_ORIENTATION_FLAT:
+            x = 1.5 * q
+            y = SQRT_3 * (r + q / 2.0)
+        else:
+            x = SQRT_3 * (q + r / 2.0)
+            y = 1.5 * r
+        return self.origin_x + self.size * x, self.origin_y + self.size * y
+
+    def get_polygons(self, q: np.ndarray, r: np.ndarray) -> np.ndarray:
+        """
+        Get the hexagon polygons of cells.
+
+        Parameters
+        ----------
+        q, r : np.ndarray
+            Axial coordinates of the cells
+
+        Returns
+        -------
+        np.ndarray
+            The shapely polygon of each cell, in the CRS of the grid
+        """
+        x, y = self.get_centers(q, r)
+        angles = np.radians(np.arange(7) * 60.0 + (0.0 if self.orientation == HEXGRID_ORIENTATION_FLAT else 30.0))
+        vertices = np.stack([x[:, None] + self.size * np.cos(angles), y[:, None] + self.size * np.sin(angles)], axis=-1)
+        return shapely.polygons(vertices)
+
+    @staticmethod
+    def get_cell_ids(q: np.ndarray, r: np.ndarray) -> np.ndarray:
+        """
+        Pack the axial coordinates of cells into int64 ids, q in the upper and r in the lower 32 bits.
+        """
+        q = np.asarray(q, dtype=np.int64)
+        r = np.asarray(r, dtype=np.int64)
+        return (q << 32) | (r & 0xFFFFFFFF)
+
+    @staticmethod
+    def get_cells_from_ids(cell_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Unpack int64 cell ids from get_cell_ids into the axial coordinates q and r.
+        """
+        cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        return cell_ids >> 32, (cell_ids & 0xFFFFFFFF).astype(np.uint32).astype(np.int32).astype(np.int64)
+
+    def assign(self, points: gpd.GeoSeries) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the cells of points.
+
+        Parameters
+        ----------
+        points : gpd.GeoSeries
+            Points, reprojected to the CRS of the grid if needed. Points without a CRS are assumed
+            to be in the CRS of the grid. Missing or empty points are not allowed.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The int64 axial coordinates q and r of the cell of each point
+        """
+        if points.isna().any() or points.is_empty.any():
+            raise ValueError('points must not be missing or empty')
+
+        # reproject each distinct point once, stops are shared by many trips
+        codes, unique_x, unique_y = factorize_points(points)
+        unique_points = gpd.GeoSeries(gpd.points_from_xy(unique_x, unique_y), crs=points.crs)
+        if unique_points.crs is None:
+            unique_points = unique_points.set_crs(epsg=self.crs)
+        elif unique_points.crs.to_epsg() != self.crs:
+            unique_points = unique_points.to_crs(epsg=self.crs)
+
+        q, r = self.get_cells(unique_points.x.to_numpy(), unique_points.y.to_numpy())
+        return q[codes], r[codes]
+
+    @classmethod
+    def from_polygons(cls, hex_gdf: gpd.GeoDataFrame, crs: int | None = None) -> 'HexGrid':
+        """
+        Infer the grid of hex grid polygons.
+
+        The size and orientation are taken from the first hexagon, and its center is used as the
+        origin of the grid.
+
+        Parameters
+        ----------
+        hex_gdf : gpd.GeoDataFrame
+            Hex grid polygons of a regular grid, e.g. from import_hexgrid, in a projected CRS
+        crs : int, optional
+            EPSG code of the CRS of the polygons. Defaults to the CRS of hex_gdf.
+
+        Returns
+        -------
+        HexGrid
+            The grid of the polygons
+        """
+        if crs is None:
+            crs = hex_gdf.crs.to_epsg()
+        hexagon = hex_gdf.geometry.iloc[0]
+        center = hexagon.centroid
+        vertices = shapely.get_coordinates(hexagon) - [center.x, center.y]
+        size = float(np.hypot(vertices[:, 0], vertices[:, 1]).max())
+
+        # a flat hexagon has a vertex straight east of its center
+        is_flat = np.any((np.abs(vertices[:, 1]) < 1e-6 * size) & (vertices[:, 0] > 0))
+        orientation = HEXGRID_ORIENTATION_FLAT if is_flat else HEXGRID_ORIENTATION_POINTY
+        return cls(size, center.x, center.y, orientation, crs)
+
+def check_hexgrid_parity(hex_grid: HexGrid, hex_gdf: gpd.GeoDataFrame, points: gpd.GeoSeries,
+                         tolerance: float = 1e-3) -> dict:
+    """
+    Compare the cells of a HexGrid with a spatial join of points to the hex grid polygons.
+
+    Parameters
+    ----------
+    hex_grid : HexGrid
+        The computed grid, e.g. from HexGrid.from_polygons(hex_gdf)
+    hex_gdf : gpd.GeoDataFrame
+        The hex grid polygons, e.g. from import_hexgrid
+    points : gpd.GeoSeries
+        Points to compare, e.g. the stop locations
+    tolerance : float
+        Maximum distance, in CRS units, between the center of the computed cell of a point and the
+        centroid of its polygon for the two to match. Defaults to 1e-3.
+
+    Returns
+    -------
+    dict
+        'n_points': the number of points,
+        'n_in_polygons': the number of points within a hex grid polygon (the computed grid has no extent,
+        so only these are compared),
+        'n_matching': the number of those whose computed cell is their polygon,
+        'max_center_distance': the largest distance between the center of the computed cell and the
+        centroid of the polygon of a point.
+    """
+    polygon_ids = PolygonIndex(hex_gdf).assign(points)
+    is_in_polygons = polygon_ids != NO_POLYGON
+
+    q, r = hex_grid.assign(points[is_in_polygons])
+    center_x, center_y = hex_grid.get_centers(q, r)
+    polygon_centroids = hex_gdf.geometry.to_crs(epsg=hex_grid.crs).centroid.iloc[polygon_ids[is_in_polygons]]
+    center_distances = np.hypot(center_x - polygon_centroids.x.to_numpy(), center_y - polygon_centroids.y.to_numpy())
+
+    return {
+        'n_points': len(points),
+        'n_in_polygons': int(is_in_polygons.sum()),
+        'n_matching': int((center_distances <= tolerance).sum()),
+        'max_center_distance': float(center_distances.max()) if len(center_distances) else 0.0,
+    }
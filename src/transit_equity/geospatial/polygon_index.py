@@ -0,0 +1,328 @@
+"""
+This module contains a reusable spatial index of a polygon layer (e.g. the hex grid, the census
+block groups or the downtown polygon) for point-in-polygon assignment.
+
+`gpd.sjoin` builds a new spatial index on its right GeoDataFrame at every call. A PolygonIndex
+builds its STRtree once, so the same polygon layer can be queried for every chunk of
+transactions, for both the boarding and alighting stops, etc. It can also be saved to and
+loaded from GeoParquet, to skip reading (or querying) the polygon layer again.
+
+Trips and transactions are located at a few thousand distinct stops, so a PolygonIndex assigns
+each distinct point only once and broadcasts the result back to every row. The polygon of each
+point seen so far is kept in a lookup table, which can be stored in a ParquetCache (e.g. one
+table per GTFS feed for the stops of the feed) with `PolygonIndex.save_lookup` so that later runs
+skip the spatial queries.
+
+Classes
+-------
+PolygonIndex :
+    Class to assign geometries to the polygons of a layer they are within
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from ..utils.parquet_cache import ParquetCache, get_cache_key
+from .format_conversions import factorize_points, get_point_keys
+
+# Position returned by PolygonIndex.assign for the geometries that are within no polygon
+NO_POLYGON = -1
+# Version of the point lookup tables stored in a ParquetCache, to bump if their layout changes
+POINT_LOOKUP_CACHE_VERSION = 1
+
+class PolygonIndex:
+    """
+    STRtree index of a polygon layer, to assign geometries to the polygon they are within.
+
+    The polygon id of a polygon is its position in `polygons`. The polygons are expected not to
+    overlap (as in a grid or a census geography): a geometry within several polygons is assigned
+    to the first one.
+
+    Duplicate geometries are assigned once. Points are also looked up by their coordinates (in the
+    CRS of the polygons) in a lookup table of the points assigned so far, and only the new ones are
+    queried. The STRtree is only built when a query is needed.
+
+    Attributes
+    ----------
+    polygons : gpd.GeoDataFrame
+        The polygon layer. Its CRS is used for the queries.
+
+    crs : pyproj.CRS
+        The CRS of the polygon layer.
+
+    tree : shapely.STRtree
+        The spatial index of the polygons.
+
+    lookup_cache : ParquetCache, optional
+        Cache to load the point lookup table from and to save it to with save_lookup, so that the
+        points assigned in a previous run are not queried again. Defaults to None (the lookup
+        table is only kept in memory).
+
+    lookup_name : str, optional
+        Name of the point lookup table in lookup_cache, e.g. f'gtfs_feed_{feed_id}' to keep one
+        table per GTFS feed. The table is also keyed by the polygons, so the same name can be used
+        with different polygon layers.
+
+    Methods
+    -------
+    assign :
+        Get the polygon id of each geometry.
+
+    join :
+        Spatially join a GeoDataFrame to the polygons, like `gpd.sjoin(..., predicate='within')`.
+
+    save_lookup :
+        Save the point lookup table to lookup_cache, if points were added to it.
+
+    to_parquet :
+        Save the polygon layer as GeoParquet.
+
+    from_parquet :
+        Load a PolygonIndex from a GeoParquet file saved by to_parquet.
+
+    Examples
+    --------
+    Example 1:
+    >>> block_group_index = PolygonIndex(gdf_block_group_data)
+    >>> polygon_ids = block_group_index.assign(gdf_transactions.geometry)
+    >>> geoids = block_group_index.polygons['GEOID'].to_numpy()[polygon_ids[polygon_ids != NO_POLYGON]]
+
+    Example 2:
+    >>> hex_grid_index = PolygonIndex(import_hexgrid(url, 'hex_grid'))
+    >>> hex_grid_index.to_parquet('hex_grid.parquet')
+    >>> hex_grid_index = PolygonIndex.from_parquet('hex_grid.parquet')
+
+    Example 3:
+    >>> cache = ParquetCache('~/.cache/transit_equity/point_lookups')
+    >>> hex_grid_index = PolygonIndex.from_parquet('hex_grid.parquet', lookup_cache=cache,
+    ...                                            lookup_name=f'gtfs_feed_{feed_id}')
+    >>> gdf_boardings = assign_stops_to_hex_centroids(gdf_trips, hex_grid, 'board', hex_grid_index)
+    >>> gdf_alights = assign_stops_to_hex_centroids(gdf_trips, hex_grid, 'alight', hex_grid_index)
+    >>> hex_grid_index.save_lookup()
+    """
+    def __init__(self, polygons: gpd.GeoDataFrame | gpd.GeoSeries,
+                 lookup_cache: ParquetCache | None = None, lookup_name: str | None = None):
+        if isinstance(polygons, gpd.GeoSeries):
+            polygons = polygons.to_frame()
+        self.polygons = polygons
+        self.crs = polygons.crs
+        self.lookup_cache = lookup_cache
+        self.lookup_name = lookup_name
+
+        self._tree = None
+        self._lookup = None
+        self._is_lookup_dirty = False
+        self._fingerprint = None
+
+    def __len__(self) -> int:
+        return len(self.polygons)
+
+    @property
+    def tree(self) -> shapely.STRtree:
+        if self._tree is None:
+            geometries = self.polygons.geometry.to_numpy()
+            shapely.prepare(geometries)
+            self._tree = shapely.STRtree(geometries)
+        return self._tree
+
+    def get_fingerprint(self) -> str:
+        """
+        Returns a hash of the polygons (geometries, order and CRS), which keys the point lookup tables
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256(str(self.crs).encode('utf-8'))
+            for polygon_wkb in shapely.to_wkb(self.polygons.geometry.to_numpy()):
+                digest.update(polygon_wkb)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def get_lookup_key(self) -> str:
+        """
+        Returns the key of the point lookup table in lookup_cache
+        """
+        return get_cache_key(version=POINT_LOOKUP_CACHE_VERSION, polygons=self.get_fingerprint(),
+                             lookup_name=self.lookup_name)
+
+    def assign(self, geometries: gpd.GeoSeries | np.ndarray, crs=None) -> np.ndarray:
+        """
+        Get the polygon id of each geometry, i.e. the position of the polygon it is within.
+
+        Parameters
+        ----------
+        geometries : gpd.GeoSeries | np.ndarray
+            The geometries (usually points) to assign.
+            A GeoSeries is reprojected to the CRS of the polygons if needed.
+
+        crs : optional
+            The CRS of geometries, if they are not a GeoSeries with a CRS.
+            Defaults to None, which means the CRS of the polygons.
+
+        Returns
+        -------
+        np.ndarray
+            The polygon id of each geometry, as int64, or NO_POLYGON (-1) if it is within no polygon.
+        """
+        if isinstance(geometries, gpd.GeoSeries):
+            crs = geometries.crs if geometries.crs is not None else crs
+            geometries = geometries.to_numpy()
+        geometries = np.asarray(geometries, dtype=object)
+
+        type_ids = shapely.get_type_id(geometries)
+        is_points = np.all(type_ids <= 0)
+        # missing (and empty) geometries get the code -1
+        if is_points:
+            codes, unique_x, unique_y = factorize_points(geometries)
+            unique_geometries = shapely.points(unique_x, unique_y)
+        else:
+            codes, unique_wkbs = pd.factorize(shapely.to_wkb(geometries))
+            unique_geometries = shapely.from_wkb(unique_wkbs)
+
+        if crs is not None and self.crs is not None and crs != self.crs:
+            unique_geometries = gpd.GeoSeries(unique_geometries, crs=crs).to_crs(self.crs).to_numpy()
+
+        if is_points:
+            unique_polygon_ids = self._assign_points(unique_geometries)
+        else:
+            unique_polygon_ids = self._query(unique_geometries)
+
+        polygon_ids = np.full(len(geometries), NO_POLYGON, dtype=np.int64)
+        is_valid = codes >= 0
+        polygon_ids[is_valid] = unique_polygon_ids[codes[is_valid]]
+        return polygon_ids
+
+    def _query(self, geometries: np.ndarray) -> np.ndarray:
+        geometry_positions, polygon_positions = self.tree.query(geometries, predicate='within')
+
+        polygon_ids = np.full(len(geometries), NO_POLYGON, dtype=np.int64)
+        # keep the first polygon of each geometry within several
+        order = np.lexsort((polygon_positions, geometry_positions))
+        geometry_positions, first_positions = np.unique(geometry_positions[order], return_index=True)
+        polygon_ids[geometry_positions] = polygon_positions[order][first_positions]
+        return polygon_ids
+
+    def _assign_points(self, points: np.ndarray) -> np.ndarray:
+        # look the points up by their coordinates, and only query the ones not assigned before
+        keys = get_point_keys(points)
+        lookup = self._get_lookup()
+        lookup_positions = lookup.index.get_indexer(keys)
+        is_new = lookup_positions < 0
+        polygon_ids = np.full(len(points), NO_POLYGON, dtype=np.int64)
+        polygon_ids[~is_new] = lookup.to_numpy()[lookup_positions[~is_new]]
+
+        if is_new.any():
+            polygon_ids[is_new] = self._query(points[is_new])
+            new_lookup = pd.Series(polygon_ids[is_new], index=pd.Index(keys[is_new]))
+            self._lookup = pd.concat([lookup, new_lookup[~new_lookup.index.duplicated()]])
+            self._is_lookup_dirty = True
+        return polygon_ids
+
+    def _get_lookup(self) -> pd.Series:
+        # polygon id by point coordinates (x + 1j * y, in the CRS of the polygons)
+        if self._lookup is None:
+            df_lookup = None
+            if self.lookup_cache is not None:
+                df_lookup = self.lookup_cache.load(self.get_lookup_key())
+            if df_lookup is None:
+                self._lookup = pd.Series(np.zeros(0, dtype=np.int64), index=pd.Index(np.zeros(0, dtype=np.complex128)))
+            else:
+                keys = df_lookup['x'].to_numpy() + 1j * df_lookup['y'].to_numpy()
+                self._lookup = pd.Series(df_lookup['polygon_id'].to_numpy(dtype=np.int64), index=pd.Index(keys))
+        return self._lookup
+
+    def save_lookup(self) -> bool:
+        """
+        Save the point lookup table to lookup_cache, if points were added to it since it was loaded
+        or last saved.
+
+        The table is rewritten as a whole, so it is not saved by assign: call this once after the
+        points of a run (e.g. all the chunks of transactions) have been assigned.
+
+        Returns
+        -------
+        bool
+            Whether the table was saved
+        """
+        if self.lookup_cache is None or not self._is_lookup_dirty:
+            return False
+        self.lookup_cache.save(self.get_lookup_key(), pd.DataFrame({
+            'x': self._lookup.index.to_numpy().real,
+            'y': self._lookup.index.to_numpy().imag,
+            'polygon_id': self._lookup.to_numpy(),
+        }))
+        self._is_lookup_dirty = False
+        return True
+
+    def join(self, gdf: gpd.GeoDataFrame, how: str = 'left') -> gpd.GeoDataFrame:
+        """
+        Spatially join a GeoDataFrame to the polygons it is within.
+
+        This gives the same result as `gpd.sjoin(gdf, polygons, how=how, predicate='within')` for
+        non-overlapping polygons, without building a new spatial index.
+
+        Parameters
+        ----------
+        gdf : gpd.GeoDataFrame
+            The GeoDataFrame to join. Its geometry column is kept as is.
+
+        how : str
+            'left' to keep all rows of gdf (with null polygon columns for the rows within no polygon),
+            or 'inner' to keep only the rows within a polygon.
+
+        Returns
+        -------
+        gpd.GeoDataFrame
+            gdf with an 'index_right' column (the index label of the polygon) and the other columns of the polygons.
+        """
+        if how not in ('left', 'inner'):
+            raise ValueError(f"how must be 'left' or 'inner', got {how!r}")
+
+        polygon_ids = self.assign(gdf.geometry)
+        if how == 'inner':
+            gdf = gdf[polygon_ids != NO_POLYGON]
+            polygon_ids = polygon_ids[polygon_ids != NO_POLYGON]
+
+        df_right = self.polygons.drop(columns=self.polygons.geometry.name)
+        df_right = pd.DataFrame(df_right).reset_index(names='index_right')
+        # NO_POLYGON is not in the RangeIndex of df_right, so these rows are all null
+        df_right = df_right.reindex(polygon_ids)
+        df_right.index = gdf.index
+
+        # same suffixes as gpd.sjoin for the columns on both sides
+        overlapping_columns = gdf.columns.intersection(df_right.columns)
+        gdf = gdf.rename(columns={column: f'{column}_left' for column in overlapping_columns})
+        df_right = df_right.rename(columns={column: f'{column}_right' for column in overlapping_columns})
+        return pd.concat([gdf, df_right], axis=1)
+
+    def to_parquet(self, path: str) -> None:
+        """
+        Save the polygon layer as GeoParquet, to rebuild the index later with from_parquet.
+
+        Parameters
+        ----------
+        path : str
+            Path of the GeoParquet file
+        """
+        self.polygons.to_parquet(path)
+
+    @classmethod
+    def from_parquet(cls, path: str, lookup_cache: ParquetCache | None = None,
+                     lookup_name: str | None = None) -> 'PolygonIndex':
+        """
+        Load a PolygonIndex from a GeoParquet file saved by to_parquet.
+
+        Parameters
+        ----------
+        path : str
+            Path of the GeoParquet file
+        lookup_cache, lookup_name : optional
+            See PolygonIndex
+
+        Returns
+        -------
+        PolygonIndex
+            The index of the saved polygon layer
+        """
+        return cls(gpd.read_parquet(path), lookup_cache, lookup_name)
@@ -0,0 +1,8 @@
+"""
+This module contains functions to write the intermediate products of the pipeline to disk and read them back.
+
+Modules
+-------
+stages : Module containing functions to write and read the pipeline stages (cleaned trips, hex OD network,
+    block group counts) as GeoParquet with a stable schema
+"""
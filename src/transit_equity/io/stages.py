@@ -0,0 +1,235 @@
+"""
+This module contains functions to write the intermediate products of the pipeline as GeoParquet and read them back,
+so that later stages (and later notebook sessions) do not re-derive them from the database.
+
+Each stage has a stable schema: its required columns are always written first, in the same order and with the
+same dtypes, followed by its optional columns and then any other column. The rows are sorted by the columns that
+are usually filtered on (user type, date, GEOID, OD key), so the min/max statistics of each Parquet row group are
+tight and a filter on these columns only reads the matching row groups. Reading a subset of the columns only
+reads those columns from disk.
+
+Functions
+---------
+write_stage :
+    Function to write a stage (Geo)DataFrame as GeoParquet with the schema of the stage
+
+read_stage :
+    Function to read a stage written by write_stage, with column projection and row group filters
+"""
+import json
+
+import pandas as pd
+import geopandas as gpd
+import pyarrow.parquet as pq
+
+# Cleaned trips, from transit_equity.networks.network_prep.get_trip_tables_by_cardtype
+STAGE_TRIPS = 'trips'
+# Hex centroid OD network, from transit_equity.geospatial.centroids.merge_and_filter_trip_centroids_gdf
+STAGE_OD_NETWORK = 'od_network'
+# Counts per census block group, from transit_equity.analysis.low_income.summary_by_census.get_all_counts_per_block_group
+STAGE_BLOCK_GROUP_COUNTS = 'block_group_counts'
+STAGES = (STAGE_TRIPS, STAGE_OD_NETWORK, STAGE_BLOCK_GROUP_COUNTS)
+
+# Required columns of each stage, in order, with their dtype (None keeps the dtype of the data, 'geometry' marks
+# a geometry column)
+STAGE_COLUMNS = {
+    STAGE_TRIPS: {
+        'card_id': None,
+        'board_location': None,
+        'alight_location': None,
+        'board_location_shapely': 'geometry',
+        'alight_location_shapely': 'geometry',
+        'trip_time_minutes': 'float64',
+        'board_dtm_pacific': None,
+        'board_id': 'int32',
+        'alight_id': 'int32',
+        'od_key': 'int64',
+    },
+    STAGE_OD_NETWORK: {
+        'card_id': None,
+        'trip_time_minutes': 'float64',
+        'board_centroid': 'geometry',
+        'alight_centroid': 'geometry',
+        'trip_centroid_frequency': 'int64',
+        'board_id': 'int32',
+        'alight_id': 'int32',
+        'od_key': 'int64',
+        'number_boards': 'int64',
+        'number_alights': 'int64',
+        'board_lon': 'float64',
+        'board_lat': 'float64',
+        'alight_lon': 'float64',
+        'alight_lat': 'float64',
+    },
+    STAGE_BLOCK_GROUP_COUNTS: {
+        'STATEFP': None,
+        'COUNTYFP': None,
+        'TRACTCE': None,
+        'BLKGRPCE': None,
+        'GEOID': None,
+        'geometry': 'geometry',
+        # nullable, block groups with a population but no transactions have no counts
+        'txn_count': 'Int64',
+        'user_count': 'Int64',
+    },
+}
+
+# Optional columns of each stage, written after the required ones when present
+STAGE_OPTIONAL_COLUMNS = {
+    STAGE_TRIPS: {
+        'trip_frequency': 'int64',
+        'user_type': 'int64',
+        'board_string': 'string',
+        'alight_string': 'string',
+    },
+    STAGE_OD_NETWORK: {
+        'board_latlong': 'geometry',
+        'alight_latlong': 'geometry',
+        'user_type': 'int64',
+        'board_string': 'string',
+        'alight_string': 'string',
+    },
+    STAGE_BLOCK_GROUP_COUNTS: {
+        'low_income_population': 'float64',
+        'population': 'float64',
+        'user_type': 'int64',
+    },
+}
+
+# Columns the rows of each stage are sorted by, in order, when present
+STAGE_SORT_COLUMNS = {
+    STAGE_TRIPS: ['user_type', 'board_dtm_pacific'],
+    STAGE_OD_NETWORK: ['user_type', 'od_key'],
+    STAGE_BLOCK_GROUP_COUNTS: ['user_type', 'GEOID'],
+}
+
+# Column filtered on by the start_date and end_date of read_stage. The producer of the stage must keep it, e.g.
+# clean_network_data keeps the boarding time of the trips
+STAGE_DATE_COLUMNS = {
+    STAGE_TRIPS: 'board_dtm_pacific',
+}
+
+DEFAULT_ROW_GROUP_SIZE = 100000
+
+def _check_stage(stage: str) -> None:
+    if stage not in STAGES:
+        raise ValueError(f'stage must be one of {STAGES}, got {stage!r}')
+
+def write_stage(df: pd.DataFrame, path: str, stage: str, user_type: int | None = None,
+                row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> str:
+    '''
+    Writes a stage (Geo)DataFrame as GeoParquet with the schema of the stage
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The GeoDataFrame of the stage, e.g. the output of get_trip_tables_by_cardtype for STAGE_TRIPS.
+        It must have all the required columns of the stage (STAGE_COLUMNS). Its index is not written.
+    path : str
+        Path of the GeoParquet file
+    stage : str
+        One of STAGES
+    user_type : int, optional
+        Passenger type of the rows, written as a 'user_type' column so that the stages of several user types can
+        be concatenated and filtered on. Defaults to None (no column added).
+    row_group_size : int, optional
+        Maximum number of rows per Parquet row group, the unit of the row group filters of read_stage.
+        Defaults to 100000.
+
+    Returns
+    -------
+    str
+        path
+
+    Examples
+    --------
+    Example 1:
+    >>> gdf_trips = get_trip_tables_by_cardtype(..., user_type=5)
+    >>> write_stage(gdf_trips, 'trips_low_income.parquet', STAGE_TRIPS, user_type=5)
+    '''
+    _check_stage(stage)
+    missing_columns = [column for column in STAGE_COLUMNS[stage] if column not in df.columns]
+    if missing_columns:
+        raise ValueError(f'The {stage} stage is missing the columns {missing_columns}')
+
+    df = df.copy()
+    if user_type is not None:
+        df['user_type'] = user_type
+
+    column_dtypes = {**STAGE_COLUMNS[stage], **STAGE_OPTIONAL_COLUMNS[stage]}
+    for column, dtype in column_dtypes.items():
+        if column in df.columns and dtype not in (None, 'geometry'):
+            df[column] = df[column].astype(dtype)
+
+    schema_columns = [column for column in column_dtypes if column in df.columns]
+    df = df[[*schema_columns, *[column for column in df.columns if column not in column_dtypes]]]
+
+    sort_columns = [column for column in STAGE_SORT_COLUMNS[stage] if column in df.columns]
+    if sort_columns:
+        df = df.sort_values(sort_columns, kind='stable')
+
+    df.to_parquet(path, index=False, row_group_size=row_group_size)
+    return path
+
+def read_stage(path: str, stage: str, columns: list[str] | None = None, filters: list[tuple] | None = None,
+               start_date=None, end_date=None, user_types: list[int] | None = None,
+               geoids: list[str] | None = None) -> pd.DataFrame:
+    '''
+    Reads a stage written by write_stage, only reading the requested columns and the row groups that can match
+
+    Parameters
+    ----------
+    path : str
+        Path of the GeoParquet file
+    stage : str
+        One of STAGES. The file must have the required columns of the stage.
+    columns : list[str], optional
+        Columns to read. Defaults to all columns. If none of them is a geometry column, a DataFrame is returned.
+    filters : list[tuple], optional
+        pyarrow filters, e.g. [('trip_centroid_frequency', '>', 10)], combined with the filters below
+    start_date, end_date : datetime, optional
+        Only read the rows with start_date <= date < end_date, on the date column of the stage (STAGE_DATE_COLUMNS)
+    user_types : list[int], optional
+        Only read the rows of these user types
+    geoids : list[str], optional
+        Only read the rows of these GEOIDs
+
+    Returns
+    -------
+    pd.DataFrame
+        A GeoDataFrame, with the same active geometry column as when written if it is read, or a DataFrame
+
+    Examples
+    --------
+    Example 1:
+    >>> gdf_od = read_stage('od_network.parquet', STAGE_OD_NETWORK, user_types=[5],
+    ...                     columns=['board_centroid', 'alight_centroid', 'trip_centroid_frequency'])
+    '''
+    _check_stage(stage)
+    schema = pq.read_schema(path)
+    missing_columns = [column for column in STAGE_COLUMNS[stage] if column not in schema.names]
+    if missing_columns:
+        raise ValueError(f'{path} is not a {stage} stage, it is missing the columns {missing_columns}')
+
+    filters = list(filters or [])
+    if start_date is not None or end_date is not None:
+        if stage not in STAGE_DATE_COLUMNS:
+            raise ValueError(f'The {stage} stage has no date column')
+        date_column = STAGE_DATE_COLUMNS[stage]
+        if date_column not in schema.names:
+            raise ValueError(f'{path} has no {date_column!r} column to filter on start_date and end_date, '
+                             f'the producer of the {stage} stage must keep it')
+        if start_date is not None:
+            filters.append((date_column, '>=', start_date))
+        if end_date is not None:
+            filters.append((date_column, '<', end_date))
+    if user_types is not None:
+        filters.append(('user_type', 'in', list(user_types)))
+    if geoids is not None:
+        filters.append(('GEOID', 'in', list(geoids)))
+
+    geometry_columns = json.loads(schema.metadata[b'geo'])['columns'] if b'geo' in (schema.metadata or {}) else {}
+    read_kwargs = {'columns': columns, 'filters': filters or None}
+    if columns is not None and not any(column in geometry_columns for column in columns):
+        return pd.read_parquet(path, **read_kwargs)
+    return gpd.read_parquet(path, **read_kwargs)
@@ -0,0 +1,126 @@
+"""
+Module for counting origin-destination (OD) frequencies of trips.
+
+The frequency of an OD pair used to be computed with a groupby on the pair, followed by a merge of
+the counts back onto the trip table, which copies every column of the table. The functions here
+factorize the integer keys once (a single hash pass), count them with `np.bincount`, and gather the
+counts back by position, so the frequencies are attached without any merge.
+
+Functions
+---------
+get_od_frequency(keys)
+    Gets the number of rows sharing the key of each row.
+
+add_od_frequency(df, frequency_column, key_column)
+    Adds the frequency of each row's key as a column of the DataFrame, in place.
+
+count_od_keys(keys)
+    Counts the rows of each distinct key.
+
+get_od_edge_list(trips_df, board_column, alight_column, weight_column)
+    Aggregates trips to a weighted edge list with one row per OD pair.
+"""
+import numpy as np
+import pandas as pd
+
+from .od_keys import pack_od_keys, unpack_od_keys
+
+def get_od_frequency(keys):
+    """
+    Get the number of rows sharing the key of each row.
+
+    Parameters
+    ----------
+    keys : pd.Series or array-like
+        Integer keys, e.g. the int64 OD keys from transit_equity.networks.od_keys.pack_od_keys
+        or int32 location ids. Missing keys are not allowed.
+
+    Returns
+    -------
+    np.ndarray
+        int64 array with, for each row, the number of rows with the same key.
+
+    Examples
+    --------
+    >>> get_od_frequency([7, 3, 7, 7])
+    array([3, 1, 3, 3])
+    """
+    codes, _ = pd.factorize(np.asarray(keys), use_na_sentinel=False)
+    counts = np.bincount(codes)
+    return counts[codes].astype(np.int64)
+
+def add_od_frequency(df, frequency_column, key_column='od_key'):
+    """
+    Add the frequency of each row's key as a column of the DataFrame, in place.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame containing the key column. It is modified in place.
+    frequency_column : str
+        Name of the frequency column to add (or overwrite).
+    key_column : str
+        Name of the integer key column. Defaults to 'od_key'.
+
+    Returns
+    -------
+    pd.DataFrame
+        The same DataFrame, for chaining.
+    """
+    df[frequency_column] = get_od_frequency(df[key_column])
+    return df
+
+def count_od_keys(keys):
+    """
+    Count the rows of each distinct key.
+
+    Parameters
+    ----------
+    keys : pd.Series or array-like
+        Integer keys. Missing keys are not allowed.
+
+    Returns
+    -------
+    pd.Series
+        int64 counts indexed by the distinct keys, in order of first appearance.
+    """
+    codes, uniques = pd.factorize(np.asarray(keys), use_na_sentinel=False)
+    return pd.Series(np.bincount(codes).astype(np.int64), index=uniques)
+
+def get_od_edge_list(trips_df, board_column='board_id', alight_column='alight_id',
+                     weight_column=None):
+    """
+    Aggregate trips to a weighted edge list with one row per OD pair.
+
+    Millions of trips collapse into far fewer distinct OD pairs, so a graph built from the edge
+    list has one edge per pair instead of one insertion per trip.
+
+    Parameters
+    ----------
+    trips_df : pd.DataFrame
+        Trips with int32 location ids, e.g. the output of clean_and_filter_network_data or
+        merge_and_filter_trip_centroids_gdf.
+    board_column : str
+        Name of the boarding location id column. Defaults to 'board_id'.
+    alight_column : str
+        Name of the alighting location id column. Defaults to 'alight_id'.
+    weight_column : str, optional
+        Name of a per-trip weight column to sum for each OD pair. Defaults to None, in which
+        case the weight of an edge is its number of trips.
+
+    Returns
+    -------
+    pd.DataFrame
+        Edge list with the columns board_column, alight_column, 'trip_count' and 'weight'.
+    """
+    od_keys = pack_od_keys(trips_df[board_column], trips_df[alight_column])
+    codes, uniques = pd.factorize(od_keys, use_na_sentinel=False)
+    trip_count = np.bincount(codes).astype(np.int64)
+    if weight_column is None:
+        weight = trip_count.astype(np.float64)
+    else:
+        weight = np.bincount(codes, weights=trips_df[weight_column].to_numpy(dtype=np.float64))
+
+    board_ids, alight_ids = unpack_od_keys(uniques)
+    return pd.DataFrame({board_column: board_ids, alight_column: alight_ids,
+                         'trip_count': trip_count, 'weight': weight})
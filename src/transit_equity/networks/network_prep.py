@@ -11,27 +11,74 @@ get_trip_tables_by_cardtype(postgres_url_ng, test_schema, orca_schema, trips_tab
                             vboardings_table, gtfs_table, user_type)
     Pulls and processes trips table data from the orca_ng database based on user type.
 
+get_trip_tables_by_cardtypes(postgres_url_ng, test_schema, orca_schema, trips_table,
+                             alights_table, boardings_table, vboardings_table, gtfs_table,
+                             user_types, max_workers, use_processes, executor)
+    Pulls and processes the trips table data of several user types concurrently.
+
 clean_and_filter_network_data(trips_df)
     Cleans and filters trip data, transforming it into a GeoDataFrame for spatial analysis.
 
-trip_frequency_filter(table, cutoff)
+clean_network_data(trips_df, location_format, seen_trip_keys, location_encoder,
+                   include_location_strings)
+    Cleans trip data like clean_and_filter_network_data, without the trip frequency.
+
+trip_frequency_filter(table, cutoff, recompute_frequency)
     Filters trips based on the frequency of trips between origin and destination pairs.
 
-drop_downtown_points(points_table, downtown_polygon_path, stop_type)
+drop_downtown_points(points_table, downtown_polygon_path, stop_type, downtown_index)
     Drops the points from the downtown area. Needs to be done twice for origin-destination networks.
 
-add_stop_level_network_metrics(gdf)
+add_stop_level_network_metrics(gdf, use_trip_weights, weight_column, backend)
     Calculate and add stop-level network metrics (degree centrality and eigenvector centrality) 
     to a GeoDataFrame representing a transit network.
+
+build_od_graph(edge_list, board_column, alight_column)
+    Builds a directed graph in bulk from a weighted OD edge list.
+
+Classes
+-------
+TripKeySet
+    Exact set of trip keys, to drop duplicate trips across streamed chunks.
+
+TripChunkAggregator
+    Cleans streamed chunks of trip data and keeps the running state needed for duplicate detection
+    and trip frequencies across all chunks.
 """
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 import geopandas as gpd
-from sqlalchemy import and_, create_engine
+import numpy as np
+import shapely
+from sqlalchemy import and_
 from sqlalchemy.orm import sessionmaker
 import networkx as nx
-from ..geospatial.format_conversions import load_wkb
-from ..utils.db_helpers import get_automap_base_with_views
+from ..geospatial.format_conversions import LOCATION_FORMAT_EWKB, LOCATION_FORMAT_XY, \
+    get_location_columns, get_xy_column_names, load_location_series
+from ..geospatial.polygon_index import NO_POLYGON, PolygonIndex
+from ..utils.db_helpers import get_automap_base_with_views, get_pooled_engine
+from ..utils.parquet_cache import get_cache_key
+from . import centrality
+from .frequency import add_od_frequency, count_od_keys, get_od_edge_list, get_od_frequency
+from .od_keys import LocationEncoder, pack_od_keys
+
+# Location formats supported by the trip table pipeline
+TRIP_LOCATION_FORMATS = (LOCATION_FORMAT_EWKB, LOCATION_FORMAT_XY)
+
+# Version of the trip cleaning, part of the cache key of get_trip_tables_by_cardtype.
+# Bump it whenever clean_network_data or TripChunkAggregator change their output.
+TRIP_TABLE_CACHE_VERSION = 2
+
+# Backends that add_stop_level_network_metrics can compute the centralities with.
+# CENTRALITY_BACKEND_NETWORKX: nx.degree_centrality and nx.eigenvector_centrality on a DiGraph.
+# CENTRALITY_BACKEND_SPARSE: transit_equity.networks.centrality on a scipy.sparse adjacency matrix.
+CENTRALITY_BACKEND_NETWORKX = 'networkx'
+CENTRALITY_BACKEND_SPARSE = 'sparse'
+CENTRALITY_BACKENDS = (CENTRALITY_BACKEND_NETWORKX, CENTRALITY_BACKEND_SPARSE)
+
+# Integer location columns added by clean_network_data, which the OD functions group trips on
+LOCATION_ID_COLUMNS = ('board_id', 'alight_id', 'od_key')
 
 def get_trip_tables_by_cardtype(postgres_url_ng,
                                 test_schema,
@@ -42,7 +89,13 @@ def get_trip_tables_by_cardtype(postgres_url_ng,
                                 vboardings_table,
                                 gtfs_table,
                                 user_type,
-                                chunk_size=100000):
+                                chunk_size=100000,
+                                location_format=LOCATION_FORMAT_EWKB,
+                                include_location_strings=True,
+                                cache=None,
+                                refresh_cache=False,
+                                statement_timeout_ms=None,
+                                registry=None):
     """
     Pull and process trips table data from the orca_ng database based on user type.
 
@@ -84,23 +137,54 @@ def get_trip_tables_by_cardtype(postgres_url_ng,
         is true when using the updated database.
     chunk_size : int
         The number of rows in each chunk. Defaults to 100000.
+    location_format : str
+        The format in which the stop locations are pulled from the database. Defaults to
+        LOCATION_FORMAT_EWKB, which pulls the geometry columns as hex EWKB strings.
+        LOCATION_FORMAT_XY pulls ST_X/ST_Y floats instead, which cuts the transfer size and skips
+        WKB parsing on the client.
+    include_location_strings : bool
+        Whether to keep the 'board_string' and 'alight_string' columns in the output. Defaults to
+        True. Trips are grouped and merged on the integer 'board_id', 'alight_id' and 'od_key'
+        columns, so pass False to save the memory of the strings.
+    cache : transit_equity.utils.parquet_cache.ParquetCache, optional
+        Cache for the cleaned trip table. If given, the table is loaded from the cache when the
+        query SQL, the schema and table names, user_type and the cleaning parameters are all
+        unchanged, and stored in it as GeoParquet otherwise. Defaults to None (no caching).
+    refresh_cache : bool
+        Whether to invalidate the cached table and re-run the query. Defaults to False.
+    statement_timeout_ms : int, optional
+        Statement timeout of the database connections, in milliseconds. Defaults to None (the
+        server setting). The engine is shared by every call with the same URL and timeout, so
+        repeated calls (e.g. a loop over user types) reuse its pooled connections.
+    registry : transit_equity.utils.db_helpers.ReflectionRegistry, optional
+        Registry to take the reflected tables from, e.g. REFLECTION_REGISTRY, so that repeated
+        calls reflect each table only once. Defaults to None, which reflects the tables for this
+        call.
     
     Returns
     -------
     GeoDataFrame
         A GeoDataFrame containing the trip data, with geometries set to 'board_location_shapely'.
+        Duplicate trips are dropped and 'trip_frequency' is counted across all chunks, so the result
+        does not depend on chunk_size.
     """
 
-    #connect to engines
-    engine_ng = create_engine(os.getenv(postgres_url_ng))
+    if location_format not in TRIP_LOCATION_FORMATS:
+        raise ValueError(f'location_format must be one of {TRIP_LOCATION_FORMATS}, '
+                         f'got {location_format!r}')
+
+    #connect to engines, reusing the pooled engine of any previous call
+    engine_ng = get_pooled_engine(os.getenv(postgres_url_ng), statement_timeout_ms=statement_timeout_ms)
 
-    # Setup Session Maker and Session
+    # Setup Session Maker
     session_ng_maker = sessionmaker(bind=engine_ng)
-    session_ng = session_ng_maker()
 
-    # NG test Schema Base
-    base_ng_test = get_automap_base_with_views(engine=engine_ng, schema=test_schema)
-    base_ng_orca = get_automap_base_with_views(engine=engine_ng, schema=orca_schema)
+    # NG test Schema Base, with only the tables of the query reflected
+    base_ng_test = get_automap_base_with_views(
+        engine=engine_ng, schema=test_schema,
+        only=[trips_table, alights_table, boardings_table, gtfs_table], registry=registry)
+    base_ng_orca = get_automap_base_with_views(engine=engine_ng, schema=orca_schema,
+                                               only=[vboardings_table], registry=registry)
 
     # Tables of interest from orca_ng
     trips_ng = base_ng_test.metadata.tables[trips_table]
@@ -109,34 +193,67 @@ def get_trip_tables_by_cardtype(postgres_url_ng,
     vboardings_ng = base_ng_orca.metadata.tables[vboardings_table]
     gtfs_stops_ng = base_ng_test.metadata.tables[gtfs_table]
 
-    # Constructing the query
-    query = (
-        session_ng.query(
-            vboardings_ng.c.card_id,
-            vboardings_ng.c.txn_id,
-            alights_ng.c.txn_id,
-            vboardings_ng.c.device_dtm_pacific,
-            alights_ng.c.alight_dtm_pacific,
-            boardings_ng.c.stop_location,
-            gtfs_stops_ng.c.stop_location
-        ).select_from(trips_ng)
-        .join(boardings_ng, boardings_ng.c.txn_id == trips_ng.c.orig_txn_id)
-        .join(alights_ng, alights_ng.c.txn_id == trips_ng.c.dest_txn_id)
-        .join(vboardings_ng, vboardings_ng.c.txn_id == trips_ng.c.orig_txn_id)
-        .join(gtfs_stops_ng, gtfs_stops_ng.c.stop_id == alights_ng.c.stop_id)
-        .filter(
-            and_(
-                boardings_ng.c.stop_location.isnot(None),
-                gtfs_stops_ng.c.stop_location.isnot(None),
-                vboardings_ng.c.passenger_type_id == user_type
+    # Location columns, either as the raw geometry columns or as x/y floats
+    if location_format == LOCATION_FORMAT_EWKB:
+        location_columns = [boardings_ng.c.stop_location, gtfs_stops_ng.c.stop_location]
+    else:
+        location_columns = [
+            *get_location_columns(boardings_ng.c.stop_location, 'board_location', location_format),
+            *get_location_columns(gtfs_stops_ng.c.stop_location, 'alight_location', location_format)
+        ]
+
+    # Constructing the query. The session is only needed to build it, so close it right away
+    with session_ng_maker() as session_ng:
+        query = (
+            session_ng.query(
+                vboardings_ng.c.card_id,
+                vboardings_ng.c.txn_id,
+                alights_ng.c.txn_id,
+                vboardings_ng.c.device_dtm_pacific,
+                alights_ng.c.alight_dtm_pacific,
+                *location_columns
+            ).select_from(trips_ng)
+            .join(boardings_ng, boardings_ng.c.txn_id == trips_ng.c.orig_txn_id)
+            .join(alights_ng, alights_ng.c.txn_id == trips_ng.c.dest_txn_id)
+            .join(vboardings_ng, vboardings_ng.c.txn_id == trips_ng.c.orig_txn_id)
+            .join(gtfs_stops_ng, gtfs_stops_ng.c.stop_id == alights_ng.c.stop_id)
+            .filter(
+                and_(
+                    boardings_ng.c.stop_location.isnot(None),
+                    gtfs_stops_ng.c.stop_location.isnot(None),
+                    vboardings_ng.c.passenger_type_id == user_type
+                )
             )
         )
-    )
+
+    # The cleaned table only depends on the query and the cleaning parameters (not on chunk_size),
+    # so reuse it if it is cached
+    if cache is not None:
+        cache_key = get_cache_key(
+            version=TRIP_TABLE_CACHE_VERSION,
+            url=engine_ng.url.render_as_string(hide_password=True),
+            sql=str(query.statement.compile(dialect=engine_ng.dialect)),
+            schemas=[test_schema, orca_schema],
+            tables=[trips_table, alights_table, boardings_table, vboardings_table, gtfs_table],
+            user_type=user_type,
+            location_format=location_format,
+            include_location_strings=include_location_strings
+        )
+        if refresh_cache:
+            cache.invalidate(cache_key)
+        gdf_trips = cache.load(cache_key)
+        if gdf_trips is not None:
+            print(f"Loaded {len(gdf_trips)} cached records")
+            return gdf_trips
 
     # Because the adults table is so large that it was causing memory limitation issues, read the
     # table in chunks of chunk_size rows and then concatenate them after.
 
 
+    # Chunks are cleaned as they are read, while the aggregator keeps the duplicate trip keys and
+    # the origin-destination counts of all chunks. Trip frequencies are attached once at the end.
+    aggregator = TripChunkAggregator(location_format, include_location_strings)
+
     with engine_ng.connect() as connection:
         result_proxy = connection.execution_options(stream_results=True).execute(query.statement)
         chunk_count = 0
@@ -149,7 +266,7 @@ def get_trip_tables_by_cardtype(postgres_url_ng,
             chunk_df = pd.DataFrame(chunk, columns=result_proxy.keys())
             # Filter and clean each chunk here, can trade out for other cleaning pipeline for other
             # analyses if desired
-            filtered_chunk_gdf = clean_and_filter_network_data(chunk_df)
+            filtered_chunk_gdf = aggregator.add_chunk(chunk_df)
             chunks.append(filtered_chunk_gdf)
             chunk_count += 1
             # Print progress for each 10 chunks read.
@@ -160,18 +277,286 @@ def get_trip_tables_by_cardtype(postgres_url_ng,
     df_trips_lift = pd.concat(chunks, ignore_index=True)
     print(f"Total records fetched: {len(df_trips_lift)}")
 
+    # Attach the trip frequencies counted over all chunks
+    df_trips_lift = aggregator.add_trip_frequency(df_trips_lift)
+
     # changing pandas df to geopandas geo df
     df_trips_gdf = gpd.GeoDataFrame(df_trips_lift, geometry='board_location_shapely')
 
     # Ensure shapely locations are set as geometry dtype
     gdf_trips = df_trips_gdf.set_geometry('board_location_shapely')
 
+    if cache is not None:
+        cache.save(cache_key, gdf_trips)
+
     return gdf_trips
 
-def clean_and_filter_network_data(trips_df):
+def get_trip_tables_by_cardtypes(postgres_url_ng,
+                                 test_schema,
+                                 orca_schema,
+                                 trips_table,
+                                 alights_table,
+                                 boardings_table,
+                                 vboardings_table,
+                                 gtfs_table,
+                                 user_types,
+                                 max_workers=None,
+                                 use_processes=True,
+                                 executor=None,
+                                 chunk_size=100000,
+                                 location_format=LOCATION_FORMAT_EWKB,
+                                 include_location_strings=True,
+                                 cache=None,
+                                 refresh_cache=False,
+                                 statement_timeout_ms=None,
+                                 registry=None):
+    """
+    Pull and process the trips table data of several user types concurrently.
+
+    Running get_trip_tables_by_cardtype once per user type in a loop leaves the client idle while
+    the database runs each query, and leaves the database idle while the client cleans each
+    result. Here, one get_trip_tables_by_cardtype call per user type is submitted to a pool of
+    workers, so the queries run concurrently and the results are cleaned in parallel.
+
+    With processes (the default), every worker process opens its own pooled engine and cleans its
+    chunks without contending for the GIL. With threads, the workers share the pooled engine (and
+    reflected tables) of this process, which avoids pickling the results back, but the cleaning
+    is then mostly serialized by the GIL.
+
+    Parameters
+    ----------
+    postgres_url_ng, test_schema, orca_schema, trips_table, alights_table, boardings_table,
+    vboardings_table, gtfs_table :
+        See get_trip_tables_by_cardtype.
+    user_types : iterable
+        The passenger type IDs to pull, e.g. [1, 2, 3, 4, 5]. See get_trip_tables_by_cardtype.
+    max_workers : int, optional
+        The number of workers. Defaults to None, which uses one worker per user type (capped at
+        the number of CPUs for processes). Keep it below the pool size of the engine
+        (pool_size + max_overflow of get_pooled_engine) when using threads.
+    use_processes : bool
+        Whether to use a process pool rather than a thread pool. Defaults to True.
+    executor : concurrent.futures.Executor, optional
+        An existing executor to submit the work to, e.g. a ProcessPoolExecutor with an initializer.
+        It is not shut down. Defaults to None, in which case a pool is created for this call
+        according to max_workers and use_processes.
+    chunk_size, location_format, include_location_strings, cache, refresh_cache,
+    statement_timeout_ms, registry :
+        Passed to get_trip_tables_by_cardtype for every user type. A registry sent to worker
+        processes arrives empty in each task, so it only saves reflection there with a persist_dir.
+
+    Returns
+    -------
+    dict
+        The GeoDataFrame of get_trip_tables_by_cardtype for each user type, keyed by user type,
+        in the order of user_types.
+    """
+    user_types = list(user_types)
+    if executor is None:
+        if use_processes:
+            n_workers = max_workers or min(len(user_types), os.cpu_count() or 1)
+            pool = ProcessPoolExecutor(max_workers=n_workers)
+        else:
+            pool = ThreadPoolExecutor(max_workers=max_workers or len(user_types))
+    else:
+        pool = executor
+
+    try:
+        futures = {
+            user_type: pool.submit(
+                get_trip_tables_by_cardtype, postgres_url_ng, test_schema, orca_schema,
+                trips_table, alights_table, boardings_table, vboardings_table, gtfs_table,
+                user_type, chunk_size=chunk_size, location_format=location_format,
+                include_location_strings=include_location_strings, cache=cache,
+                refresh_cache=refresh_cache, statement_timeout_ms=statement_timeout_ms,
+                registry=registry)
+            for user_type in user_types
+        }
+        return {user_type: future.result() for user_type, future in futures.items()}
+    finally:
+        if executor is None:
+            pool.shutdown(cancel_futures=True)
+
+class TripKeySet:
+    """
+    Exact set of the trip keys kept so far, to drop duplicate trips across streamed chunks.
+
+    The keys are looked up by their 64-bit hash in a sorted array, so a whole chunk is checked with
+    one vectorized search. A hash match is only a candidate: the key values are then compared with
+    the stored ones, so a hash collision never drops a distinct trip.
+
+    Attributes
+    ----------
+    key_columns : list
+        The columns of the trip keys, set by the first call to add_new.
+
+    Example
+    -------
+    >>> seen_trip_keys = TripKeySet()
+    >>> is_new_trip = seen_trip_keys.add_new(trips_df[trip_key_columns])
+    """
+    def __init__(self):
+        self.key_columns = None
+        # sorted hashes of the keys, and the position of each in the order the keys were added
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._positions = np.zeros(0, dtype=np.int64)
+        # key values, in the order they were added, one DataFrame per call to add_new
+        self._key_chunks = []
+        self._chunk_offsets = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add_new(self, df_keys):
+        """
+        Find the rows of df_keys whose key is not in the set (nor in an earlier row), and add them.
+
+        Parameters
+        ----------
+        df_keys : pd.DataFrame
+            Trip keys, with the same columns at every call.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the rows of df_keys that were new.
+        """
+        if self.key_columns is None:
+            self.key_columns = list(df_keys.columns)
+        df_keys = df_keys[self.key_columns].reset_index(drop=True)
+
+        is_new = ~df_keys.duplicated(keep='first').to_numpy()
+        hashes = pd.util.hash_pandas_object(df_keys, index=False).to_numpy(dtype=np.uint64)
+        # searching sorted hashes is much faster, and only the matching ones need a second search
+        hash_order = np.argsort(hashes)
+        first_matches = np.empty(len(hashes), dtype=np.int64)
+        first_matches[hash_order] = np.searchsorted(self._hashes, hashes[hash_order], side='left')
+        is_match = np.zeros(len(hashes), dtype=bool)
+        if len(self._hashes):
+            is_match = self._hashes[np.minimum(first_matches, len(self._hashes) - 1)] == hashes
+        n_matches = np.zeros(len(hashes), dtype=np.int64)
+        n_matches[is_match] = np.searchsorted(self._hashes, hashes[is_match], side='right') - first_matches[is_match]
+
+        # compare the rows with a matching hash to every stored key with that hash
+        # (almost always one, more only after a collision)
+        for offset in range(int(n_matches.max(initial=0))):
+            candidates = np.flatnonzero(is_new & (n_matches > offset))
+            stored_keys = self._take(self._positions[first_matches[candidates] + offset])
+            is_equal = np.ones(len(candidates), dtype=bool)
+            for column in self.key_columns:
+                values = df_keys[column].to_numpy()[candidates]
+                stored_values = stored_keys[column].to_numpy()
+                is_equal &= (values == stored_values) | (pd.isna(values) & pd.isna(stored_values))
+            is_new[candidates[is_equal]] = False
+
+        if is_new.any():
+            new_hash_order = hash_order[is_new[hash_order]]
+            new_hashes = hashes[new_hash_order]
+            # positions of the new keys in the order they are added, i.e. their rank among the new rows
+            new_positions = len(self._hashes) + (np.cumsum(is_new) - 1)[new_hash_order]
+            insert_at = np.searchsorted(self._hashes, new_hashes, side='right')
+            self._chunk_offsets = np.append(self._chunk_offsets, len(self._hashes))
+            self._key_chunks.append(df_keys[is_new].reset_index(drop=True))
+            self._hashes = np.insert(self._hashes, insert_at, new_hashes)
+            self._positions = np.insert(self._positions, insert_at, new_positions)
+        return is_new
+
+    def _take(self, positions):
+        # key values at positions in the order the keys were added, as one DataFrame
+        chunk_ids = np.searchsorted(self._chunk_offsets, positions, side='right') - 1
+        rows = [self._key_chunks[chunk_id].iloc[positions[chunk_ids == chunk_id] - self._chunk_offsets[chunk_id]]
+                for chunk_id in np.unique(chunk_ids)]
+        order = np.argsort(np.argsort(chunk_ids, kind='stable'), kind='stable')
+        if not rows:
+            return pd.DataFrame(columns=self.key_columns)
+        return pd.concat(rows, ignore_index=True).iloc[order].reset_index(drop=True)
+
+class TripChunkAggregator:
+    """
+    Cleans streamed chunks of trip data and keeps the running state needed to make duplicate
+    detection and trip frequencies correct across all chunks, not just within each chunk.
+
+    Each chunk is cleaned with clean_network_data, dropping trips already seen in earlier chunks,
+    and reduced to partial origin-destination counts that are merged into a running total. Once
+    all chunks are read, add_trip_frequency attaches the global counts to the concatenated trips.
+
+    Attributes
+    ----------
+    location_format : str
+        Format of the location columns in the chunks, LOCATION_FORMAT_EWKB or LOCATION_FORMAT_XY.
+    include_location_strings : bool
+        Whether the cleaned chunks keep the 'board_string' and 'alight_string' columns.
+    location_encoder : LocationEncoder
+        Encoder shared by all chunks, so that location ids and OD keys are consistent across them.
+    od_counts : pd.Series
+        Running number of trips per 'od_key'. None until the first chunk is added.
+
+    Example
+    -------
+    >>> aggregator = TripChunkAggregator()
+    >>> chunks = [aggregator.add_chunk(chunk_df) for chunk_df in chunk_dfs]
+    >>> gdf_trips = aggregator.add_trip_frequency(pd.concat(chunks, ignore_index=True))
+    """
+    def __init__(self, location_format=LOCATION_FORMAT_EWKB, include_location_strings=True):
+        self.location_format = location_format
+        self.include_location_strings = include_location_strings
+        self.location_encoder = LocationEncoder()
+        self.od_counts = None
+        self._seen_trip_keys = TripKeySet()
+
+    def add_chunk(self, trips_df):
+        """
+        Clean a chunk of trip data and add its origin-destination counts to the running total.
+
+        Parameters
+        ----------
+        trips_df : pd.DataFrame
+            A chunk of trip data, in the format expected by clean_network_data.
+
+        Returns
+        -------
+        gpd.GeoDataFrame
+            The cleaned chunk, without the 'trip_frequency' column.
+        """
+        gdf_trips = clean_network_data(trips_df, self.location_format, self._seen_trip_keys,
+                                       self.location_encoder, self.include_location_strings)
+
+        partial_counts = count_od_keys(gdf_trips['od_key'])
+        if self.od_counts is None:
+            self.od_counts = partial_counts
+        else:
+            self.od_counts = self.od_counts.add(partial_counts, fill_value=0).astype('int64')
+        return gdf_trips
+
+    def add_trip_frequency(self, gdf_trips):
+        """
+        Add the 'trip_frequency' column, counted over every chunk added so far, to cleaned trips.
+
+        Parameters
+        ----------
+        gdf_trips : gpd.GeoDataFrame
+            Cleaned trips, e.g. the concatenated output of add_chunk.
+
+        Returns
+        -------
+        gpd.GeoDataFrame
+            gdf_trips with 'trip_frequency' inserted before 'board_id'.
+        """
+        if self.od_counts is None:
+            trip_frequency = np.zeros(len(gdf_trips), dtype='int64')
+        else:
+            trip_frequency = self.od_counts.reindex(gdf_trips['od_key'], fill_value=0).to_numpy()
+        gdf_trips.insert(gdf_trips.columns.get_loc('board_id'), 'trip_frequency', trip_frequency)
+        return gdf_trips
+
+def clean_and_filter_network_data(trips_df, location_format=LOCATION_FORMAT_EWKB,
+                                  include_location_strings=True):
     """
     Cleans and filters trip data, transforming it into a GeoDataFrame for spatial analysis.
 
+    The trip frequency is counted within trips_df only. To clean data streamed in chunks, use
+    TripChunkAggregator so that duplicates and frequencies are handled across all chunks.
+
     Args:
     trips_df (pd.DataFrame): DataFrame containing trip data with columns:
         - 'stop_location': Boarding location as a binary string.
@@ -181,18 +566,67 @@ def clean_and_filter_network_data(trips_df):
         - 'txn_id': Boarding transaction ID.
         - 'txn_id_1': Alighting transaction ID.
         - 'card_id': ID of the card used for the trip.
+        With location_format=LOCATION_FORMAT_XY, the location columns are replaced by
+        'board_location_x', 'board_location_y', 'alight_location_x' and 'alight_location_y'.
+    location_format (str): Format of the location columns, LOCATION_FORMAT_EWKB (default) or
+        LOCATION_FORMAT_XY.
+    include_location_strings (bool): Whether to keep the 'board_string' and 'alight_string'
+        columns. Defaults to True. The frequency, dedup and merge logic runs on the integer
+        location ids and OD keys, so pass False to save the memory of the strings.
 
     Returns:
     gpd.GeoDataFrame: Cleaned GeoDataFrame with columns:
         - 'card_id': ID of the card used for the trip.
-        - 'board_location': Original boarding location binary string.
-        - 'alight_location': Original alighting location binary string.
+        - 'board_location': Original boarding location binary string (hex WKB built from the
+            coordinates for LOCATION_FORMAT_XY).
+        - 'alight_location': Original alighting location binary string (hex WKB built from the
+            coordinates for LOCATION_FORMAT_XY).
         - 'board_location_shapely': Shapely geometry of the boarding location.
         - 'alight_location_shapely': Shapely geometry of the alighting location.
         - 'trip_time_minutes': Duration of the trip in minutes.
+        - 'board_dtm_pacific': Boarding date and time.
         - 'trip_frequency': Frequency of trips between the boarding and alighting locations.
+        - 'board_id': int32 id of the boarding location.
+        - 'alight_id': int32 id of the alighting location.
+        - 'od_key': int64 key of the origin-destination pair (see networks.od_keys).
         - 'board_string': String representation of the boarding location.
+            Unless include_location_strings is False.
         - 'alight_string': String representation of the alighting location.
+            Unless include_location_strings is False.
+
+    Steps:
+        1. Clean the trips with clean_network_data.
+        2. Calculate the frequency of trips between each pair of boarding and alighting locations
+            and add it to the cleaned trips.
+
+    Example:
+    >>> gdf_trips = clean_and_filter_network_data(df_trips_lift)"""
+    gdf_trips = clean_network_data(trips_df, location_format,
+                                   include_location_strings=include_location_strings)
+    gdf_trips.insert(gdf_trips.columns.get_loc('board_id'), 'trip_frequency',
+                     get_od_frequency(gdf_trips['od_key']))
+    return gdf_trips
+
+def clean_network_data(trips_df, location_format=LOCATION_FORMAT_EWKB, seen_trip_keys=None,
+                       location_encoder=None, include_location_strings=True):
+    """
+    Cleans trip data like clean_and_filter_network_data, without calculating the trip frequency.
+
+    Args:
+    trips_df (pd.DataFrame): DataFrame containing trip data, see clean_and_filter_network_data.
+    location_format (str): Format of the location columns, LOCATION_FORMAT_EWKB (default) or
+        LOCATION_FORMAT_XY.
+    seen_trip_keys (TripKeySet, optional): Keys of the trips kept from earlier chunks. If given,
+        trips whose key is in the set are dropped as duplicates and the keys of the kept trips are
+        added to it. Defaults to None, which only drops duplicates within trips_df.
+    location_encoder (LocationEncoder, optional): Encoder used for the location ids. Share one
+        encoder between calls to get consistent ids and OD keys. Defaults to a new encoder.
+    include_location_strings (bool): Whether to keep the 'board_string' and 'alight_string'
+        columns. Defaults to True.
+
+    Returns:
+    gpd.GeoDataFrame: Cleaned GeoDataFrame with the columns of clean_and_filter_network_data,
+        except 'trip_frequency'.
 
     Steps:
         1. Rename columns for clarity.
@@ -201,15 +635,11 @@ def clean_and_filter_network_data(trips_df):
         4. Remove duplicate trips, keeping the first instance.
         5. Filter trips to those with a duration of 3 hours or less.
         6. Convert location binary strings to Shapely geometries.
-        7. Convert geometries to string format.
-        8. Calculate the frequency of trips between each pair of boarding and alighting locations.
-        9. Merge frequency data with the original DataFrame.
-        10. Drop unnecessary columns.
-        11. Convert the DataFrame to a GeoDataFrame.
-        12. Set the CRS to EPSG:32610 and reproject to EPSG:3857.
-
-    Example:
-    >>> gdf_trips = clean_and_filter_network_data(df_trips_lift)"""
+        7. Encode the locations to integer ids and OD keys (and optionally to strings).
+        8. Drop unnecessary columns.
+        9. Convert the DataFrame to a GeoDataFrame.
+        10. Set the CRS to EPSG:32610 and reproject to EPSG:3857.
+    """
     # rename stop location columns to be more intuitive
     trips_df = trips_df.rename(columns={'stop_location':'board_location',
         'stop_location_1':'alight_location',
@@ -227,49 +657,61 @@ def clean_and_filter_network_data(trips_df):
         abs((unduplicated_trips_lift['alight_dtm_pacific'] - \
              unduplicated_trips_lift['board_dtm_pacific']).dt.total_seconds() / 60)
 
+    # Boarding location column(s) used to identify duplicated rows
+    if location_format == LOCATION_FORMAT_XY:
+        board_location_columns = list(get_xy_column_names('board_location'))
+    else:
+        board_location_columns = ['board_location']
+    trip_key_columns = ['card_id', 'board_dtm_pacific', 'alight_dtm_pacific',
+                        *board_location_columns, 'trip_time_minutes']
+
     # Keep the first instance of duplicated rows
-    drop_dupes_alight = unduplicated_trips_lift.drop_duplicates(subset=['card_id',
-                                                                        'board_dtm_pacific',
-                                                                        'alight_dtm_pacific',
-                                                                        'board_location', 
-                                                                        'trip_time_minutes'],
-                                                                        keep='first')
+    if seen_trip_keys is None:
+        drop_dupes_alight = unduplicated_trips_lift.drop_duplicates(subset=trip_key_columns,
+                                                                    keep='first')
+    else:
+        # Look the trip keys up in the keys of the earlier chunks as well
+        is_new_trip = seen_trip_keys.add_new(unduplicated_trips_lift[trip_key_columns])
+        drop_dupes_alight = unduplicated_trips_lift[is_new_trip]
 
     #subsetting to trips less than or equal to 3 hours based on Mark and Ryan's input
     tripsize_filter_df = drop_dupes_alight[drop_dupes_alight['trip_time_minutes'] <= 180]
 
-    # convert location binary strings to shapely geometries to enable plotting
+    # convert locations to shapely geometries to enable plotting
     tripsize_filter_df['board_location_shapely'] = \
-        tripsize_filter_df['board_location'].apply(load_wkb)
+        load_location_series(tripsize_filter_df, 'board_location', location_format)
     tripsize_filter_df['alight_location_shapely'] = \
-        tripsize_filter_df['alight_location'].apply(load_wkb)
-
-    # to determine frequency between stops first need to convert geometry to string
-    tripsize_filter_df['board_string'] = tripsize_filter_df['board_location'].astype('string')
-    tripsize_filter_df['alight_string'] = tripsize_filter_df['alight_location'].astype('string')
-
-    # Calculate edge frequencies for each combination of origin and destination and create column
-    # to match in tripsize filter df
-    edge_freq = tripsize_filter_df.groupby(['board_string', 'alight_string']) \
-        .size().reset_index(name='trip_frequency')
-
-    # combining board and alight string to create column to match
-    edge_freq['start_stop_string'] = edge_freq['board_string'] + edge_freq['alight_string']
-    edge_freq = edge_freq[['trip_frequency','start_stop_string']]
-
-    # need to create a column to match in tripsize_filter_df
-    tripsize_filter_df['start_stop_string'] = tripsize_filter_df['board_string'] \
-        + tripsize_filter_df['alight_string']
-
-    # Merge edge_freq into tripsize_filter_df based on 'start_stop_string'
-    tripsize_filter_df = pd.merge(tripsize_filter_df, edge_freq, on='start_stop_string', how='left')
+        load_location_series(tripsize_filter_df, 'alight_location', location_format)
+
+    # x/y locations have no binary string, so encode one from the geometries to keep the output
+    # columns the same for every location format
+    if location_format == LOCATION_FORMAT_XY:
+        tripsize_filter_df['board_location'] = \
+            shapely.to_wkb(tripsize_filter_df['board_location_shapely'].values, hex=True)
+        tripsize_filter_df['alight_location'] = \
+            shapely.to_wkb(tripsize_filter_df['alight_location_shapely'].values, hex=True)
+
+    # to determine frequency between stops, encode each location to a compact integer id and
+    # each pair of stops to a packed integer key
+    if location_encoder is None:
+        location_encoder = LocationEncoder()
+    tripsize_filter_df['board_id'] = location_encoder.encode(tripsize_filter_df['board_location'])
+    tripsize_filter_df['alight_id'] = location_encoder.encode(tripsize_filter_df['alight_location'])
+    tripsize_filter_df['od_key'] = pack_od_keys(tripsize_filter_df['board_id'],
+                                                tripsize_filter_df['alight_id'])
+    location_string_columns = []
+    if include_location_strings:
+        tripsize_filter_df['board_string'] = tripsize_filter_df['board_location'].astype('string')
+        tripsize_filter_df['alight_string'] = \
+            tripsize_filter_df['alight_location'].astype('string')
+        location_string_columns = ['board_string', 'alight_string']
 
     # now drop cols that we won't use any longer
     tripsize_filter_clean = tripsize_filter_df[['card_id', 'board_location', \
                                                 'alight_location', 'board_location_shapely', \
                                                 'alight_location_shapely', 'trip_time_minutes', \
-                                                'trip_frequency', 'board_string', \
-                                                'alight_string'
+                                                'board_dtm_pacific', 'board_id', 'alight_id', 'od_key', \
+                                                *location_string_columns
                                                 ]]
 
     # changing pandas df to geopandas geo df
@@ -286,7 +728,19 @@ def clean_and_filter_network_data(trips_df):
 
     return gdf_trips
 
-def trip_frequency_filter(table, cutoff=0):
+def _check_location_id_columns(table, columns=LOCATION_ID_COLUMNS):
+    """
+    Raise a ValueError if the trips lack location id columns, e.g. because they were cleaned
+    before the ids were added and only have the 'board_string' and 'alight_string' columns.
+    """
+    missing_columns = [column for column in columns if column not in table.columns]
+    if missing_columns:
+        raise ValueError(f'The trips have no {missing_columns} columns. Trips are grouped on the integer '
+                         'location ids added by clean_network_data, so trips cleaned before they existed '
+                         'must be cleaned again with clean_and_filter_network_data or '
+                         'get_trip_tables_by_cardtype, which keep the string columns by default.')
+
+def trip_frequency_filter(table, cutoff=0, recompute_frequency=True):
     """
     Filters trips based on the frequency of trips between origin and destination pairs.
 
@@ -305,12 +759,20 @@ def trip_frequency_filter(table, cutoff=0):
         - 'alight_location_shapely'
         - 'trip_time_minutes'
         - 'trip_frequency'
-        - 'board_string'
-        - 'alight_string'
+        - 'board_id'
+        - 'alight_id'
+        - 'od_key'
+        'board_string' and 'alight_string' are kept if present.
     
     cutoff : int
         The minimum frequency threshold for trips to be included in the output table.
 
+    recompute_frequency : bool
+        Whether to recount the trip frequencies over the whole table. Defaults to True.
+        The output of get_trip_tables_by_cardtype already has 'trip_frequency' counted over all
+        chunks, so the full-table groupby and merge can be skipped by passing False, in which case
+        'trip_frequency_post_concat' is a copy of 'trip_frequency'.
+
     Returns:
     --------
     pandas.DataFrame
@@ -323,52 +785,48 @@ def trip_frequency_filter(table, cutoff=0):
         - 'alight_location_shapely'
         - 'trip_time_minutes'
         - 'trip_frequency'
-        - 'board_string'
-        - 'alight_string'
+        - 'board_id'
+        - 'alight_id'
+        - 'od_key'
+        - 'board_string' (if present in table)
+        - 'alight_string' (if present in table)
         - 'trip_frequency_post_concat'
     
     Notes:
     ------
-    - The function assumes that the combination of 'board_string' and 'alight_string' 
-      uniquely identifies each trip's origin and destination pair.
+    - The function assumes that 'od_key' uniquely identifies each trip's origin and destination
+      pair. The location ids must therefore come from a single LocationEncoder, as is the case for
+      the output of get_trip_tables_by_cardtype.
     - The 'trip_frequency_post_concat' column is created to represent the frequency 
       of trips for each origin-destination pair.
     - The input DataFrame is expected to be in a specific structure. Ensure that all 
       required columns are present before using this function.
     """
-    # Calculate edge frequencies for each combination of origin and destination and create column
-    # to match in tripsize filter df
-    edge_freq = table.groupby(['board_string', 'alight_string']) \
-            .size().reset_index(name='trip_frequency_post_concat')
-
-    # combining board and alight string to create column to match
-    edge_freq['start_stop_string'] = edge_freq['board_string'] + edge_freq['alight_string']
-    edge_freq = edge_freq[['trip_frequency_post_concat','start_stop_string']]
-
-    # # need to create a column to match in tripsize_filter_df
-    table['start_stop_string'] = table['board_string'] \
-            + table['alight_string']
-
-    # Merge edge_freq into tripsize_filter_df based on 'start_stop_string'
-    merged_table = pd.merge(table, edge_freq, on='start_stop_string', how='left')
-
-    # now drop cols that we won't use any longer
-    table_post_concat = merged_table[['card_id', 'board_location', \
-                                                    'alight_location', 'board_location_shapely', \
-                                                    'alight_location_shapely', 'trip_time_minutes',\
-                                                    'trip_frequency', 'board_string', \
-                                                    'alight_string', 'trip_frequency_post_concat'
-                                                    ]]
+    _check_location_id_columns(table)
+    output_columns = ['card_id', 'board_location', 'alight_location', 'board_location_shapely',
+                      'alight_location_shapely', 'trip_time_minutes', 'trip_frequency',
+                      'board_id', 'alight_id', 'od_key',
+                      *[column for column in ['board_string', 'alight_string']
+                        if column in table.columns]]
+
+    # drop cols that we won't use any longer
+    table_post_concat = table[output_columns].copy()
+
+    if recompute_frequency:
+        # Calculate edge frequencies for each origin-destination key, without merging
+        add_od_frequency(table_post_concat, 'trip_frequency_post_concat')
+    else:
+        table_post_concat['trip_frequency_post_concat'] = table_post_concat['trip_frequency']
 
     table_filter = table_post_concat[table_post_concat.trip_frequency_post_concat > cutoff]
     return table_filter
 
-def drop_downtown_points(points_table, downtown_polygon_path, stop_type):
+def drop_downtown_points(points_table, downtown_polygon_path, stop_type, downtown_index=None):
     """
     Drops points from a GeoDataFrame if they are within the extent of a downtown polygon.
 
-    This function reads a polygon shapefile representing a downtown area, performs a spatial join 
-    to identify points within the downtown polygon, and removes those points from the input 
+    This function reads a polygon shapefile representing a downtown area, finds the points within
+    the downtown polygon with a spatial index, and removes those points from the input
     GeoDataFrame.
 
     Parameters:
@@ -378,7 +836,16 @@ def drop_downtown_points(points_table, downtown_polygon_path, stop_type):
         column.
     
     downtown_polygon_path : str
-        The file path to the shapefile containing the downtown polygon.
+        The file path to the shapefile containing the downtown polygon. Not read if downtown_index
+        is given.
+
+    stop_type : str
+        'board' to filter on the 'board_centroid' column, or 'alight' to filter on the
+        'alight_centroid' column.
+
+    downtown_index : PolygonIndex, optional
+        A spatial index of the downtown polygon, e.g. to reuse the same one for the boarding and
+        alighting centroids. Defaults to None, which reads downtown_polygon_path and builds one.
 
     Returns:
     --------
@@ -387,73 +854,106 @@ def drop_downtown_points(points_table, downtown_polygon_path, stop_type):
 
     Notes:
     ------
-    - The function ensures that the CRS (Coordinate Reference System) of the points and the polygon
-        match.
-    - The 'index_right' column created by the spatial join is used to identify points within the
-        downtown polygon.
+    - The points are reprojected to the CRS of the polygon. Points without a CRS are assumed to be
+        in the CRS of the polygon.
     - The function prints the number of points dropped and the number of points remaining for
         verification.
 
     Example:
     --------
-    >>> filtered_gdf = drop_downtown_points(points_table, "/path/to/downtown_polygon.shp")
+    >>> filtered_gdf = drop_downtown_points(points_table, "/path/to/downtown_polygon.shp", 'board')
+
+    >>> downtown_index = PolygonIndex(gpd.read_file("/path/to/downtown_polygon.shp"))
+    >>> filtered_gdf = drop_downtown_points(points_table, None, 'board', downtown_index)
+    >>> filtered_gdf = drop_downtown_points(filtered_gdf, None, 'alight', downtown_index)
     """
     ## import downtown polygon
-    downtown_polygon = gpd.read_file(downtown_polygon_path)
-
-    # Ensure the polygons and points are in the same CRS
-    centroids_gdf = points_table.to_crs(downtown_polygon.crs)
+    if downtown_index is None:
+        downtown_index = PolygonIndex(gpd.read_file(downtown_polygon_path))
 
     if stop_type == 'board':
         location_column = 'board_centroid'
     elif stop_type == 'alight':
         location_column = 'alight_centroid'
 
-     #select relevant cols
-    centroids_gdf = centroids_gdf[[location_column]]
-
     # Ensure shapely locations are set as geometry dtype
-    centroids_gdf = centroids_gdf.set_geometry(location_column)
+    centroids = gpd.GeoSeries(points_table[location_column])
 
     # Set correct crs
-    if centroids_gdf.crs is None:
-        centroids_gdf = points_table.set_crs(downtown_polygon.crs)
-
-    centroids_gdf = centroids_gdf.to_crs(downtown_polygon.crs)
-
-    # Perform a spatial join to determine which polygon each point is contained in
-    downtown_hex_centroids = \
-        gpd.sjoin(centroids_gdf, downtown_polygon, how='left', predicate='within')
+    if centroids.crs is None:
+        centroids = centroids.set_crs(downtown_index.crs)
 
     # Identify points that are within the downtown polygon
-    points_within_downtown = downtown_hex_centroids[~downtown_hex_centroids['index_right'].isna()]
+    is_within_downtown = downtown_index.assign(centroids) != NO_POLYGON
 
     # Drop points that are within the downtown polygon from the original GeoDataFrame
-    filtered_centroids_gdf = \
-        points_table.loc[~points_table.index.isin(points_within_downtown.index)]
+    filtered_centroids_gdf = points_table.loc[~is_within_downtown]
 
     # Optionally, reset the index if needed
-    filtered_centroids_gdf.reset_index(drop=True, inplace=True)
+    filtered_centroids_gdf = filtered_centroids_gdf.reset_index(drop=True)
 
     # Print the number of points dropped and remaining
-    print(f"Number of points dropped from polygon: {len(points_within_downtown)}")
+    print(f"Number of points dropped from polygon: {is_within_downtown.sum()}")
     print(f"Number of points remaining: {len(filtered_centroids_gdf)}")
     return filtered_centroids_gdf
 
-def add_stop_level_network_metrics(gdf):
+def build_od_graph(edge_list, board_column='board_id', alight_column='alight_id'):
+    """
+    Build a directed graph in bulk from a weighted OD edge list.
+
+    Parameters
+    ----------
+    edge_list : pd.DataFrame
+        Edge list with one row per OD pair, e.g. the output of get_od_edge_list. The 'trip_count'
+        and 'weight' columns are stored as edge attributes.
+    board_column : str
+        Name of the boarding location id column. Defaults to 'board_id'.
+    alight_column : str
+        Name of the alighting location id column. Defaults to 'alight_id'.
+
+    Returns
+    -------
+    nx.DiGraph
+        Directed graph with a node per location id and an edge per OD pair.
+    """
+    _check_location_id_columns(edge_list, [board_column, alight_column])
+    G = nx.DiGraph()
+    G.add_edges_from(
+        (origin, destination, {'trip_count': trip_count, 'weight': weight, 'color': 'black'})
+        for origin, destination, trip_count, weight in zip(
+            edge_list[board_column].tolist(), edge_list[alight_column].tolist(),
+            edge_list['trip_count'].tolist(), edge_list['weight'].tolist())
+    )
+    return G
+
+def add_stop_level_network_metrics(gdf, use_trip_weights=False, weight_column=None,
+                                   backend=CENTRALITY_BACKEND_NETWORKX):
     """
     Calculate and add stop-level network metrics (degree centrality and eigenvector centrality) 
     to a GeoDataFrame representing a transit network.
 
-    This function creates a directed graph from boarding and alighting stops, where the edges 
-    represent trips between these stops. It computes degree centrality and eigenvector centrality 
-    for both boarding and alighting stops and adds these metrics as new columns in the GeoDataFrame.
+    This function aggregates the trips between boarding and alighting stops to a weighted edge
+    list, and builds a directed graph from it, where the edges represent trips between these stops.
+    It computes degree centrality and eigenvector centrality for both boarding and alighting stops
+    and adds these metrics as new columns in the GeoDataFrame.
 
     Parameters
     ----------
     gdf : gpd.GeoDataFrame
-        A GeoDataFrame containing trip data with columns 'board_string' and 'alight_string'
+        A GeoDataFrame containing trip data with columns 'board_id' and 'alight_id'
         representing the stop IDs for boarding and alighting respectively.
+    use_trip_weights : bool
+        Whether the eigenvector centrality uses the edge weights (the number of trips on each edge,
+        or the sum of weight_column). Defaults to False, which treats every edge equally.
+        Degree centrality is always unweighted.
+    weight_column : str, optional
+        Name of a per-trip weight column to sum into the edge weights. Defaults to None, in which
+        case the weight of an edge is its number of trips.
+    backend : str
+        One of CENTRALITY_BACKENDS. Defaults to CENTRALITY_BACKEND_NETWORKX.
+        CENTRALITY_BACKEND_SPARSE computes the same metrics with vectorized sparse matrix
+        products (see transit_equity.networks.centrality), which is much faster on full-region
+        networks and allows more power iterations for the eigenvector centrality.
 
     Returns
     -------
@@ -469,30 +969,40 @@ def add_stop_level_network_metrics(gdf):
     - Degree centrality measures the number of connections a stop has in the network.
     - Eigenvector centrality measures the influence of a stop based on the centrality of its
         neighbors.
-    - Stops that do not appear in the network will have a centrality value of `None`.
+    - Stops that do not appear in the network will have a centrality value of NaN.
     """
-    # Create a directed graph
-    G = nx.DiGraph()
+    _check_location_id_columns(gdf, ['board_id', 'alight_id'])
+
+    # Aggregate the trips to one weighted edge per origin-destination pair
+    edge_list = get_od_edge_list(gdf, weight_column=weight_column)
+
+    if backend == CENTRALITY_BACKEND_NETWORKX:
+        # Create a directed graph from the edge list
+        G = build_od_graph(edge_list)
 
-    # Add edges to the graph based on trips between stops
-    for idx, row in gdf.iterrows():
-        origin = row['board_string']
-        destination = row['alight_string']
-        G.add_edge(origin, destination, color='black')
+        # Calculate degree centrality
+        degree_centrality = pd.Series(nx.degree_centrality(G), dtype='float64')
 
-    # Calculate degree centrality
-    degree_centrality = nx.degree_centrality(G)
+        # Calculate eigenvector centrality
+        eigenvector_centrality = pd.Series(
+            nx.eigenvector_centrality(G, weight='weight' if use_trip_weights else None),
+            dtype='float64')
+    elif backend == CENTRALITY_BACKEND_SPARSE:
+        # Create a sparse adjacency matrix from the edge list
+        adjacency, node_ids = centrality.get_adjacency_matrix(
+            edge_list, weight_column='weight' if use_trip_weights else None)
 
-    # Calculate eigenvector centrality
-    eigenvector_centrality = nx.eigenvector_centrality(G)
+        degree_centrality = pd.Series(centrality.degree_centrality(adjacency), index=node_ids)
+        eigenvector_centrality = pd.Series(centrality.eigenvector_centrality(adjacency),
+                                           index=node_ids)
+    else:
+        raise ValueError(f'backend must be one of {CENTRALITY_BACKENDS}, got {backend!r}')
 
     # Add centrality metrics to the GeoDataFrame
-    gdf['centrality_board'] = gdf['board_string'].apply(lambda x: degree_centrality.get(x, None))
-    gdf['centrality_alight'] = gdf['alight_string'].apply(lambda x: degree_centrality.get(x, None))
+    gdf['centrality_board'] = gdf['board_id'].map(degree_centrality)
+    gdf['centrality_alight'] = gdf['alight_id'].map(degree_centrality)
 
-    gdf['eigencentrality_board'] = \
-        gdf['board_string'].apply(lambda x: eigenvector_centrality.get(x, None))
-    gdf['eigencentrality_alight'] = \
-        gdf['alight_string'].apply(lambda x: eigenvector_centrality.get(x, None))
+    gdf['eigencentrality_board'] = gdf['board_id'].map(eigenvector_centrality)
+    gdf['eigencentrality_alight'] = gdf['alight_id'].map(eigenvector_centrality)
 
     return gdf
@@ -0,0 +1,140 @@
+"""
+Module for dictionary-encoding stop and centroid locations into compact integer keys.
+
+Grouping, deduplicating and merging trips on location strings (or geometries) hashes and compares
+long object values for every row. Instead, each distinct location is mapped to an int32 id, and
+each origin-destination (OD) pair to an int64 key that packs the boarding id in the upper 32 bits
+and the alighting id in the lower 32 bits.
+
+Classes
+-------
+LocationEncoder
+    Maps distinct locations to int32 ids that stay stable across calls.
+
+Functions
+---------
+pack_od_keys(board_ids, alight_ids)
+    Packs boarding and alighting location ids into int64 OD keys.
+
+unpack_od_keys(od_keys)
+    Unpacks int64 OD keys into boarding and alighting location ids.
+"""
+import numpy as np
+import pandas as pd
+import shapely
+
+class LocationEncoder:
+    """
+    Maps distinct locations to compact int32 ids.
+
+    Ids are assigned in order of first appearance and stay stable across calls to `encode`, so one
+    encoder can be shared by the boarding and alighting columns and by every chunk of a streamed
+    query. Locations can be any hashable values (e.g. hex WKB strings) or shapely geometries,
+    which are compared by their WKB.
+
+    Attributes
+    ----------
+    locations : pd.Index
+        The distinct locations seen so far. The id of a location is its position in this index.
+
+    Example
+    -------
+    >>> encoder = LocationEncoder()
+    >>> gdf['board_id'] = encoder.encode(gdf['board_location'])
+    >>> gdf['alight_id'] = encoder.encode(gdf['alight_location'])
+    >>> gdf['od_key'] = pack_od_keys(gdf['board_id'], gdf['alight_id'])
+    """
+    def __init__(self):
+        self.locations = pd.Index([], dtype=object)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def encode(self, locations):
+        """
+        Get the ids of the given locations, assigning new ids to locations not seen before.
+
+        Parameters
+        ----------
+        locations : pd.Series or array-like
+            Locations to encode. Geometries are encoded by their WKB.
+            Missing values are not allowed.
+
+        Returns
+        -------
+        np.ndarray
+            int32 array with the id of each location.
+        """
+        values = _get_hashable_locations(locations)
+        codes, uniques = pd.factorize(values)
+        if (codes < 0).any():
+            raise ValueError('Cannot encode missing locations')
+
+        unique_ids = self.locations.get_indexer(uniques)
+        is_new = unique_ids < 0
+        if is_new.any():
+            unique_ids[is_new] = np.arange(len(self.locations), len(self.locations) + is_new.sum())
+            self.locations = self.locations.append(pd.Index(uniques[is_new], dtype=object))
+        if len(self.locations) > np.iinfo(np.int32).max:
+            raise OverflowError('Too many distinct locations for int32 ids')
+        return unique_ids.astype(np.int32)[codes]
+
+    def decode(self, ids):
+        """
+        Get the locations (as encoded) for the given ids.
+
+        Parameters
+        ----------
+        ids : array-like
+            Location ids returned by `encode`.
+
+        Returns
+        -------
+        np.ndarray
+            Object array of locations. Geometries are returned as WKB bytes.
+        """
+        return self.locations.to_numpy()[np.asarray(ids)]
+
+def _get_hashable_locations(locations):
+    values = np.asarray(locations, dtype=object)
+    if len(values) and isinstance(values[0], shapely.Geometry):
+        # Geometries are compared by value, so use their WKB as the dictionary key
+        values = shapely.to_wkb(values)
+    return values
+
+def pack_od_keys(board_ids, alight_ids):
+    """
+    Pack boarding and alighting location ids into int64 OD keys.
+
+    Parameters
+    ----------
+    board_ids : array-like
+        int32 ids of the boarding locations.
+    alight_ids : array-like
+        int32 ids of the alighting locations.
+
+    Returns
+    -------
+    np.ndarray
+        int64 array of OD keys, (board_id << 32) | alight_id.
+    """
+    board_ids = np.asarray(board_ids, dtype=np.int64)
+    alight_ids = np.asarray(alight_ids, dtype=np.int64)
+    return (board_ids << 32) | alight_ids
+
+def unpack_od_keys(od_keys):
+    """
+    Unpack int64 OD keys into boarding and alighting location ids.
+
+    Parameters
+    ----------
+    od_keys : array-like
+        int64 OD keys returned by `pack_od_keys`.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        int32 arrays of the boarding ids and the alighting ids.
+    """
+    od_keys = np.asarray(od_keys, dtype=np.int64)
+    return (od_keys >> 32).astype(np.int32), (od_keys & 0xFFFFFFFF).astype(np.int32)
@@ -13,10 +13,19 @@ from sqlalchemy.ext.automap import AutomapBase
 from . import get_schema_key
 from ..constants.schemas import DSSG_SCHEMA, ORCA_SCHEMA, TRAC_SCHEMA, GTFS_SCHEMA
 from ..constants.schema_tables import DSSG_SCHEMA_TABLES, ORCA_SCHEMA_TABLES, TRAC_SCHEMA_TABLES, GTFS_SCHEMA_TABLES
-from ...utils.db_helpers import get_automap_base_with_views
+from ...utils.db_helpers import ReflectionRegistry, get_automap_base_with_views
+
+# Tables used by get_stop_locations_from_transactions_and_latest_gtfs, reflected for each schema
+REFLECTED_TABLES = {
+    TRAC_SCHEMA: (TRAC_SCHEMA_TABLES.AGENCIES.value,),
+    ORCA_SCHEMA: (ORCA_SCHEMA_TABLES.TRANSACTIONS.value,),
+    GTFS_SCHEMA: (GTFS_SCHEMA_TABLES.TL_FEED_INFO.value, GTFS_SCHEMA_TABLES.TL_STOPS.value,
+                  GTFS_SCHEMA_TABLES.TL_AGENCY.value),
+}
 
 def get_stop_locations_from_transactions_and_latest_gtfs(start_date: datetime, end_date: datetime, 
-    automap_base_dict: dict, transactions_t: Table | None = None) -> Select:
+    automap_base_dict: dict | None = None, transactions_t: Table | None = None,
+    engine: Engine | None = None, registry: ReflectionRegistry | None = None) -> Select:
     """
     Deprecation Warning: 
     This function is deprecated due to its restrictive nature. Consider using TransactionsWithLocations class instead.
@@ -36,8 +45,14 @@ def get_stop_locations_from_transactions_and_latest_gtfs(start_date: datetime, e
         The keys are the schema names and the values are the automap base objects
         Naming convention for key: f'Base_{schema_name_in_lowercase}'
             Use transit_equity.orca_ng.query.get_schema_key if unsure
+        If not provided, the automap bases are reflected using engine and registry
     transactions_t : sqlalchemy.Table, optional
         Table object for the transactions table. If not provided, the default orca.transactions table is used
+    engine : sqlalchemy.Engine, optional
+        Engine that is already connected to a database. Required if automap_base_dict is not provided
+    registry : transit_equity.utils.db_helpers.ReflectionRegistry, optional
+        Registry to take the reflected tables from when automap_base_dict is not provided, e.g. REFLECTION_REGISTRY.
+        Defaults to None, which reflects the tables for this call
     
     Returns
     -------
@@ -60,6 +75,15 @@ def get_stop_locations_from_transactions_and_latest_gtfs(start_date: datetime, e
     ... )
     >>> print(type(query))
     """
+    if automap_base_dict is None:
+        if engine is None:
+            raise ValueError('Either automap_base_dict or engine must be provided')
+        automap_base_dict = {
+            get_schema_key(schema): get_automap_base_with_views(engine=engine, schema=schema, only=tables,
+                                                                   registry=registry)
+            for schema, tables in REFLECTED_TABLES.items()
+        }
+
     # Keys for schemas of interest
     Base_trac: AutomapBase = automap_base_dict[get_schema_key(TRAC_SCHEMA)]
     Base_orca: AutomapBase = automap_base_dict[get_schema_key(ORCA_SCHEMA)]
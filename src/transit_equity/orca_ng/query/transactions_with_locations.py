@@ -7,14 +7,19 @@ TransactionsWithLocations
     A class to get locations of transactions using customizable logic
 """
 import datetime
+from collections.abc import Callable, Iterator
 
+import pandas as pd
+import geopandas as gpd
 from sqlalchemy import Engine
 from sqlalchemy import Table, Select
 from sqlalchemy import func, select, not_, or_, and_, case
 
 from ..constants.schemas import DSSG_SCHEMA, ORCA_SCHEMA, TRAC_SCHEMA, GTFS_SCHEMA
 from ..constants.schema_tables import DSSG_SCHEMA_TABLES, ORCA_SCHEMA_TABLES, TRAC_SCHEMA_TABLES, GTFS_SCHEMA_TABLES
-from ...utils.db_helpers import get_automap_base_with_views
+from ...geospatial.format_conversions import LOCATION_FORMAT_EWKB, get_location_columns, load_location_series
+from ...utils.db_helpers import ReflectionRegistry, get_automap_base_with_views
+from ...utils.partitions import PARTITION_WEEK, get_date_partitions, iter_ordered
 
 class TransactionsWithLocations:
     """
@@ -23,13 +28,32 @@ class TransactionsWithLocations:
     Attributes
     ----------
     start_date : datetime
-        Earliest possible start date for the transactions. It is imperative to add start_date for performance reasons.
+        Earliest possible start date for the transactions (inclusive). It is imperative to add start_date for performance reasons.
     end_date : datetime
-        Earliest possible end date for the transactions. It is imperative to add end_date for performance reasons.
+        End date for the transactions (exclusive). It is imperative to add end_date for performance reasons.
+        Transactions are filtered on transactions_date_column >= start_date and < end_date, so pass the day after
+            the last day of interest (e.g. 2023-05-01 for all of April 2023).
     engine : sqlalchemy.Engine
         Engine that is already connected to a database
     transactions_t : sqlalchemy.Table, optional
         Table object for the transactions table. If not provided, the default orca.transactions table is used
+    location_format : str, optional
+        Format of the transaction location in the query output.
+        One of transit_equity.geospatial.format_conversions.LOCATION_FORMATS. Defaults to LOCATION_FORMAT_EWKB.
+        With any other format, the raw geometry columns (GEOMETRY_COLUMNS) are left out of the output,
+            so that only the transaction location is shipped, as WKB bytes or as x/y floats.
+    reflect_all : bool, optional
+        Whether to reflect every table and view of the schemas of interest. Defaults to False, which
+            reflects only the tables used by the queries of this class (REFLECTED_TABLES), so that
+            construction does not pay for reflecting the whole gtfs schema.
+    transactions_date_column : str, optional
+        Name of the timestamp column of transactions_t that is filtered on [start_date, end_date), and that the
+            date partitions are taken on. Set it to match transactions_t (e.g. 'business_date') so that PostgreSQL
+            can use the index (or partition pruning) of that column. Defaults to 'device_dtm_pacific'.
+        None disables the date filter on the transactions.
+    registry : transit_equity.utils.db_helpers.ReflectionRegistry, optional
+        Registry to take the reflected tables from, e.g. REFLECTION_REGISTRY, so that objects built one after
+            the other reflect each table only once. Defaults to None, which reflects the tables for this object.
 
     Methods
     -------
@@ -53,28 +77,62 @@ class TransactionsWithLocations:
         Get transactions with their stop or device locations using the latest GTFS feed.
         Uses logic from get_latest_gtfs_feed, get_stop_with_agency_from_feed and 
         get_transactions_with_stop_or_device_locations.
+
+    get_partition_queries :
+        Get the query restricted to each day or week partition of [start_date, end_date).
+
+    iter_partition_frames :
+        Run the partition queries concurrently with a bounded pool, and yield their results in order.
+
+    iter_frames :
+        Run a query with server-side streaming, and yield its result in chunks of bounded size.
     """
     STOP_LOCATION_TRANSFORMED_KEY = 'stop_location_transformed'
+    GEOMETRY_COLUMNS = ('device_location', 'stop_location', STOP_LOCATION_TRANSFORMED_KEY)
     TRANSACTION_LOCATION_KEY = 'transaction_location'
+    TRANSACTION_LOCATION_SHAPE_KEY = 'transaction_location_shape'
+    # Tables used by the queries of this class, reflected for each schema unless reflect_all is set
+    REFLECTED_TABLES = {
+        DSSG_SCHEMA: (),
+        TRAC_SCHEMA: (TRAC_SCHEMA_TABLES.AGENCIES.value,),
+        ORCA_SCHEMA: (ORCA_SCHEMA_TABLES.TRANSACTIONS.value,),
+        GTFS_SCHEMA: (GTFS_SCHEMA_TABLES.TRANSITLAND_FEEDS.value, GTFS_SCHEMA_TABLES.TL_STOPS.value,
+                      GTFS_SCHEMA_TABLES.TL_AGENCY.value),
+    }
     STOP_CRS = 4326
 
-    def __init__(self, start_date: datetime, end_date: datetime, engine: Engine, transactions_t: Table | None = None):
+    def __init__(self, start_date: datetime, end_date: datetime, engine: Engine, transactions_t: Table | None = None,
+                 location_format: str = LOCATION_FORMAT_EWKB, reflect_all: bool = False,
+                 transactions_date_column: str | None = 'device_dtm_pacific',
+                 registry: ReflectionRegistry | None = None):
         self.start_date = start_date
         self.end_date = end_date
         self.engine = engine
-        self.get_automap_bases()
+        self.registry = registry
+        self.get_automap_bases(reflect_all)
         if transactions_t is None:
             transactions_t = self.Base_orca.metadata.tables[ORCA_SCHEMA_TABLES.TRANSACTIONS.value]
         self.transactions_t = transactions_t
+        self.location_format = location_format
+        self.transactions_date_column = transactions_date_column
 
-    def get_automap_bases(self):
+    def get_automap_bases(self, reflect_all: bool = False):
         """
         Get the automap bases for the schemas of interest
+
+        Parameters
+        ----------
+        reflect_all : bool, optional
+            Whether to reflect every table and view of the schemas, instead of only REFLECTED_TABLES
         """
-        self.Base_dssg = get_automap_base_with_views(engine=self.engine, schema=DSSG_SCHEMA)
-        self.Base_trac = get_automap_base_with_views(engine=self.engine, schema=TRAC_SCHEMA)
-        self.Base_orca = get_automap_base_with_views(engine=self.engine, schema=ORCA_SCHEMA)
-        self.Base_gtfs = get_automap_base_with_views(engine=self.engine, schema=GTFS_SCHEMA)
+        def get_base(schema):
+            only = None if reflect_all else self.REFLECTED_TABLES[schema]
+            return get_automap_base_with_views(engine=self.engine, schema=schema, only=only, registry=self.registry)
+
+        self.Base_dssg = get_base(DSSG_SCHEMA)
+        self.Base_trac = get_base(TRAC_SCHEMA)
+        self.Base_orca = get_base(ORCA_SCHEMA)
+        self.Base_gtfs = get_base(GTFS_SCHEMA)
     
     def get_latest_gtfs_feed(self) -> Select:
         """
@@ -144,6 +202,8 @@ class TransactionsWithLocations:
     def get_transactions_with_agency(self) -> Select:
         """
         This function returns a query that can be used to get transactions 
+        The transactions are filtered on transactions_date_column within [start_date, end_date),
+            directly on transactions_t so that the predicate can use its index
 
         Returns
         -------
@@ -154,6 +214,10 @@ class TransactionsWithLocations:
         stmt_transactions_with_agency = \
             select(self.transactions_t, agencies.c.agency_id, agencies.c.orca_agency_id, agencies.c.gtfs_agency_id, agencies.c.agency_name)\
             .join(agencies, self.transactions_t.c.source_agency_id == agencies.c.orca_agency_id)
+        if self.transactions_date_column is not None:
+            date_column = self.transactions_t.c[self.transactions_date_column]
+            stmt_transactions_with_agency = stmt_transactions_with_agency\
+                .where(date_column >= self.start_date, date_column < self.end_date)
         return stmt_transactions_with_agency
 
     def get_transactions_with_stop_or_device_locations(self, stmt_stop_with_agency: Select) -> Select:
@@ -180,12 +244,25 @@ class TransactionsWithLocations:
         # The ctes stmt_transactions_with_agency_alias and stmt_stop_with_agency_alias
         # Have columns with the same name. SqlAlchemy handles this by appending _1 to the column names of the second cte.
         # This is not very human readable and can cause confusion.
+        transaction_location = \
+            case((getattr(stmt_stop_with_agency_alias.c, self.STOP_LOCATION_TRANSFORMED_KEY).is_not(None), 
+                  getattr(stmt_stop_with_agency_alias.c, self.STOP_LOCATION_TRANSFORMED_KEY)),
+                else_=stmt_transactions_with_agency_alias.c.device_location)
+
+        if self.location_format == LOCATION_FORMAT_EWKB:
+            transactions_columns = [stmt_transactions_with_agency_alias]
+            stop_columns = [stmt_stop_with_agency_alias]
+        else:
+            # Leave out the raw geometry columns so that only the requested location format is shipped
+            transactions_columns = [column for column in stmt_transactions_with_agency_alias.c
+                                    if column.name not in self.GEOMETRY_COLUMNS]
+            stop_columns = [column for column in stmt_stop_with_agency_alias.c
+                            if column.name not in self.GEOMETRY_COLUMNS]
+
         stmt_transactions_with_location = \
-            select(stmt_transactions_with_agency_alias,
-                case((getattr(stmt_stop_with_agency_alias.c, self.STOP_LOCATION_TRANSFORMED_KEY).is_not(None), 
-                      getattr(stmt_stop_with_agency_alias.c, self.STOP_LOCATION_TRANSFORMED_KEY)),
-                    else_=stmt_transactions_with_agency_alias.c.device_location).label(self.TRANSACTION_LOCATION_KEY),
-                stmt_stop_with_agency_alias)\
+            select(*transactions_columns,
+                *get_location_columns(transaction_location, self.TRANSACTION_LOCATION_KEY, self.location_format),
+                *stop_columns)\
             .join(stmt_stop_with_agency_alias,
                 and_(stmt_transactions_with_agency_alias.c.stop_code == stmt_stop_with_agency_alias.c.stop_id,
                     stmt_transactions_with_agency_alias.c.gtfs_agency_id == stmt_stop_with_agency_alias.c.agency_id),
@@ -213,7 +290,7 @@ class TransactionsWithLocations:
         >>> transactions_t = Base_orca.metadata.tables['transactions']
         >>> transactions_with_locations = TransactionsWithLocations(
         ...     start_date=datetime.datetime(2023, 4, 1),
-        ...     end_date=datetime.datetime(2023, 4, 30),
+        ...     end_date=datetime.datetime(2023, 5, 1),
         ...     engine=engine,
         ...     transactions_t=transactions_t
         ... )
@@ -222,4 +299,127 @@ class TransactionsWithLocations:
         """
         stmt_gtfs_feed_latest = self.get_latest_gtfs_feed()
         stmt_stop_with_agency = self.get_stop_with_agency_from_feed(stmt_gtfs_feed_latest)
-        return self.get_transactions_with_stop_or_device_locations(stmt_stop_with_agency)
\ No newline at end of file
+        return self.get_transactions_with_stop_or_device_locations(stmt_stop_with_agency)
+
+    def get_partition_queries(self, frequency: str | datetime.timedelta = PARTITION_WEEK,
+                              get_query: Callable[['TransactionsWithLocations'], Select] | None = None
+                              ) -> list[tuple[datetime.datetime, datetime.datetime, Select]]:
+        """
+        This function splits [start_date, end_date) into day or week partitions and returns the query restricted
+        to the transactions of each partition.
+        The GTFS feeds are still selected over the whole window, so that the union of the partitions is the same
+        as the result of the unpartitioned query.
+
+        Parameters
+        ----------
+        frequency : str | datetime.timedelta, optional
+            Length of the partitions, 'day', 'week' (default) or a timedelta.
+            See transit_equity.utils.partitions.get_date_partitions
+        get_query : Callable, optional
+            Function of this object that returns the query to partition.
+            Defaults to TransactionsWithLocations.get_transactions_with_stop_or_device_locations_from_latest_gtfs
+
+        Returns
+        -------
+        list[tuple[datetime, datetime, Select]]
+            The start, end and query of each partition, in order
+        """
+        if self.transactions_date_column is None:
+            raise ValueError('transactions_date_column is needed to partition the transactions')
+        if get_query is None:
+            get_query = type(self).get_transactions_with_stop_or_device_locations_from_latest_gtfs
+        stmt_alias = get_query(self).subquery('transactions_window')
+        date_column = stmt_alias.c[self.transactions_date_column]
+
+        return [(partition_start, partition_end,
+                 select(stmt_alias).where(date_column >= partition_start, date_column < partition_end))
+                for partition_start, partition_end in get_date_partitions(self.start_date, self.end_date, frequency)]
+
+    def iter_partition_frames(self, frequency: str | datetime.timedelta = PARTITION_WEEK, max_workers: int = 4,
+                              get_query: Callable[['TransactionsWithLocations'], Select] | None = None
+                              ) -> Iterator[tuple[datetime.datetime, datetime.datetime, pd.DataFrame]]:
+        """
+        This function runs the partition queries of get_partition_queries concurrently and yields their results
+        in partition order, as soon as each one (and the ones before it) is ready.
+        Each query runs on its own pooled connection of the engine, so max_workers must not exceed the pool size
+        (pool_size + max_overflow) of the engine. It also caps the load put on the shared database.
+
+        Parameters
+        ----------
+        frequency : str | datetime.timedelta, optional
+            Length of the partitions, 'day', 'week' (default) or a timedelta
+        max_workers : int, optional
+            Maximum number of partition queries running at the same time. Defaults to 4
+        get_query : Callable, optional
+            See get_partition_queries
+
+        Yields
+        ------
+        tuple[datetime, datetime, pd.DataFrame]
+            The start and end of the partition, and the result of its query
+
+        Example
+        -------
+        Example 1:
+        >>> transactions_with_locations = TransactionsWithLocations(
+        ...     start_date=datetime.datetime(2023, 1, 1),
+        ...     end_date=datetime.datetime(2023, 4, 1),
+        ...     engine=get_pooled_engine(os.getenv('POSTGRES_URL')),
+        ... )
+        >>> for partition_start, partition_end, df in transactions_with_locations.iter_partition_frames('week'):
+        ...     process(df)
+        """
+        def read_partition(partition):
+            partition_start, partition_end, stmt = partition
+            with self.engine.connect() as connection:
+                return partition_start, partition_end, pd.read_sql(stmt, connection)
+
+        yield from iter_ordered(read_partition, self.get_partition_queries(frequency, get_query), max_workers)
+
+    def iter_frames(self, chunk_size: int = 100000,
+                    get_query: Callable[['TransactionsWithLocations'], Select] | None = None,
+                    decode_locations: bool = False) -> Iterator[pd.DataFrame]:
+        """
+        This function runs a query with server-side streaming (stream_results=True) and yields its result
+        in DataFrames of at most chunk_size rows, so that month-scale pulls do not need to fit in memory.
+        The connection stays checked out of the engine pool until the iterator is exhausted or closed.
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            Maximum number of rows in each DataFrame (and in the client-side row buffer). Defaults to 100000
+        get_query : Callable, optional
+            Function of this object that returns the query to run.
+            Defaults to TransactionsWithLocations.get_transactions_with_stop_or_device_locations_from_latest_gtfs
+        decode_locations : bool, optional
+            Whether to yield GeoDataFrames, with the transaction locations (in location_format) decoded into the
+            TRANSACTION_LOCATION_SHAPE_KEY geometry column, in the CRS STOP_CRS. Defaults to False
+
+        Yields
+        ------
+        pd.DataFrame | gpd.GeoDataFrame
+            The next chunk of the result
+
+        Example
+        -------
+        Example 1:
+        >>> for gdf_chunk in transactions_with_locations.iter_frames(chunk_size=500000, decode_locations=True):
+        ...     gdf_counts = get_transaction_counts_per_block_group(
+        ...         gdf_chunk, gdf_block_group_data,
+        ...         transaction_location_column=TransactionsWithLocations.TRANSACTION_LOCATION_SHAPE_KEY,
+        ...         is_transaction_location_shaped=True, transaction_crs=TransactionsWithLocations.STOP_CRS)
+        """
+        if get_query is None:
+            get_query = type(self).get_transactions_with_stop_or_device_locations_from_latest_gtfs
+        stmt = get_query(self)
+
+        with self.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(stmt)
+            columns = list(result.keys())
+            for rows in result.partitions(chunk_size):
+                df = pd.DataFrame(rows, columns=columns)
+                if decode_locations:
+                    df[self.TRANSACTION_LOCATION_SHAPE_KEY] = \
+                        load_location_series(df, self.TRANSACTION_LOCATION_KEY, self.location_format)
+                    df = gpd.GeoDataFrame(df, geometry=self.TRANSACTION_LOCATION_SHAPE_KEY, crs=self.STOP_CRS)
+                yield df
@@ -3,5 +3,8 @@ This module contains utility functions and variables and that are used throughou
 
 Modules
 -------
+artifact_store : Module containing a local store of the external geographic layers, kept as GeoParquet
 db_helpers : Module containing functions to interact with the database
+parquet_cache : Module containing a content-addressed on-disk cache of (Geo)DataFrames
+partitions : Module containing functions to split date windows into partitions and process them concurrently in order
 """
\ No newline at end of file
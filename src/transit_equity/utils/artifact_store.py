@@ -0,0 +1,175 @@
+"""
+This module contains a local store for the external geographic layers used by the analyses (e.g. the census
+block group shapefile and the King County GIS layers), so that they are downloaded at most once.
+
+A source file is downloaded into the store the first time it is needed, unless it is already there or a local
+copy of it is given (e.g. on machines without network access). Each layer is then prepared from its source
+(filtered, reprojected, ...) and stored as GeoParquet together with its SHA-256 checksum. Later loads read the
+GeoParquet file from disk, after checking its checksum, and never touch the source. A store directory can be
+copied as is to another machine to seed it.
+
+Classes
+-------
+ArtifactStore :
+    Class for fetching source files and storing the layers prepared from them
+
+Functions
+---------
+get_file_sha256 :
+    Function to get the SHA-256 checksum of a file
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import urllib.parse
+import urllib.request
+from collections.abc import Callable
+
+import geopandas as gpd
+
+from .parquet_cache import get_cache_key
+
+ARTIFACT_DIR_ENV = 'TRANSIT_EQUITY_ARTIFACT_DIR'
+DEFAULT_ARTIFACT_DIR = os.path.join('~', '.cache', 'transit_equity', 'artifacts')
+SOURCES_DIR_NAME = 'sources'
+LAYERS_DIR_NAME = 'layers'
+
+def get_file_sha256(path: str, block_size: int = 2**20) -> str:
+    '''
+    Returns the hex SHA-256 checksum of a file, read in blocks of block_size bytes
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ArtifactStore:
+    '''
+    Local store of source files and of the GeoParquet layers prepared from them.
+
+    Attributes
+    ----------
+    store_dir : str
+        Directory of the store. Defaults to the TRANSIT_EQUITY_ARTIFACT_DIR environment variable, or
+        ~/.cache/transit_equity/artifacts. It is created if it does not exist.
+
+    Examples
+    --------
+    Example 1:
+    >>> store = ArtifactStore()
+    >>> gdf_block_groups = get_puget_sound_block_group_data(artifact_store=store, crs=32610)
+
+    Example 2:
+    >>> # without network access, with the shapefile copied beforehand
+    >>> store = ArtifactStore('/shared/artifacts')
+    >>> gdf_layer = store.load_layer('wa_block_groups', CENSUS_GROUP_WASHINGTON_LINK,
+    ...                              local_path='/shared/downloads/tl_2022_53_bg.zip')
+    '''
+    def __init__(self, store_dir: str | None = None):
+        if store_dir is None:
+            store_dir = os.getenv(ARTIFACT_DIR_ENV, DEFAULT_ARTIFACT_DIR)
+        self.store_dir = os.path.expanduser(store_dir)
+        os.makedirs(os.path.join(self.store_dir, SOURCES_DIR_NAME), exist_ok=True)
+        os.makedirs(os.path.join(self.store_dir, LAYERS_DIR_NAME), exist_ok=True)
+
+    def get_source_path(self, url: str, sha256: str | None = None, local_path: str | None = None) -> str:
+        '''
+        Returns the path of a source file in the store, downloading it (or copying it from local_path) if needed
+
+        Parameters
+        ----------
+        url : str
+            URL of the source file. Its file name is the name of the source in the store.
+        sha256 : str, optional
+            Expected SHA-256 checksum of the source file. If given, a stored, copied or downloaded file with
+            another checksum raises a ValueError.
+        local_path : str, optional
+            Local copy of the source file, copied into the store instead of downloading it
+
+        Returns
+        -------
+        str
+            Path of the source file in the store
+        '''
+        file_name = os.path.basename(urllib.parse.urlparse(url).path)
+        path = os.path.join(self.store_dir, SOURCES_DIR_NAME, file_name)
+
+        if not os.path.exists(path):
+            file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            os.close(file_descriptor)
+            try:
+                if local_path is not None:
+                    shutil.copyfile(os.path.expanduser(local_path), temp_path)
+                else:
+                    urllib.request.urlretrieve(url, temp_path)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        if sha256 is not None and get_file_sha256(path) != sha256:
+            raise ValueError(f'The checksum of {path} does not match {sha256}. '
+                             'Delete it to fetch the source again.')
+        return path
+
+    def load_layer(self, name: str, url: str, prepare: Callable[[gpd.GeoDataFrame], gpd.GeoDataFrame] | None = None,
+                   params: dict | None = None, sha256: str | None = None, local_path: str | None = None,
+                   refresh: bool = False) -> gpd.GeoDataFrame:
+        '''
+        Returns a layer prepared from a source file, from the store if it was prepared before
+
+        Parameters
+        ----------
+        name : str
+            Name of the layer, e.g. 'wa_block_groups'
+        url : str
+            URL of the source file, read with gpd.read_file. See get_source_path.
+        prepare : Callable, optional
+            Function that prepares the layer from the GeoDataFrame of the source (e.g. filters it and reprojects
+            it). Defaults to None (the source as is).
+        params : dict, optional
+            JSON-serializable parameters of prepare. A layer is stored for each distinct value of (name, url,
+            params), so they must describe everything that changes the output of prepare.
+        sha256, local_path :
+            See get_source_path. Only used when the layer has to be prepared.
+        refresh : bool, optional
+            Whether to prepare the layer again even if it is stored. Defaults to False.
+
+        Returns
+        -------
+        gpd.GeoDataFrame
+            The prepared layer
+        '''
+        key = get_cache_key(name=name, url=url, params=params)
+        path = os.path.join(self.store_dir, LAYERS_DIR_NAME, f'{name}_{key[:16]}.parquet')
+        checksum_path = path + '.json'
+
+        if not refresh and os.path.exists(path) and os.path.exists(checksum_path):
+            with open(checksum_path, encoding='utf-8') as checksum_file:
+                layer_info = json.load(checksum_file)
+            # a layer that does not match its checksum (e.g. a partial copy) is prepared again
+            if get_file_sha256(path) == layer_info['sha256']:
+                return gpd.read_parquet(path)
+
+        source_path = self.get_source_path(url, sha256=sha256, local_path=local_path)
+        gdf_layer = gpd.read_file(source_path)
+        if prepare is not None:
+            gdf_layer = prepare(gdf_layer)
+
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(file_descriptor)
+        try:
+            gdf_layer.to_parquet(temp_path)
+            layer_info = {'name': name, 'url': url, 'params': params, 'sha256': get_file_sha256(temp_path),
+                          'source_sha256': get_file_sha256(source_path)}
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        with open(checksum_path, 'w', encoding='utf-8') as checksum_file:
+            json.dump(layer_info, checksum_file, indent=2)
+
+        return gpd.read_parquet(path)
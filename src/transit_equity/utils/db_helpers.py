@@ -6,13 +6,33 @@ Functions
 get_engine_from_env :
     Function to get a sqlalchemy Engine object using the environment variables
 
+get_pooled_engine :
+    Function to get a pooled sqlalchemy Engine object that is shared by every caller with the same url and settings
+
+dispose_pooled_engines :
+    Function to close the connections of every pooled Engine
+
 get_automap_base_with_views :
     Function to get an AutomapBase object that also provides access to views of a schema
+
+Classes
+-------
+ReflectionRegistry :
+    Class that caches the reflected metadata of each (database, schema) for the whole process
+
+Variables
+---------
+REFLECTION_REGISTRY :
+    A process-wide ReflectionRegistry, to pass as the registry of get_automap_base_with_views and the query helpers
 """
+import hashlib
 import os
+import pickle
+import threading
+from collections.abc import Iterable
 from dotenv import load_dotenv
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, make_url
 from sqlalchemy import MetaData, Engine
 from sqlalchemy.ext.automap import automap_base, AutomapBase
 
@@ -44,8 +64,241 @@ def get_engine_from_env(path_env: str, postgres_url_key: str = 'POSTGRES_URL') -
     engine: Engine = create_engine(os.getenv(postgres_url_key))
     return engine
 
+_POOLED_ENGINES: dict[tuple, Engine] = {}
+_POOLED_ENGINES_LOCK = threading.Lock()
+
+def get_pooled_engine(url: str, pool_size: int = 5, max_overflow: int = 10, pool_pre_ping: bool = True,
+                      pool_recycle: int = 1800, statement_timeout_ms: int | None = None) -> Engine:
+    '''
+    Returns a pooled sqlalchemy Engine object, created on the first call and shared by every later call
+    with the same url and settings, so that loops over queries reuse the pooled connections instead of
+    building a new engine (and connecting again) on every iteration.
+    A process forked after the engine was created (e.g. a ProcessPoolExecutor worker) gets the same engine
+    with a new, empty pool, so it never shares the connections of its parent
+
+    Parameters
+    ----------
+    url : str
+        Database url, e.g. os.getenv('POSTGRES_URL')
+    pool_size : int, optional
+        Number of connections kept open in the pool
+    max_overflow : int, optional
+        Number of connections that can be opened beyond pool_size when the pool is exhausted
+    pool_pre_ping : bool, optional
+        Whether to test each connection when it is checked out, so that connections dropped by the
+            server (e.g. after idling in a notebook) are replaced transparently
+    pool_recycle : int, optional
+        Number of seconds after which a connection is replaced. -1 disables recycling
+    statement_timeout_ms : int, optional
+        PostgreSQL statement_timeout for every connection, in milliseconds. Ignored for other dialects.
+        Defaults to None (the server setting)
+
+    Returns
+    -------
+    Engine
+        A sqlalchemy Engine object that is shared for the process
+
+    Examples
+    --------
+    Example 1:
+    >>> engine = get_pooled_engine(os.getenv('POSTGRES_URL'), statement_timeout_ms=10 * 60 * 1000)
+    >>> engine is get_pooled_engine(os.getenv('POSTGRES_URL'), statement_timeout_ms=10 * 60 * 1000)
+    True
+    '''
+    if url is None:
+        raise ValueError('url must not be None, check that the environment variable is set')
+    key = (url, pool_size, max_overflow, pool_pre_ping, pool_recycle, statement_timeout_ms)
+    with _POOLED_ENGINES_LOCK:
+        engine = _POOLED_ENGINES.get(key)
+        if engine is None:
+            connect_args = {}
+            if statement_timeout_ms is not None and make_url(url).get_backend_name() == 'postgresql':
+                connect_args['options'] = f'-c statement_timeout={int(statement_timeout_ms)}'
+            engine = create_engine(url, pool_size=pool_size, max_overflow=max_overflow,
+                                   pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle,
+                                   connect_args=connect_args)
+            _POOLED_ENGINES[key] = engine
+    return engine
+
+def dispose_pooled_engines() -> None:
+    '''
+    Closes the connections of every Engine returned by get_pooled_engine, and forgets the engines
+    '''
+    with _POOLED_ENGINES_LOCK:
+        for engine in _POOLED_ENGINES.values():
+            engine.dispose()
+        _POOLED_ENGINES.clear()
+
+def _reset_pooled_engines_after_fork() -> None:
+    '''
+    Gives a forked child process (e.g. a ProcessPoolExecutor worker) new pools for the pooled engines it inherits.
+    The parent's connections are dropped without being closed, so that the child never uses the parent's
+    database sockets, and the lock is replaced in case another thread of the parent held it at the fork.
+    '''
+    global _POOLED_ENGINES_LOCK
+    _POOLED_ENGINES_LOCK = threading.Lock()
+    for engine in _POOLED_ENGINES.values():
+        engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pooled_engines_after_fork)
 
-def get_automap_base_with_views(engine: Engine, schema: str) -> AutomapBase:
+
+class ReflectionRegistry:
+    '''
+    Caches the reflected MetaData and AutomapBase of each (database URL, schema) for the whole process,
+    so that query objects built one after the other (or in several threads) reflect each table only once.
+
+    Tables are reflected into one shared MetaData per (database URL, schema) as they are first requested.
+    The registry is thread-safe: each (database URL, schema) has its own lock, so different schemas are
+    reflected concurrently but the same tables are never reflected twice.
+    A registry sent to another process (e.g. as an argument of a ProcessPoolExecutor task) arrives empty,
+    with the same persist_dir and schema_version.
+
+    Attributes
+    ----------
+    persist_dir : str, optional
+        Directory in which to pickle the reflected MetaData, so that later processes can skip reflection.
+        Defaults to None (no persistence).
+    schema_version : str, optional
+        Version of the database schema, stored with the pickled MetaData. A pickle with a different version
+        is ignored and overwritten. Defaults to None, in which case the version is a hash of the table and
+        view names of the schema, so that tables being added or dropped invalidate the pickle.
+        Set it (e.g. to a migration id) if columns can change without tables being added or dropped.
+
+    Examples
+    --------
+    Example 1:
+    >>> REFLECTION_REGISTRY.persist_dir = os.path.expanduser('~/.cache/transit_equity/reflection')
+    >>> Base = get_automap_base_with_views(engine=engine, schema='gtfs', only=['gtfs.tl_stops'],
+    ...                                    registry=REFLECTION_REGISTRY)
+    '''
+    def __init__(self, persist_dir: str | None = None, schema_version: str | None = None):
+        self.persist_dir = persist_dir
+        self.schema_version = schema_version
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], dict] = {}
+
+    def __getstate__(self) -> dict:
+        # locks cannot be pickled, and the reflected tables are bound to this process
+        return {'persist_dir': self.persist_dir, 'schema_version': self.schema_version}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    def clear(self) -> None:
+        '''
+        Forgets every reflected schema, e.g. after the database schema changed. Pickles are kept.
+        '''
+        with self._lock:
+            self._entries.clear()
+
+    def get_metadata(self, engine: Engine, schema: str, only: Iterable[str] | None = None) -> MetaData:
+        '''
+        Returns the shared MetaData of a schema, with at least the requested tables reflected
+
+        Parameters
+        ----------
+        engine : sqlalchemy.Engine
+            Engine that is already connected to a database
+        schema : str
+            Name of the schema
+        only : Iterable[str], optional
+            Bare or schema-qualified names of the tables and views needed. Defaults to None, which
+            reflects every table and view of the schema.
+
+        Returns
+        -------
+        MetaData
+            The MetaData shared by every caller for this database and schema
+        '''
+        return self._get_reflected_entry(engine, schema, only)['metadata']
+
+    def get_automap_base(self, engine: Engine, schema: str, only: Iterable[str] | None = None) -> AutomapBase:
+        '''
+        Returns an AutomapBase of the shared MetaData of a schema, with at least the requested tables reflected
+
+        The AutomapBase is rebuilt only when tables were added to the MetaData since it was last prepared.
+        Parameters are as in get_metadata.
+        '''
+        entry = self._get_reflected_entry(engine, schema, only)
+        with entry['lock']:
+            if entry['base'] is None or entry['base_table_count'] != len(entry['metadata'].tables):
+                Base: AutomapBase = automap_base(metadata=entry['metadata'])
+                Base.prepare()
+                entry['base'] = Base
+                entry['base_table_count'] = len(entry['metadata'].tables)
+            return entry['base']
+
+    def _get_reflected_entry(self, engine: Engine, schema: str, only: Iterable[str] | None) -> dict:
+        key = (engine.url.render_as_string(hide_password=True), schema)
+        with self._lock:
+            entry = self._entries.setdefault(key, {'lock': threading.RLock(), 'metadata': None,
+                                                   'reflected_all': False, 'base': None, 'base_table_count': 0})
+        with entry['lock']:
+            if entry['metadata'] is None:
+                entry['metadata'], entry['reflected_all'] = self._load(engine, key)
+
+            if entry['reflected_all']:
+                return entry
+            if only is None:
+                entry['metadata'].reflect(bind=engine, views=True, schema=schema)
+                entry['reflected_all'] = True
+            else:
+                schema_prefix = f'{schema}.'
+                names = [name.removeprefix(schema_prefix) for name in only]
+                missing = [name for name in names if f'{schema_prefix}{name}' not in entry['metadata'].tables]
+                if not missing:
+                    return entry
+                entry['metadata'].reflect(bind=engine, views=True, schema=schema, only=missing)
+            self._persist(engine, key, entry)
+        return entry
+
+    def _get_pickle_path(self, key: tuple[str, str]) -> str:
+        digest = hashlib.sha256('\n'.join(key).encode('utf-8')).hexdigest()[:32]
+        return os.path.join(os.path.expanduser(self.persist_dir), f'metadata_{digest}.pickle')
+
+    def _get_schema_version(self, engine: Engine, schema: str) -> str:
+        if self.schema_version is not None:
+            return self.schema_version
+        inspector = inspect(engine)
+        names = sorted(inspector.get_table_names(schema=schema)) + sorted(inspector.get_view_names(schema=schema))
+        try:
+            names += sorted(inspector.get_materialized_view_names(schema=schema))
+        except NotImplementedError:
+            # only some dialects (e.g. PostgreSQL) have materialized views
+            pass
+        return hashlib.sha256('\n'.join(names).encode('utf-8')).hexdigest()
+
+    def _load(self, engine: Engine, key: tuple[str, str]) -> tuple[MetaData, bool]:
+        if self.persist_dir is None:
+            return MetaData(), False
+        try:
+            with open(self._get_pickle_path(key), 'rb') as file:
+                persisted = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return MetaData(), False
+        if persisted.get('schema_version') != self._get_schema_version(engine, key[1]):
+            return MetaData(), False
+        return persisted['metadata'], persisted['reflected_all']
+
+    def _persist(self, engine: Engine, key: tuple[str, str], entry: dict) -> None:
+        if self.persist_dir is None:
+            return
+        path = self._get_pickle_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        persisted = {'schema_version': self._get_schema_version(engine, key[1]),
+                     'metadata': entry['metadata'], 'reflected_all': entry['reflected_all']}
+        # write to a temporary file first so that concurrent processes never read a partial pickle
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as file:
+            pickle.dump(persisted, file)
+        os.replace(temp_path, path)
+
+REFLECTION_REGISTRY = ReflectionRegistry()
+
+def get_automap_base_with_views(engine: Engine, schema: str, only: Iterable[str] | None = None,
+                                registry: ReflectionRegistry | None = None) -> AutomapBase:
     '''
     Returns an AutomapBase object that also provides access to views of a schema
 
@@ -55,6 +308,16 @@ def get_automap_base_with_views(engine: Engine, schema: str) -> AutomapBase:
         Engine that is already connected to a database
     schema : str
         Name of schema in the database for which we want to get an AutomapBase object
+    only : Iterable[str], optional
+        Names of the tables and views to reflect, either bare ('transactions') or schema-qualified
+        ('orca.transactions', as in the *_SCHEMA_TABLES constants). Tables referenced by their
+        foreign keys are reflected as well. Reflecting a whole schema issues several catalog
+        queries per table, so pass the tables a query needs to keep this fast.
+        Defaults to None, which reflects every table and view of the schema.
+    registry : ReflectionRegistry, optional
+        Registry that caches the reflected tables, e.g. REFLECTION_REGISTRY, so that a table is reflected
+        only once however many query objects use it. The tables of a registry are shared by all its callers.
+        Defaults to None, which reflects the tables into a new MetaData on every call.
 
     Returns
     -------
@@ -74,9 +337,20 @@ def get_automap_base_with_views(engine: Engine, schema: str) -> AutomapBase:
     >>> Base = get_automap_base_with_views(engine=get_engine_from_env('.env'), schema='orca')
     >>> print(type(Base))
     <class 'sqlalchemy.ext.automap.AutomapBase'>
+
+    Example 3:
+    >>> Base = get_automap_base_with_views(engine=engine, schema='gtfs', only=['gtfs.tl_stops'],
+    ...                                    registry=REFLECTION_REGISTRY)
+    >>> 'gtfs.tl_stops' in Base.metadata.tables
+    True
     '''
+    if registry is not None:
+        return registry.get_automap_base(engine, schema, only)
+    if only is not None:
+        schema_prefix = f'{schema}.'
+        only = [name.removeprefix(schema_prefix) for name in only]
     metadata = MetaData()
-    metadata.reflect(bind=engine, views=True, schema=schema)
+    metadata.reflect(bind=engine, views=True, schema=schema, only=only)
     Base: AutomapBase = automap_base(metadata=metadata)
     Base.prepare()
     return Base
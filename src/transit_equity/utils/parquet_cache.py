@@ -0,0 +1,207 @@
+"""
+This module contains a content-addressed on-disk cache for (Geo)DataFrames stored as (Geo)Parquet.
+
+An entry is addressed by the SHA-256 hash of the parameters that produced it (e.g. the query SQL,
+the schema and table names and the cleaning parameters), so changing any parameter reads and
+writes a different entry. Entries are evicted least recently used first once the cache directory
+exceeds its size bound.
+
+Classes
+-------
+ParquetCache :
+    Class for storing and loading (Geo)DataFrames in a size-bounded cache directory
+
+Functions
+---------
+get_cache_key :
+    Function to get the content-addressed key of a set of parameters
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+import geopandas as gpd
+
+PARQUET_CACHE_SUFFIX = '.parquet'
+
+def get_cache_key(**params) -> str:
+    '''
+    Returns the content-addressed key of a set of parameters
+
+    Parameters
+    ----------
+    **params
+        JSON-serializable parameters (non-serializable values are converted with str).
+        The order of the parameters does not matter.
+
+    Returns
+    -------
+    str
+        Hex SHA-256 digest of the parameters
+
+    Examples
+    --------
+    Example 1:
+    >>> get_cache_key(user_type=1, table='trips') == get_cache_key(table='trips', user_type=1)
+    True
+    '''
+    serialized = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+class ParquetCache:
+    '''
+    Content-addressed cache of (Geo)DataFrames stored as (Geo)Parquet files in a directory.
+
+    GeoDataFrames are written as GeoParquet, so every geometry column and its CRS are restored
+    on load. The modification time of an entry is bumped whenever it is loaded, and the least
+    recently used entries are deleted when the total size of the cache exceeds max_bytes.
+
+    Attributes
+    ----------
+    cache_dir : str
+        Directory holding the cache entries. It is created if it does not exist.
+    max_bytes : int, optional
+        Maximum total size of the cache entries in bytes. None means unbounded.
+
+    Examples
+    --------
+    Example 1:
+    >>> cache = ParquetCache('~/.cache/transit_equity/trips', max_bytes=20 * 2**30)
+    >>> key = get_cache_key(sql=str(query), user_type=1)
+    >>> gdf = cache.load(key)
+    >>> if gdf is None:
+    ...     gdf = run_query_and_clean()
+    ...     cache.save(key, gdf)
+    '''
+    def __init__(self, cache_dir: str, max_bytes: int | None = None):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_path(self, key: str) -> str:
+        '''
+        Returns the path of the cache entry for a key, whether it exists or not
+        '''
+        return os.path.join(self.cache_dir, key + PARQUET_CACHE_SUFFIX)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.get_path(key))
+
+    def load(self, key: str, columns: list[str] | None = None) -> pd.DataFrame | None:
+        '''
+        Returns the cached (Geo)DataFrame for a key, or None if there is no entry for it
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry, e.g. from get_cache_key
+        columns : list[str], optional
+            Columns to read. Only these columns are read from disk. Defaults to all columns.
+
+        Returns
+        -------
+        pd.DataFrame | None
+            A GeoDataFrame if a GeoDataFrame was saved, else a DataFrame
+        '''
+        path = self.get_path(key)
+        try:
+            # Mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        try:
+            return gpd.read_parquet(path, columns=columns)
+        except ValueError:
+            # Plain DataFrames have no GeoParquet metadata
+            return pd.read_parquet(path, columns=columns)
+
+    def save(self, key: str, df: pd.DataFrame) -> str:
+        '''
+        Saves a (Geo)DataFrame under a key, then evicts entries if the cache is over max_bytes
+
+        The file is written to a temporary path and then renamed, so a concurrent or interrupted
+        call never leaves a partial entry behind.
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry, e.g. from get_cache_key
+        df : pd.DataFrame
+            The (Geo)DataFrame to save. Its index is not saved.
+
+        Returns
+        -------
+        str
+            Path of the cache entry
+        '''
+        path = self.get_path(key)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(file_descriptor)
+        try:
+            df.to_parquet(temp_path, index=False)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self.evict()
+        return path
+
+    def invalidate(self, key: str | None = None) -> None:
+        '''
+        Deletes the entry for a key, or every entry if key is None
+        '''
+        keys = [key] if key is not None else [entry_key for entry_key, _, _ in self._get_entries()]
+        for entry_key in keys:
+            try:
+                os.remove(self.get_path(entry_key))
+            except FileNotFoundError:
+                pass
+
+    def get_size(self) -> int:
+        '''
+        Returns the total size of the cache entries in bytes
+        '''
+        return sum(size for _, size, _ in self._get_entries())
+
+    def evict(self) -> list[str]:
+        '''
+        Deletes the least recently used entries until the cache is within max_bytes
+
+        The most recently used entry is always kept, even if it alone is larger than max_bytes.
+
+        Returns
+        -------
+        list[str]
+            Keys of the deleted entries
+        '''
+        if self.max_bytes is None:
+            return []
+
+        # now sort by last use, most recent first
+        entries = sorted(self._get_entries(), key=lambda entry: entry[2], reverse=True)
+        total_size = sum(size for _, size, _ in entries)
+        evicted_keys = []
+        while total_size > self.max_bytes and len(entries) > 1:
+            key, size, _ = entries.pop()
+            self.invalidate(key)
+            evicted_keys.append(key)
+            total_size -= size
+        return evicted_keys
+
+    def _get_entries(self) -> list[tuple[str, int, int]]:
+        entries = []
+        with os.scandir(self.cache_dir) as scan:
+            for entry in scan:
+                if not entry.name.endswith(PARQUET_CACHE_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.name[:-len(PARQUET_CACHE_SUFFIX)], stat.st_size,
+                                stat.st_mtime_ns))
+        return entries
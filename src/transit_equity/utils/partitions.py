@@ -0,0 +1,106 @@
+"""
+This module contains helper functions to split a date window into partitions and to process the partitions
+concurrently while keeping their order.
+
+Functions
+---------
+get_date_partitions :
+    Function to split a date window into consecutive day or week partitions
+
+iter_ordered :
+    Function to apply a function to items with a bounded pool of threads, yielding the results in order
+"""
+import datetime
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+PARTITION_DAY = 'day'
+PARTITION_WEEK = 'week'
+PARTITION_FREQUENCIES = {PARTITION_DAY: datetime.timedelta(days=1), PARTITION_WEEK: datetime.timedelta(weeks=1)}
+
+def get_date_partitions(start_date: datetime.datetime, end_date: datetime.datetime,
+                        frequency: str | datetime.timedelta = PARTITION_WEEK) -> list[tuple[datetime.datetime, datetime.datetime]]:
+    '''
+    Returns consecutive half-open partitions [partition_start, partition_end) covering [start_date, end_date)
+
+    Parameters
+    ----------
+    start_date : datetime
+        Start of the window (inclusive)
+    end_date : datetime
+        End of the window (exclusive)
+    frequency : str | datetime.timedelta, optional
+        Length of the partitions, one of PARTITION_FREQUENCIES ('day', 'week') or a timedelta.
+        The last partition is cut short at end_date
+
+    Returns
+    -------
+    list[tuple[datetime, datetime]]
+        The start and end of each partition, in order
+
+    Examples
+    --------
+    Example 1:
+    >>> get_date_partitions(datetime.datetime(2023, 4, 1), datetime.datetime(2023, 4, 10), 'week')
+    [(datetime.datetime(2023, 4, 1, 0, 0), datetime.datetime(2023, 4, 8, 0, 0)),
+     (datetime.datetime(2023, 4, 8, 0, 0), datetime.datetime(2023, 4, 10, 0, 0))]
+    '''
+    if isinstance(frequency, str):
+        if frequency not in PARTITION_FREQUENCIES:
+            raise ValueError(f'frequency must be one of {tuple(PARTITION_FREQUENCIES)} or a timedelta, got {frequency!r}')
+        frequency = PARTITION_FREQUENCIES[frequency]
+    if frequency <= datetime.timedelta(0):
+        raise ValueError('frequency must be positive')
+
+    partitions = []
+    partition_start = start_date
+    while partition_start < end_date:
+        partition_end = min(partition_start + frequency, end_date)
+        partitions.append((partition_start, partition_end))
+        partition_start = partition_end
+    return partitions
+
+def iter_ordered(function: Callable, items: Iterable, max_workers: int = 4) -> Iterator:
+    '''
+    Applies function to each item with at most max_workers threads, and yields the results in the order of items
+
+    At most max_workers calls are in flight at any time, and a new item is only submitted when the oldest
+    result is taken, so the memory held by finished but not yet consumed results stays bounded
+    (and a shared database sees at most max_workers concurrent queries).
+
+    Parameters
+    ----------
+    function : Callable
+        Function of one item, e.g. one that runs the query of a partition
+    items : Iterable
+        Items to process
+    max_workers : int, optional
+        Maximum number of concurrent calls to function
+
+    Yields
+    ------
+    The result of function for each item, in order. An exception raised by function is re-raised when its
+    result is reached, after which the pending calls are cancelled.
+    '''
+    if max_workers < 1:
+        raise ValueError('max_workers must be at least 1')
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(function, item))
+                if len(pending) >= max_workers:
+                    break
+            while pending:
+                result = pending.popleft().result()
+                # now refill the pool before handing the result over
+                for item in items:
+                    pending.append(executor.submit(function, item))
+                    break
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
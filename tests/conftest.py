@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+
+def _make_trips_df(n_trips=500, n_stops=20, seed=0):
+    # raw trips as pulled from the orca_ng database, with EWKB hex stop locations
+    rng = np.random.default_rng(seed)
+    stops = shapely.set_srid(shapely.points(rng.uniform(540000, 560000, n_stops),
+                                            rng.uniform(5200000, 5300000, n_stops)), 32610)
+    stop_locations = shapely.to_wkb(stops, hex=True, include_srid=True)
+    board_dtm = pd.Timestamp('2023-04-01') + pd.to_timedelta(rng.integers(0, 30 * 24 * 60, n_trips), unit='min')
+    return pd.DataFrame({
+        'card_id': rng.integers(0, n_trips // 4, n_trips),
+        'txn_id': np.arange(n_trips),
+        'txn_id_1': np.arange(n_trips) + n_trips,
+        'device_dtm_pacific': board_dtm,
+        'alight_dtm_pacific': board_dtm + pd.to_timedelta(rng.integers(1, 240, n_trips), unit='min'),
+        'stop_location': stop_locations[rng.integers(0, n_stops, n_trips)],
+        'stop_location_1': stop_locations[rng.integers(0, n_stops, n_trips)],
+    })
+
+
+@pytest.fixture
+def make_trips_df():
+    # the builder itself, so that tests can pick the size and seed
+    return _make_trips_df
@@ -0,0 +1,92 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+from transit_equity.networks.centrality import (degree_centrality, eigenvector_centrality, get_centrality_table,
+                                                in_degree_centrality, out_degree_centrality, pagerank)
+
+
+def make_cycle_graph():
+    # a weighted cycle with a chord, a self-loop and an isolated node
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(5))
+    graph.add_weighted_edges_from([(0, 1, 2.0), (1, 2, 1.0), (2, 3, 5.0), (3, 0, 1.0), (0, 2, 3.0), (2, 2, 4.0)])
+    return graph
+
+
+def make_star_graph():
+    # every edge goes into the hub, which has no outgoing edge, plus a node with only a self-loop
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(7))
+    graph.add_weighted_edges_from([(leaf, 0, float(leaf)) for leaf in range(1, 5)] + [(5, 5, 2.0)])
+    return graph
+
+
+def make_random_graph(seed):
+    rng = np.random.default_rng(seed)
+    graph = nx.gnp_random_graph(12, 0.25, seed=seed, directed=True)
+    graph.add_edges_from((node, node) for node in rng.choice(12, 3, replace=False))
+    graph.add_nodes_from([12, 13])
+    for board, alight in graph.edges:
+        graph.edges[board, alight]['weight'] = float(rng.integers(1, 20))
+    return graph
+
+
+GRAPHS = {
+    'cycle': make_cycle_graph,
+    'star': make_star_graph,
+    'random_0': lambda: make_random_graph(0),
+    'random_1': lambda: make_random_graph(1),
+}
+
+
+def get_adjacency(graph, weight='weight'):
+    return nx.to_scipy_sparse_array(graph, nodelist=sorted(graph.nodes), weight=weight, format='csr')
+
+
+def to_array(centrality, graph):
+    return np.array([centrality[node] for node in sorted(graph.nodes)])
+
+
+@pytest.fixture(params=list(GRAPHS))
+def graph(request):
+    return GRAPHS[request.param]()
+
+
+def test_degree_centrality_matches_networkx(graph):
+    adjacency = get_adjacency(graph)
+    np.testing.assert_allclose(degree_centrality(adjacency), to_array(nx.degree_centrality(graph), graph))
+    np.testing.assert_allclose(in_degree_centrality(adjacency), to_array(nx.in_degree_centrality(graph), graph))
+    np.testing.assert_allclose(out_degree_centrality(adjacency), to_array(nx.out_degree_centrality(graph), graph))
+
+
+@pytest.mark.parametrize('weight', [None, 'weight'])
+def test_eigenvector_centrality_matches_networkx(graph, weight):
+    expected = nx.eigenvector_centrality(graph, max_iter=1000, tol=1.0e-6, weight=weight)
+    np.testing.assert_allclose(eigenvector_centrality(get_adjacency(graph, weight)), to_array(expected, graph),
+                               atol=1e-12)
+
+
+def test_pagerank_matches_networkx(graph):
+    expected = nx.pagerank(graph, max_iter=1000, tol=1.0e-6, weight='weight')
+    np.testing.assert_allclose(pagerank(get_adjacency(graph)), to_array(expected, graph), atol=1e-12)
+
+
+def test_centrality_table_matches_networkx(graph):
+    # an edge list has no isolated nodes
+    graph = graph.subgraph([node for node in graph.nodes if graph.degree(node) > 0]).copy()
+    edge_list = pd.DataFrame([(board, alight, data['weight']) for board, alight, data in graph.edges(data=True)],
+                             columns=['board_id', 'alight_id', 'weight'])
+    centrality_table = get_centrality_table(edge_list)
+
+    expected = pd.DataFrame({
+        'degree_centrality': nx.degree_centrality(graph),
+        'in_degree_centrality': nx.in_degree_centrality(graph),
+        'out_degree_centrality': nx.out_degree_centrality(graph),
+        'weighted_degree': dict(graph.degree(weight='weight')),
+        'eigenvector_centrality': nx.eigenvector_centrality(graph, max_iter=1000, weight=None),
+        'weighted_eigenvector_centrality': nx.eigenvector_centrality(graph, max_iter=1000, weight='weight'),
+        'pagerank': nx.pagerank(graph, max_iter=1000, weight='weight'),
+    }).loc[centrality_table.index]
+    pd.testing.assert_frame_equal(centrality_table, expected, check_names=False, atol=1e-12)
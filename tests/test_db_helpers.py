@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from transit_equity.utils import db_helpers
+from transit_equity.utils.db_helpers import (ReflectionRegistry, dispose_pooled_engines, get_automap_base_with_views,
+                                            get_pooled_engine)
+
+def count_inherited_connections(url):
+    # runs in a forked worker, with the pooled engine created by the parent
+    engine = get_pooled_engine(url)
+    n_checked_in = engine.pool.checkedin()
+    with engine.connect() as connection:
+        connection.exec_driver_sql('SELECT 1')
+    return n_checked_in
+
+
+@pytest.fixture
+def pooled_url(tmp_path):
+    url = f'sqlite:///{tmp_path / "pooled.db"}'
+    engine = get_pooled_engine(url)
+    with engine.connect() as connection:
+        connection.exec_driver_sql('SELECT 1')
+    # the parent keeps its connection in the pool
+    assert engine.pool.checkedin() == 1
+    yield url
+    dispose_pooled_engines()
+
+
+@pytest.mark.skipif(not hasattr(os, 'register_at_fork'), reason='needs fork')
+def test_forked_worker_does_not_share_pooled_connections(pooled_url):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+        assert executor.submit(count_inherited_connections, pooled_url).result(timeout=60) == 0
+    assert get_pooled_engine(pooled_url).pool.checkedin() == 1
+
+
+@pytest.mark.skipif(not hasattr(os, 'register_at_fork'), reason='needs fork')
+def test_forked_process_does_not_inherit_held_lock(pooled_url):
+    context = multiprocessing.get_context('fork')
+    # forked while the lock is held, as when another thread of the parent is getting an engine
+    with db_helpers._POOLED_ENGINES_LOCK:
+        process = context.Process(target=get_pooled_engine, args=(pooled_url,))
+        process.start()
+    process.join(timeout=60)
+    if process.is_alive():
+        process.kill()
+    assert process.exitcode == 0
+
+
+def test_reflection_registry_is_opt_in(pooled_url, tmp_path):
+    engine = get_pooled_engine(pooled_url)
+    with engine.begin() as connection:
+        connection.exec_driver_sql('CREATE TABLE stops (stop_id INTEGER PRIMARY KEY)')
+
+    # without a registry, every call reflects into its own MetaData
+    assert get_automap_base_with_views(engine, 'main').metadata is not \
+        get_automap_base_with_views(engine, 'main').metadata
+
+    registry = ReflectionRegistry(persist_dir=str(tmp_path / 'reflection'))
+    Base = get_automap_base_with_views(engine, 'main', only=['stops'], registry=registry)
+    assert get_automap_base_with_views(engine, 'main', only=['main.stops'], registry=registry) is Base
+    assert 'main.stops' in Base.metadata.tables
+
+    # a pickled registry (e.g. sent to a worker process) keeps its settings and starts empty
+    unpickled_registry = pickle.loads(pickle.dumps(registry))
+    assert unpickled_registry.persist_dir == registry.persist_dir
+    assert unpickled_registry.get_metadata(engine, 'main', only=['stops']) is not Base.metadata
@@ -0,0 +1,53 @@
+import numpy as np
+import geopandas as gpd
+import pytest
+import shapely
+
+from transit_equity.geospatial.hexgrid import HEXGRID_ORIENTATIONS, HexGrid, check_hexgrid_parity
+
+# hexagons of a 400 m wide grid, with a cell centered away from (0, 0)
+SIZE = 400 / np.sqrt(3)
+ORIGIN_X, ORIGIN_Y = 551234.5, 5251789.25
+
+
+def make_hex_gdf(source_grid, radius=6, seed=0):
+    # a block of cells, shuffled so that the first polygon is not the cell (0, 0)
+    q, r = np.meshgrid(np.arange(-radius, radius + 1), np.arange(-radius, radius + 1))
+    order = np.random.default_rng(seed).permutation(q.size)
+    polygons = source_grid.get_polygons(q.ravel()[order], r.ravel()[order])
+    return gpd.GeoDataFrame(geometry=polygons, crs=source_grid.crs)
+
+
+def make_points(hex_gdf, seed=0):
+    # random points, points just inside the vertices of every cell, and just inside and outside its edges
+    rng = np.random.default_rng(seed)
+    min_x, min_y, max_x, max_y = hex_gdf.total_bounds
+    random_points = shapely.points(rng.uniform(min_x, max_x, 2000), rng.uniform(min_y, max_y, 2000))
+
+    centers = shapely.get_coordinates(hex_gdf.geometry.centroid)
+    vertices = shapely.get_coordinates(hex_gdf.geometry.exterior).reshape(len(hex_gdf), 7, 2)[:, :6]
+    edge_midpoints = (vertices + np.roll(vertices, -1, axis=1)) / 2
+    # (just outside a vertex is on the edge between two other cells, which either may get)
+    near_edge_points = [shapely.points(centers[:, None] + scale * (targets - centers[:, None])).ravel()
+                        for targets, scale in ((vertices, 0.9999), (edge_midpoints, 0.9999), (edge_midpoints, 1.0001))]
+    return gpd.GeoSeries(np.concatenate([random_points, *near_edge_points]), crs=hex_gdf.crs)
+
+
+@pytest.mark.parametrize('orientation', HEXGRID_ORIENTATIONS)
+@pytest.mark.parametrize('reverse_rings', [False, True])
+def test_from_polygons_matches_polygon_join(orientation, reverse_rings):
+    source_grid = HexGrid(SIZE, ORIGIN_X, ORIGIN_Y, orientation)
+    hex_gdf = make_hex_gdf(source_grid)
+    if reverse_rings:
+        # clockwise rings, as some producers of hex grids write them
+        hex_gdf = hex_gdf.set_geometry(shapely.reverse(hex_gdf.geometry.to_numpy()))
+
+    hex_grid = HexGrid.from_polygons(hex_gdf)
+    assert hex_grid.orientation == orientation
+    assert hex_grid.size == pytest.approx(SIZE)
+
+    parity = check_hexgrid_parity(hex_grid, hex_gdf, make_points(hex_gdf))
+    # the points outside the block of cells (random ones, and outside its border) are not compared
+    assert parity['n_in_polygons'] > 0.75 * parity['n_points']
+    assert parity['n_matching'] == parity['n_in_polygons']
+    assert parity['max_center_distance'] < 1e-6
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from transit_equity.networks.network_prep import (TripChunkAggregator, TripKeySet, clean_and_filter_network_data,
+                                                  trip_frequency_filter)
+
+
+def test_trip_key_set_is_exact_on_hash_collisions(monkeypatch):
+    # every key gets the same hash, so only the key values can tell them apart
+    monkeypatch.setattr(pd.util, 'hash_pandas_object',
+                        lambda df, index=False: pd.Series(np.zeros(len(df), dtype=np.uint64)))
+    seen_trip_keys = TripKeySet()
+    chunks = [
+        (pd.DataFrame({'card_id': [1, 2, 2], 'stop': ['a', 'b', 'b']}), [True, True, False]),
+        (pd.DataFrame({'card_id': [3, 1, 2, np.nan], 'stop': ['c', 'a', 'b', None]}), [True, False, False, True]),
+        (pd.DataFrame({'card_id': [np.nan, 3, 4], 'stop': [None, 'c', 'd']}), [False, False, True]),
+    ]
+    for trips, expected in chunks:
+        assert seen_trip_keys.add_new(trips).tolist() == expected
+    assert len(seen_trip_keys) == 5
+
+
+@pytest.mark.parametrize('chunk_size', [100, 777, 5800])
+def test_chunked_cleaning_matches_whole_table(chunk_size, make_trips_df):
+    trips_df = make_trips_df(n_trips=6000, n_stops=50, seed=3)
+    # duplicate some trips, spread over the chunks
+    trips_df = pd.concat([trips_df, trips_df.iloc[:300]], ignore_index=True).sample(frac=1, random_state=1)
+    gdf_whole = clean_and_filter_network_data(trips_df)
+
+    aggregator = TripChunkAggregator()
+    chunks = [aggregator.add_chunk(trips_df.iloc[start:start + chunk_size])
+              for start in range(0, len(trips_df), chunk_size)]
+    gdf_chunked = aggregator.add_trip_frequency(pd.concat(chunks, ignore_index=True))
+
+    # location ids depend on the order locations are seen in, so compare the locations themselves
+    columns = ['card_id', 'board_location', 'alight_location', 'trip_time_minutes', 'board_dtm_pacific',
+               'trip_frequency']
+    pd.testing.assert_frame_equal(gdf_chunked[columns], gdf_whole[columns].reset_index(drop=True))
+
+
+def test_location_strings_are_kept_by_default(make_trips_df):
+    trips_df = make_trips_df(n_trips=500, n_stops=20, seed=4)
+    gdf_trips = clean_and_filter_network_data(trips_df)
+    assert (gdf_trips['board_string'] == gdf_trips['board_location'].astype('string')).all()
+    assert (gdf_trips['alight_string'] == gdf_trips['alight_location'].astype('string')).all()
+    assert 'board_string' not in clean_and_filter_network_data(trips_df, include_location_strings=False)
+
+
+def test_trips_without_location_ids_raise(make_trips_df):
+    gdf_trips = clean_and_filter_network_data(make_trips_df(n_trips=500, n_stops=20, seed=4))
+    # trips cleaned before the location ids were added
+    with pytest.raises(ValueError, match='clean_and_filter_network_data'):
+        trip_frequency_filter(gdf_trips.drop(columns=['board_id', 'alight_id', 'od_key']))
@@ -0,0 +1,53 @@
+import numpy as np
+import geopandas as gpd
+import pytest
+import shapely
+
+from transit_equity.geospatial.format_conversions import factorize_points
+from transit_equity.geospatial.polygon_index import NO_POLYGON, PolygonIndex
+from transit_equity.utils.parquet_cache import ParquetCache
+
+
+def make_points():
+    return np.array([shapely.Point(550500, 5250500), shapely.Point(), None, shapely.Point(549000, 5250500),
+                     shapely.Point(551500, 5250500), shapely.Point(550500, 5250500)], dtype=object)
+
+
+def test_factorize_points_skips_missing_and_empty_points():
+    codes, unique_x, unique_y = factorize_points(make_points())
+    assert codes.tolist() == [0, -1, -1, 1, 2, 0]
+    assert unique_x.tolist() == [550500, 549000, 551500]
+    assert unique_y.tolist() == [5250500] * 3
+
+
+def test_assign_missing_and_empty_points():
+    polygons = gpd.GeoDataFrame(geometry=[shapely.box(550000 + 1000 * i, 5250000, 551000 + 1000 * i, 5251000)
+                                          for i in range(2)], crs=32610)
+    points = gpd.GeoSeries(make_points(), crs=32610)
+    expected = [0, NO_POLYGON, NO_POLYGON, NO_POLYGON, 1, 0]
+    assert PolygonIndex(polygons).assign(points).tolist() == expected
+    # reprojected points take the same path
+    assert PolygonIndex(polygons).assign(points.to_crs(4326)).tolist() == expected
+
+
+def test_lookup_is_saved_once(tmp_path, monkeypatch):
+    polygons = gpd.GeoDataFrame(geometry=[shapely.box(550000 + 1000 * i, 5250000, 551000 + 1000 * i, 5251000)
+                                          for i in range(2)], crs=32610)
+    cache = ParquetCache(str(tmp_path))
+    saved_keys = []
+    monkeypatch.setattr(cache, 'save', lambda key, df, save=cache.save: saved_keys.append(key) or save(key, df))
+
+    polygon_index = PolygonIndex(polygons, lookup_cache=cache, lookup_name='stops')
+    points = gpd.GeoSeries(make_points(), crs=32610)
+    for chunk in (points[:3], points[3:], points):
+        polygon_index.assign(chunk)
+    assert saved_keys == []
+    assert polygon_index.save_lookup()
+    assert not polygon_index.save_lookup()
+    assert saved_keys == [polygon_index.get_lookup_key()]
+
+    # a new index reads the saved lookup and queries nothing
+    polygon_index = PolygonIndex(polygons, lookup_cache=cache, lookup_name='stops')
+    monkeypatch.setattr(polygon_index, '_query', lambda geometries: pytest.fail('queried a saved point'))
+    assert polygon_index.assign(points).tolist() == [0, NO_POLYGON, NO_POLYGON, NO_POLYGON, 1, 0]
+    assert not polygon_index.save_lookup()
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from transit_equity.io.stages import STAGE_TRIPS, read_stage, write_stage
+from transit_equity.networks.network_prep import clean_and_filter_network_data
+
+
+def test_trips_stage_round_trip(tmp_path, make_trips_df):
+    gdf_trips = clean_and_filter_network_data(make_trips_df())
+    path = str(tmp_path / 'trips.parquet')
+    write_stage(gdf_trips, path, STAGE_TRIPS, row_group_size=50)
+
+    gdf_read = read_stage(path, STAGE_TRIPS)
+    expected = gdf_trips.sort_values('board_dtm_pacific', kind='stable').reset_index(drop=True)
+    # the stage writes its required columns first, so only the column order differs
+    assert sorted(gdf_read.columns) == sorted(expected.columns)
+    assert gdf_read.crs == expected.crs
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(gdf_read.drop(columns=['board_location_shapely', 'alight_location_shapely'])),
+        pd.DataFrame(expected[gdf_read.columns].drop(columns=['board_location_shapely', 'alight_location_shapely'])),
+        check_dtype=False)
+    for column in ['board_location_shapely', 'alight_location_shapely']:
+        assert gdf_read[column].geom_equals(expected[column]).all()
+
+
+def test_trips_stage_date_filter(tmp_path, make_trips_df):
+    gdf_trips = clean_and_filter_network_data(make_trips_df())
+    path = str(tmp_path / 'trips.parquet')
+    write_stage(gdf_trips, path, STAGE_TRIPS, row_group_size=50)
+
+    start_date, end_date = pd.Timestamp('2023-04-10'), pd.Timestamp('2023-04-20')
+    gdf_read = read_stage(path, STAGE_TRIPS, start_date=start_date, end_date=end_date)
+    is_in_window = (gdf_trips['board_dtm_pacific'] >= start_date) & (gdf_trips['board_dtm_pacific'] < end_date)
+    assert len(gdf_read) == is_in_window.sum() > 0
+    assert gdf_read['board_dtm_pacific'].between(start_date, end_date, inclusive='left').all()
+
+
+def test_read_stage_without_date_column(tmp_path, make_trips_df):
+    gdf_trips = clean_and_filter_network_data(make_trips_df())
+    path = str(tmp_path / 'trips.parquet')
+    gdf_trips.drop(columns='board_dtm_pacific').to_parquet(path)
+
+    with pytest.raises(ValueError, match='board_dtm_pacific'):
+        read_stage(path, STAGE_TRIPS, start_date=pd.Timestamp('2023-04-10'))
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pytest
+import shapely
+
+from transit_equity.analysis.low_income.summary_by_census import (BlockGroupCountAggregator,
+                                                                  get_transaction_counts_per_block_group,
+                                                                  get_user_counts_per_block_group)
+
+
+def make_block_groups():
+    polygons = [shapely.box(550000 + 1000 * i, 5250000, 551000 + 1000 * i, 5251000) for i in range(2)]
+    return gpd.GeoDataFrame({'GEOID': ['530330001001', '530330001002']}, geometry=polygons, crs=32610)
+
+
+def make_transactions(card_ids):
+    # one transaction per card, all in the first block group
+    points = gpd.GeoSeries(shapely.points(np.full(len(card_ids), 550500.0), np.full(len(card_ids), 5250500.0)),
+                           crs=32610).to_crs(4326)
+    return pd.DataFrame({
+        'txn_id': np.arange(len(card_ids)),
+        'card_id': card_ids,
+        'transaction_location': shapely.to_wkb(points.to_numpy(), hex=True),
+    })
+
+
+def make_random_transactions(n_transactions=3000, seed=0):
+    # transactions in 3 x 2 block groups and around them, by cards that travel between them
+    rng = np.random.default_rng(seed)
+    stops = shapely.points(rng.uniform(549500, 553500, 40), rng.uniform(5249500, 5252500, 40))
+    stop_locations = shapely.to_wkb(gpd.GeoSeries(stops, crs=32610).to_crs(4326).to_numpy(), hex=True)
+    return pd.DataFrame({
+        'txn_id': np.arange(n_transactions),
+        'card_id': rng.integers(0, 400, n_transactions),
+        'transaction_location': stop_locations[rng.integers(0, 40, n_transactions)],
+    })
+
+
+@pytest.mark.parametrize('chunk_size', [1, 250, 1000, 5000])
+def test_exact_aggregator_matches_in_memory_counts(chunk_size):
+    polygons = [shapely.box(550000 + 1000 * i, 5250000 + 1000 * j, 551000 + 1000 * i, 5251000 + 1000 * j)
+                for i in range(3) for j in range(2)]
+    gdf_block_groups = gpd.GeoDataFrame({'GEOID': [f'53033000100{k}' for k in range(6)]}, geometry=polygons,
+                                        crs=32610)
+    df_transactions = make_random_transactions(n_transactions=3000 if chunk_size > 1 else 200)
+
+    aggregator = BlockGroupCountAggregator(gdf_block_groups)
+    for start in range(0, len(df_transactions), chunk_size):
+        aggregator.add_chunk(df_transactions.iloc[start:start + chunk_size])
+
+    pd.testing.assert_frame_equal(aggregator.get_transaction_counts(),
+                                  get_transaction_counts_per_block_group(df_transactions, gdf_block_groups))
+    pd.testing.assert_frame_equal(aggregator.get_user_counts(),
+                                  get_user_counts_per_block_group(df_transactions, gdf_block_groups))
+
+
+def test_hll_user_count_does_not_depend_on_card_id_dtype():
+    aggregator = BlockGroupCountAggregator(make_block_groups(), distinct_users='hll')
+    card_ids = np.arange(1, 201)
+    aggregator.add_chunk(make_transactions(card_ids.astype('int64')))
+    # read_sql returns float64 card ids in a chunk with a null one
+    aggregator.add_chunk(make_transactions(np.append(card_ids.astype('float64'), np.nan)))
+
+    user_counts = aggregator.get_user_counts()
+    exact_aggregator = BlockGroupCountAggregator(make_block_groups())
+    exact_aggregator.add_chunk(make_transactions(card_ids.astype('int64')))
+    exact_aggregator.add_chunk(make_transactions(np.append(card_ids.astype('float64'), np.nan)))
+
+    assert user_counts['user_count'].tolist() == exact_aggregator.get_user_counts()['user_count'].tolist()
+    assert user_counts['user_count'].tolist() == [200]
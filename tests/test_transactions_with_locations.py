@@ -0,0 +1,50 @@
+import datetime
+
+import pytest
+
+from benchmarks.reflection import create_sqlite_stand_in, get_schema_table_inventory
+from transit_equity.orca.constants import schema_tables as orca_schema_tables
+from transit_equity.orca.query import transactions_with_locations as orca_transactions_with_locations
+from transit_equity.orca_ng.constants import schema_tables as orca_ng_schema_tables
+from transit_equity.orca_ng.query import transactions_with_locations as orca_ng_transactions_with_locations
+
+START_DATE, END_DATE = datetime.datetime(2023, 4, 1), datetime.datetime(2023, 5, 1)
+
+# (TransactionsWithLocations class, *_SCHEMA_TABLES enums of its database), for orca and orca_ng
+TRANSACTIONS_WITH_LOCATIONS_CASES = {
+    'orca': (orca_transactions_with_locations.TransactionsWithLocations,
+             (orca_schema_tables.DSSG_SCHEMA_TABLES, orca_schema_tables.ORCA_SCHEMA_TABLES,
+              orca_schema_tables.TRAC_SCHEMA_TABLES, orca_schema_tables.GTFS_SCHEMA_TABLES)),
+    'orca_ng': (orca_ng_transactions_with_locations.TransactionsWithLocations,
+                (orca_ng_schema_tables.DSSG_SCHEMA_TABLES, orca_ng_schema_tables.ORCA_SCHEMA_TABLES,
+                 orca_ng_schema_tables.TRAC_SCHEMA_TABLES, orca_ng_schema_tables.GTFS_SCHEMA_TABLES)),
+}
+
+
+@pytest.fixture(params=list(TRANSACTIONS_WITH_LOCATIONS_CASES))
+def make_transactions_with_locations(request, tmp_path):
+    transactions_with_locations_class, schema_tables_enums = TRANSACTIONS_WITH_LOCATIONS_CASES[request.param]
+    engine = create_sqlite_stand_in(str(tmp_path), get_schema_table_inventory(schema_tables_enums))
+    yield lambda **kwargs: transactions_with_locations_class(START_DATE, END_DATE, engine, **kwargs)
+    engine.dispose()
+
+
+def compile_agency_query(transactions_with_locations):
+    stmt = transactions_with_locations.get_transactions_with_agency()
+    return str(stmt.compile(transactions_with_locations.engine, compile_kwargs={'literal_binds': True}))
+
+
+def test_date_predicates_are_on_the_transactions_table(make_transactions_with_locations):
+    transactions_with_locations = make_transactions_with_locations()
+    sql = compile_agency_query(transactions_with_locations)
+    # on the transactions table itself, so that PostgreSQL can use its index (or prune partitions)
+    column = f'{transactions_with_locations.transactions_t.fullname}.device_dtm_pacific'
+    assert f"{column} >= '{START_DATE:%Y-%m-%d}" in sql
+    assert f"{column} < '{END_DATE:%Y-%m-%d}" in sql
+
+
+def test_no_date_predicates_without_date_column(make_transactions_with_locations):
+    transactions_with_locations = make_transactions_with_locations(transactions_date_column=None)
+    sql = compile_agency_query(transactions_with_locations)
+    assert 'device_dtm_pacific >=' not in sql
+    assert 'device_dtm_pacific <' not in sql